@@ -0,0 +1,420 @@
+"""
+Per-user analytics index: monthly, category, merchant and period aggregates,
+subscription usage and spontaneous-purchase shares kept in NumPy arrays.
+
+Built once per profile version from transactions1 / transactions2 /
+transactions3Current, subscriptions and category_summary, then updated in
+O(1) per appended transaction. Serves /analyst/stats and the prompt summary.
+"""
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from columnar import ColumnarTransactions, is_columnar
+from metrics import span
+from profile_store import ProfileEntry
+
+TRANSACTION_KEYS = ("transactions1", "transactions2", "transactions3Current")
+# Period that newly appended transactions belong to
+CURRENT_PERIOD = "transactions3Current"
+
+# Subscription considered underused below this many uses over the history
+UNDERUSED_USAGE_COUNT = 4
+
+MAX_CACHED_INDEXES = 512
+
+
+class _Column:
+    """
+    Append-only NumPy column with amortized O(1) growth.
+
+    Forks share the buffer: appends only write past every fork's size, so
+    readers of an older fork keep seeing their prefix. `filled` (shared by
+    the forks of one buffer) is how far it is written; a fork that is no
+    longer at the end copies its prefix to a buffer of its own first.
+    """
+
+    __slots__ = ("data", "size", "filled")
+
+    def __init__(self, values: np.ndarray):
+        self.data = values
+        self.size = len(values)
+        self.filled = [self.size]
+
+    def fork(self) -> "_Column":
+        clone = _Column.__new__(_Column)
+        clone.data, clone.size, clone.filled = self.data, self.size, self.filled
+        return clone
+
+    def append(self, value) -> None:
+        if self.size == len(self.data) or self.size != self.filled[0]:
+            grown = np.zeros(max(16, 2 * self.size), dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+            self.filled = [self.size]
+        self.data[self.size] = value
+        self.size += 1
+        self.filled[0] = self.size
+
+    @property
+    def values(self) -> np.ndarray:
+        return self.data[:self.size]
+
+
+class _Labels:
+    """Dense integer codes for string keys (months, categories, merchants)."""
+
+    __slots__ = ("names", "codes")
+
+    def __init__(self, names: Sequence[str] = ()):
+        self.names: List[str] = []
+        self.codes: Dict[str, int] = {}
+        for name in names:
+            self.code(name)
+
+    def code(self, name: str) -> int:
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+def _encode(values: np.ndarray) -> Tuple[_Labels, np.ndarray]:
+    """Labels and int32 codes numbered by first appearance (as _Labels.code row by row)."""
+    if not len(values):
+        return _Labels(), np.zeros(0, dtype="int32")
+    names, first, inverse = np.unique(values, return_index=True, return_inverse=True)
+    order = np.argsort(first, kind="stable")
+    rank = np.empty(len(order), dtype="int32")
+    rank[order] = np.arange(len(order))
+    return _Labels(names[order].tolist()), rank[inverse.reshape(-1)]
+
+
+def _grown(matrix: np.ndarray, rows: int, cols: int) -> np.ndarray:
+    if matrix.shape[0] >= rows and matrix.shape[1] >= cols:
+        return matrix
+    grown = np.zeros((max(rows, matrix.shape[0]), max(cols, matrix.shape[1])), dtype=matrix.dtype)
+    grown[:matrix.shape[0], :matrix.shape[1]] = matrix
+    return grown
+
+
+def _spend(amount: np.ndarray) -> np.ndarray:
+    return np.clip(-amount, 0.0, None)
+
+
+class AnalyticsIndex:
+    """
+    Columnar transactions (month / period / category / merchant codes, amount,
+    spontaneous flag) plus dense aggregate matrices indexed by those codes.
+    Not thread-safe: build it anywhere, mutate it from one thread.
+    """
+
+    __slots__ = (
+        "months", "periods", "categories", "merchants",
+        "month", "period", "category", "merchant", "amount", "spontaneous",
+        "month_income", "month_spend", "month_count", "month_spontaneous_spend", "month_spontaneous_count",
+        "month_expense_count", "month_category_spend", "month_merchant_spend", "month_merchant_count",
+        "period_category_spend", "period_spontaneous_spend",
+        "subscription_names", "subscription_cost", "subscription_uses", "subscription_last_used",
+        "subscription_underused", "category_summary", "scored",
+    )
+
+    def __init__(self, user_data: Dict[str, Any], columns: Optional[Dict[str, Any]] = None):
+        """
+        `columns` (e.g. ColumnarTransactions.analytics_columns()) replaces the
+        transaction lists of `user_data`: month / category / merchant strings,
+        period codes, amount, spontaneous flag and `scored`.
+        """
+        self.periods = _Labels(TRANSACTION_KEYS)
+        if columns is None:
+            rows = [(key, tx) for key in TRANSACTION_KEYS for tx in user_data.get(key) or []]
+            self.months = _Labels()
+            self.categories = _Labels()
+            self.merchants = _Labels()
+            month = np.array([self.months.code((tx.get("date") or "")[:7]) for _, tx in rows], dtype="int32")
+            period = np.array([self.periods.code(key) for key, _ in rows], dtype="int32")
+            category = np.array([self.categories.code(_category_of(tx)) for _, tx in rows], dtype="int32")
+            merchant = np.array([self.merchants.code(tx.get("merchant") or "") for _, tx in rows], dtype="int32")
+            amount = np.array([float(tx.get("amount") or 0) for _, tx in rows], dtype="float64")
+            spontaneous = np.array([bool(tx.get("is_spontanius_predicted")) for _, tx in rows], dtype=bool)
+            # Spontaneous shares are only meaningful for enriched (scored) transactions
+            self.scored = any("is_spontanius_predicted" in tx for _, tx in rows)
+        else:
+            self.months, month = _encode(columns["month"])
+            self.categories, category = _encode(columns["category"])
+            self.merchants, merchant = _encode(columns["merchant"])
+            period = np.asarray(columns["period"], dtype="int32")
+            amount = np.asarray(columns["amount"], dtype="float64")
+            spontaneous = np.asarray(columns["spontaneous"], dtype=bool)
+            self.scored = bool(columns["scored"])
+
+        # Copies: columns may be read-only memory maps and are appended to later
+        self.month = _Column(month.copy())
+        self.period = _Column(period.copy())
+        self.category = _Column(category.copy())
+        self.merchant = _Column(merchant.copy())
+        self.amount = _Column(amount.copy())
+        self.spontaneous = _Column(spontaneous.copy())
+
+        self._aggregate()
+        self._load_subscriptions(user_data.get("subscriptions") or [])
+        self.category_summary: Dict[str, float] = dict(user_data.get("category_summary") or {})
+
+    def _aggregate(self) -> None:
+        n_months, n_periods = len(self.months), len(self.periods)
+        n_categories, n_merchants = len(self.categories), len(self.merchants)
+        month, period = self.month.values, self.period.values
+        category, merchant = self.category.values, self.merchant.values
+        amount, spontaneous = self.amount.values, self.spontaneous.values
+        spend = _spend(amount)
+        expense = spend > 0
+        spontaneous_spend = np.where(spontaneous, spend, 0.0)
+
+        self.month_income = np.bincount(month, np.clip(amount, 0.0, None), n_months)
+        self.month_spend = np.bincount(month, spend, n_months)
+        self.month_count = np.bincount(month, minlength=n_months).astype("int64")
+        self.month_spontaneous_spend = np.bincount(month, spontaneous_spend, n_months)
+        self.month_spontaneous_count = np.bincount(month, spontaneous & expense, n_months).astype("int64")
+        self.month_expense_count = np.bincount(month, expense, n_months).astype("int64")
+
+        self.month_category_spend = np.zeros((n_months, n_categories))
+        np.add.at(self.month_category_spend, (month, category), spend)
+        self.month_merchant_spend = np.zeros((n_months, n_merchants))
+        np.add.at(self.month_merchant_spend, (month, merchant), spend)
+        self.month_merchant_count = np.zeros((n_months, n_merchants), dtype="int64")
+        np.add.at(self.month_merchant_count, (month[expense], merchant[expense]), 1)
+        self.period_category_spend = np.zeros((n_periods, n_categories))
+        np.add.at(self.period_category_spend, (period, category), spend)
+        self.period_spontaneous_spend = np.bincount(period, spontaneous_spend, n_periods)
+
+    def _load_subscriptions(self, subscriptions: List[Dict[str, Any]]) -> None:
+        self.subscription_names = [s.get("name") for s in subscriptions]
+        self.subscription_cost = np.array([float(s.get("cost") or 0) for s in subscriptions])
+        self.subscription_uses = np.array(
+            [s.get("usage_count", len(s.get("usage_timestamps", []))) for s in subscriptions], dtype="int64"
+        )
+        self.subscription_last_used = [s.get("last_used") for s in subscriptions]
+        self.subscription_underused = np.array(
+            [bool(s.get("not_used_in_last_90_days")) for s in subscriptions], dtype=bool
+        ) | (self.subscription_uses < UNDERUSED_USAGE_COUNT)
+
+    def __len__(self) -> int:
+        return self.amount.size
+
+    # === Incremental updates ===
+
+    def copy(self) -> "AnalyticsIndex":
+        """
+        Copy to append to while readers keep using this one: transaction
+        columns are forks of the same buffers, so only the aggregates (sized
+        by months / categories / merchants, not by history) are copied.
+        """
+        clone = AnalyticsIndex.__new__(AnalyticsIndex)
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if isinstance(value, np.ndarray):
+                value = value.copy()
+            elif isinstance(value, _Column):
+                value = value.fork()
+            elif isinstance(value, _Labels):
+                value = _Labels(value.names)
+            elif isinstance(value, (list, dict)):
+                value = type(value)(value)
+            setattr(clone, name, value)
+        return clone
+
+    def append(self, tx: Dict[str, Any], period: str = CURRENT_PERIOD) -> None:
+        """Add one transaction (already appended to the profile) to every aggregate."""
+        m = self.months.code((tx.get("date") or "")[:7])
+        p = self.periods.code(period)
+        c = self.categories.code(_category_of(tx))
+        r = self.merchants.code(tx.get("merchant") or "")
+        amount = float(tx.get("amount") or 0)
+        spontaneous = bool(tx.get("is_spontanius_predicted"))
+        self.scored = self.scored or "is_spontanius_predicted" in tx
+        spend = max(-amount, 0.0)
+
+        for column, value in ((self.month, m), (self.period, p), (self.category, c), (self.merchant, r),
+                              (self.amount, amount), (self.spontaneous, spontaneous)):
+            column.append(value)
+
+        self._ensure_shape()
+        self.month_income[m] += max(amount, 0.0)
+        self.month_spend[m] += spend
+        self.month_count[m] += 1
+        self.month_category_spend[m, c] += spend
+        self.month_merchant_spend[m, r] += spend
+        self.period_category_spend[p, c] += spend
+        if spend > 0:
+            self.month_expense_count[m] += 1
+            self.month_merchant_count[m, r] += 1
+            if spontaneous:
+                self.month_spontaneous_spend[m] += spend
+                self.month_spontaneous_count[m] += 1
+                self.period_spontaneous_spend[p] += spend
+        name = tx.get("category_name")
+        if name is not None:
+            self.category_summary[name] = self.category_summary.get(name, 0) + amount
+
+    def _ensure_shape(self) -> None:
+        n_months, n_periods = len(self.months), len(self.periods)
+        n_categories, n_merchants = len(self.categories), len(self.merchants)
+        if len(self.month_income) < n_months:
+            for name in ("month_income", "month_spend", "month_count", "month_spontaneous_spend",
+                         "month_spontaneous_count", "month_expense_count"):
+                setattr(self, name, _grown(getattr(self, name)[:, None], n_months, 1)[:, 0])
+        if len(self.period_spontaneous_spend) < n_periods:
+            self.period_spontaneous_spend = _grown(self.period_spontaneous_spend[:, None], n_periods, 1)[:, 0]
+        self.month_category_spend = _grown(self.month_category_spend, n_months, n_categories)
+        self.month_merchant_spend = _grown(self.month_merchant_spend, n_months, n_merchants)
+        self.month_merchant_count = _grown(self.month_merchant_count, n_months, n_merchants)
+        self.period_category_spend = _grown(self.period_category_spend, n_periods, n_categories)
+
+    # === Queries ===
+
+    def month_order(self) -> np.ndarray:
+        return np.argsort(self.months.names, kind="stable")
+
+    def period_spend(self) -> np.ndarray:
+        return self.period_category_spend.sum(axis=1)
+
+    def spontaneous_shares(self) -> Dict[str, Any]:
+        """Share of expenses (by count and amount) flagged as spontaneous, overall and per period."""
+        expenses = int(self.month_expense_count.sum())
+        spend = float(self.month_spend.sum())
+        if not self.scored or not expenses or not spend:
+            return {}
+        period_spend = self.period_spend()
+        has_spend = period_spend > 0
+        return {
+            "count_share": round(float(self.month_spontaneous_count.sum()) / expenses, 3),
+            "amount_share": round(float(self.month_spontaneous_spend.sum()) / spend, 3),
+            "amount_share_by_period": {
+                self.periods.names[p]: round(float(self.period_spontaneous_spend[p] / period_spend[p]), 3)
+                for p in np.flatnonzero(has_spend)
+            },
+        }
+
+    def top_merchants(self, limit: int, months: Optional[np.ndarray] = None) -> List[Tuple[str, float, int]]:
+        """(merchant, spent, expense count) for the biggest merchants by spending."""
+        spent = self.month_merchant_spend if months is None else self.month_merchant_spend[months]
+        counts = self.month_merchant_count if months is None else self.month_merchant_count[months]
+        spent, counts = spent.sum(axis=0), counts.sum(axis=0)
+        order = np.argsort(-spent, kind="stable")[:limit]
+        return [(self.merchants.names[i], float(spent[i]), int(counts[i])) for i in order if spent[i] > 0]
+
+    def to_dict(self, month: Optional[str] = None, top: int = 10) -> Dict[str, Any]:
+        """JSON-ready statistics, optionally restricted to one month ("YYYY-MM")."""
+        order = self.month_order()
+        if month is not None:
+            order = order[[self.months.names[i] == month for i in order]]
+
+        def by_name(values: np.ndarray, labels: _Labels) -> Dict[str, float]:
+            nonzero = np.flatnonzero(values)
+            return {labels.names[i]: round(float(values[i]), 2) for i in nonzero[np.argsort(-values[nonzero], kind="stable")]}
+
+        months = {}
+        for m in order:
+            spend = self.month_spend[m]
+            months[self.months.names[m]] = {
+                "income": round(float(self.month_income[m]), 2),
+                "spending": round(float(spend), 2),
+                "net": round(float(self.month_income[m] - spend), 2),
+                "count": int(self.month_count[m]),
+                "spontaneous_spending": round(float(self.month_spontaneous_spend[m]), 2),
+                "spontaneous_share": round(float(self.month_spontaneous_spend[m] / spend), 3) if spend else 0.0,
+                "categories": by_name(self.month_category_spend[m], self.categories),
+            }
+
+        return {
+            "transactions": len(self),
+            "months": months,
+            "periods": {
+                self.periods.names[p]: by_name(self.period_category_spend[p], self.categories)
+                for p in range(len(self.periods))
+                if month is None and self.period_category_spend[p].any()
+            },
+            "top_merchants": [
+                {"merchant": name, "spent": round(spent, 2), "count": count}
+                for name, spent, count in self.top_merchants(top, order if month is not None else None)
+            ],
+            "subscriptions": [
+                {
+                    "name": self.subscription_names[i],
+                    "cost": float(self.subscription_cost[i]),
+                    "uses": int(self.subscription_uses[i]),
+                    "last_used": self.subscription_last_used[i],
+                    "underused": bool(self.subscription_underused[i]),
+                }
+                for i in range(len(self.subscription_names))
+            ],
+            "subscriptions_monthly_cost": float(self.subscription_cost.sum()),
+            "category_summary": self.category_summary,
+            "spontaneous": self.spontaneous_shares(),
+        }
+
+
+def _category_of(tx: Dict[str, Any]) -> str:
+    return tx.get("category_name") or tx.get("category") or "Other"
+
+
+_cache: "OrderedDict[Tuple[str, str, Tuple[int, int]], AnalyticsIndex]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def index_for(entry: ProfileEntry) -> AnalyticsIndex:
+    """Analytics index for a profile version, built once per (user, file version)."""
+    key = (entry.user_id, entry.path, entry.version)
+    with _cache_lock:
+        index = _cache.get(key)
+        if index is not None:
+            _cache.move_to_end(key)
+            return index
+    with span("analytics_index"):
+        if is_columnar(entry.path):
+            # Only the memory-mapped columns the index needs are read
+            index = AnalyticsIndex(entry.data, ColumnarTransactions(entry.path).analytics_columns())
+        else:
+            index = AnalyticsIndex(entry.data)
+    with _cache_lock:
+        index = _cache.setdefault(key, index)
+        while len(_cache) > MAX_CACHED_INDEXES:
+            _cache.popitem(last=False)
+    return index
+
+
+def advance(old: ProfileEntry, new: ProfileEntry, transactions: Sequence[Dict[str, Any]]) -> bool:
+    """
+    Cache the index of `new` as the cached index of `old` plus `transactions`
+    (appended to the current period), instead of rebuilding it from the file.
+    False if `old` was not cached; the index is then built on first use.
+    """
+    with _cache_lock:
+        index = _cache.get((old.user_id, old.path, old.version))
+    if index is None:
+        return False
+    index = index.copy()
+    for tx in transactions:
+        index.append(tx)
+    with _cache_lock:
+        _cache[(new.user_id, new.path, new.version)] = index
+        while len(_cache) > MAX_CACHED_INDEXES:
+            _cache.popitem(last=False)
+    return True
+
+
+async def get_index(entry: ProfileEntry) -> AnalyticsIndex:
+    """Async wrapper: indexes missing from the cache are built in a worker thread."""
+    key = (entry.user_id, entry.path, entry.version)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    return await asyncio.to_thread(index_for, entry)
@@ -1,13 +1,40 @@
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from completion_cache import completion_cache
+from conversation import conversations
+from ingestion import ingestor, router as transactions_router
+from json_codec import JSONBytesResponse, fragments
+from llm_client import llm_client
+from metrics import metrics_endpoint, metrics_middleware
+from profile_store import all_stats as profile_store_stats
+from prompt_context import shared_contexts
+from prompt_layout import all_stats as prompt_layout_stats
+from spontaneous_scorer import scorer
 from npc_analyst import router as analyst_router
-from npc_banker import router as banker_router
-from npc_support import router as support_router
+from npc_banker import intent_router as banker_intents, router as banker_router
+from npc_support import intent_router as support_intents, router as support_router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Общий пул соединений к LLM и модель спонтанных покупок живут столько же, сколько приложение
+    await llm_client.start()
+    await scorer.start()
+    yield
+    await conversations.aclose()
+    await scorer.close()
+    await llm_client.aclose()
+
 
 app = FastAPI(
     title="Unified NPC Services",
     description="Объединенный сервер для NPC Analyst, Banker и Support",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # Ответы кодируются orjson (если установлен), без пробелов и отступов
+    default_response_class=JSONBytesResponse,
 )
 
 app.add_middleware(
@@ -18,10 +45,34 @@ app.add_middleware(
     allow_headers=["*"],  # <-- ВАЖНО!!!
 )
 
+# Гистограммы задержек для /metrics и профилирование по запросу (?profile=1 при REQUEST_PROFILING=1)
+app.middleware("http")(metrics_middleware)
+
 # Добавляем роутеры
 app.include_router(analyst_router)
 app.include_router(banker_router)
 app.include_router(support_router)
+app.include_router(transactions_router)
+
+
+@app.get("/stats")
+async def service_stats():
+    """Внутренние счётчики кэшей сервиса (в режиме server.py — того воркера, который ответил)."""
+    return {
+        "pid": os.getpid(),
+        "profile_store": profile_store_stats(),
+        "completion_cache": completion_cache.stats(),
+        "scorer": scorer.stats(),
+        "llm_client": llm_client.stats(),
+        "conversations": conversations.stats(),
+        "ingestion": ingestor.stats(),
+        "json_fragments": fragments.stats(),
+        "shared_contexts": shared_contexts.stats() if shared_contexts is not None else None,
+        "intent_router": {"banker": banker_intents.stats(), "support": support_intents.stats()},
+        "prompt_layout": prompt_layout_stats(),
+    }
+
+app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
 
 if __name__ == "__main__":
     import uvicorn
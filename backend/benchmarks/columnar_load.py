@@ -0,0 +1,112 @@
+"""
+Load time and peak memory of the columnar transaction format (columnar.py)
+against json.load of the same profile, for growing transaction counts.
+
+Each operation runs in a fresh interpreter; memory is the VmHWM growth over
+the interpreter's state after imports. "analytics" and "features" read only
+the memory-mapped columns they need; "records" rebuilds every dict.
+
+    cd backend && python benchmarks/columnar_load.py --scales 1 10 100
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+from columnar import TRANSACTION_KEYS, write_columnar  # noqa: E402
+
+SAMPLE_PATH = "user_full_banking_data_enriched.json"
+
+OPERATIONS = {
+    "json.load": "data = json.load(open(PATH, encoding='utf-8'))",
+    "json + analytics": "data = json.load(open(PATH, encoding='utf-8')); AnalyticsIndex(data)",
+    "json + features": (
+        "data = json.load(open(PATH, encoding='utf-8'))\n"
+        "txs = [tx for key in TRANSACTION_KEYS for tx in data[key]]\n"
+        "build_feature_matrix(extract_columns([(txs, data['monthly_income'])]))"
+    ),
+    "cols + analytics": "AnalyticsIndex(load_profile(COLS), ColumnarTransactions(COLS).analytics_columns())",
+    "cols + features": (
+        "profile = load_profile(COLS)\n"
+        "build_feature_matrix(ColumnarTransactions(COLS).feature_columns(profile['monthly_income']))"
+    ),
+    "cols records": "load_profile(COLS, with_transactions=True)",
+}
+
+RUNNER = """
+import json, sys, time
+from analytics import AnalyticsIndex, TRANSACTION_KEYS
+from columnar import ColumnarTransactions, load_profile
+from features import build_feature_matrix, extract_columns
+PATH, COLS, REPEATS = {path!r}, {cols!r}, {repeats}
+
+def peak_kb():
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmHWM"))
+
+base = peak_kb()
+timings = []
+for _ in range(REPEATS):
+    start = time.perf_counter()
+{body}
+    timings.append(time.perf_counter() - start)
+timings.sort()
+print(timings[len(timings) // 2], peak_kb() - base)
+"""
+
+
+def scaled_profile(template, scale: int):
+    user = dict(template)
+    for key in TRANSACTION_KEYS:
+        user[key] = [dict(tx, transaction_id=f"{tx.get('transaction_id')}-{i}") for i in range(scale) for tx in template[key]]
+    return user
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def run(operation: str, path: str, cols: str, repeats: int):
+    body = "\n".join("    " + line for line in OPERATIONS[operation].splitlines())
+    out = subprocess.run(
+        [sys.executable, "-c", RUNNER.format(path=path, cols=cols, repeats=repeats, body=body)],
+        capture_output=True, text=True, check=True, cwd=BACKEND_DIR,
+    ).stdout.split()
+    return float(out[0]) * 1000, int(out[1]) / 1024
+
+
+def main(args):
+    with open(SAMPLE_PATH, "r", encoding="utf-8") as f:
+        template = json.load(f)
+
+    root = tempfile.mkdtemp(prefix="columnar-")
+    try:
+        print(f"{'rows':>8} {'operation':<18} {'ms':>9} {'peak +MB':>9}")
+        for scale in args.scales:
+            user = scaled_profile(template, scale)
+            path = os.path.join(root, f"user_x{scale}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(user, f, ensure_ascii=False, indent=2)
+            cols = os.path.join(root, f"user_x{scale}.cols")
+            write_columnar(user, cols)
+            rows = sum(len(user[key]) for key in TRANSACTION_KEYS)
+            print(f"{rows:>8} (json {os.path.getsize(path) / 1e6:.2f} MB, columnar {directory_size(cols) / 1e6:.2f} MB)")
+            for operation in OPERATIONS:
+                ms, peak = run(operation, path, cols, args.repeats)
+                print(f"{rows:>8} {operation:<18} {ms:>9.2f} {peak:>9.1f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help="copies of the sample transactions")
+    parser.add_argument("--repeats", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,84 @@
+"""
+Prompt size of a long analyst conversation: every turn resent in full
+against the bounded conversation memory (conversation.py: rolling summary +
+recent turns, profile summary once per session).
+
+Summaries are produced by a stand-in that waits `--summary-latency` seconds
+like an LLM call would, so the table also shows that turns keep being
+answered while summarization runs in the background.
+
+    cd backend && python benchmarks/conversation_tokens.py --turns 100
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+from conversation import ConversationStore  # noqa: E402
+from npc_analyst import USER_DATA_PATH, build_analysis_messages  # noqa: E402
+from profile_store import ProfileStore  # noqa: E402
+from prompt_context import context_for  # noqa: E402
+from tokens import TOKENIZER, count_tokens  # noqa: E402
+
+QUESTIONS = [
+    "Сравни мои расходы за последние два месяца.",
+    "Какие подписки мне стоит отменить?",
+    "А если я сокращу рестораны вдвое, сколько сэкономлю за год?",
+    "Сколько мне копить до цели при таких расходах?",
+]
+REPLY = (
+    "По вашим данным расходы в сентябре выросли на 8% по сравнению с августом, в основном за счёт ресторанов "
+    "и доставки еды. Подписки на стриминг используются редко — их можно отменить и сэкономить около 6 000 тенге "
+    "в месяц. Если сократить рестораны вдвое, за год получится отложить примерно 120 000 тенге. "
+) * 2
+
+
+def messages_tokens(messages) -> int:
+    return sum(count_tokens(m["content"]) for m in messages)
+
+
+async def main(args):
+    entry = ProfileStore("bench-conversation", lambda user_id: USER_DATA_PATH).load_entry("bench")
+    financial_summary = context_for(entry)
+
+    async def summarize(summary, turns):
+        await asyncio.sleep(args.summary_latency)
+        return (summary + " " + " ".join(turn.content[:120] for turn in turns)).strip()
+
+    store = ConversationStore(token_budget=args.budget, summarize=summarize)
+    session = await store.session("bench", "analyst")
+    full_history = []
+    checkpoints = {1, 5, 10, 20, 50, args.turns}
+
+    print(f"token counter: {TOKENIZER}, history budget {store.token_budget} tokens")
+    print(f"{'turn':>5} {'full tok':>9} {'bounded tok':>12} {'history tok':>12} {'summary tok':>12} {'prompt build ms':>16}")
+    for turn in range(1, args.turns + 1):
+        query = QUESTIONS[turn % len(QUESTIONS)]
+        started = time.perf_counter()
+        messages = build_analysis_messages(query, financial_summary, session.history())
+        await store.record(session, query, REPLY)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        full = build_analysis_messages(query, financial_summary, full_history)
+        full_history += [{"role": "user", "content": query}, {"role": "assistant", "content": REPLY}]
+        if turn in checkpoints:
+            print(f"{turn:>5} {messages_tokens(full):>9} {messages_tokens(messages):>12} "
+                  f"{session.history_tokens():>12} {session.summary_tokens:>12} {build_ms:>16.2f}")
+        await asyncio.sleep(args.think_time)  # the player reads the answer
+
+    await store.drain()
+    print(f"summaries: {store.summaries}, folded turns: {store.folded_turns}, failures: {store.summary_failures}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--budget", type=int, default=1500, help="history token budget")
+    parser.add_argument("--summary-latency", type=float, default=0.05, help="seconds per summary call")
+    parser.add_argument("--think-time", type=float, default=0.01, help="seconds between turns")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,213 @@
+"""
+End-to-end load benchmark of every NPC route in bank_config.app against the
+local stub LLM (stub_llm.py), at increasing concurrency.
+
+For each route and concurrency level it reports throughput, p50 / p95 / p99
+latency (streams: until the last event, plus time to the first byte), non-2xx
+answers and the size of the request bodies the route sent upstream. Results
+are saved as JSON; with --baseline a previous file is compared and the script
+exits with status 1 when a route got slower, lost throughput or started
+sending bigger prompts than --tolerance allows.
+
+    cd backend && python benchmarks/e2e_routes.py --levels 1 8 32 --output e2e.json
+    cd backend && python benchmarks/e2e_routes.py --baseline e2e.json --output e2e-new.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+
+import stub_llm  # noqa: E402
+
+SAMPLE_PATH = "as.json"
+SCORED_TRANSACTIONS = 50
+
+# Numbers every request of the run, so no two share a conversation or a cached answer
+_request_numbers = itertools.count()
+
+
+class Route(NamedTuple):
+    name: str
+    method: str
+    path: str
+    body: Optional[Callable[[int], Dict[str, Any]]]
+    stream: bool = False
+
+
+def routes(transactions: List[Dict[str, Any]]) -> List[Route]:
+    # Every request is its own conversation and question, so prompts stay the same size and the cache stays cold
+    def text(question: str):
+        return lambda i: {"text": f"{question} (#{i})", "session_id": f"bench-{i}"}
+
+    analyst = text("Сравни мои расходы по месяцам и найди лишние подписки")
+    banker = text("Как мне распределить бюджет, чтобы быстрее накопить на цель?")
+    support = text("Чем мурабаха отличается от обычного кредита?")
+    return [
+        Route("analyst", "POST", "/analyst/analyze-finances", analyst),
+        Route("analyst stream", "POST", "/analyst/analyze-finances/stream", analyst, stream=True),
+        Route("analyst stats", "GET", "/analyst/stats", None),
+        Route("score", "POST", "/analyst/score-transactions", lambda i: {"transactions": transactions}),
+        Route("banker", "POST", "/banker/", banker),
+        Route("banker stream", "POST", "/banker/stream", banker, stream=True),
+        Route("services", "POST", "/banker/suggest-services", lambda i: {"query": f"хочу накопить на квартиру (#{i})"}),
+        Route("services stream", "POST", "/banker/suggest-services/stream", lambda i: {"query": f"ипотека (#{i})"}, stream=True),
+        Route("simulate", "POST", "/banker/simulate", lambda i: {"amount": 1_000_000 + i, "term_months": 24}),
+        Route("support", "POST", "/support/ask-banker", support),
+        Route("support stream", "POST", "/support/ask-banker/stream", support, stream=True),
+    ]
+
+
+async def one_request(client: httpx.AsyncClient, route: Route):
+    """(seconds, seconds to first byte, status)."""
+    kwargs = {"json": route.body(next(_request_numbers))} if route.body else {}
+    started = time.perf_counter()
+    first_byte = None
+    failed = False
+    async with client.stream(route.method, route.path, **kwargs) as response:
+        async for chunk in response.aiter_raw():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            # Upstream failures after the headers arrive as an `error` event inside a 200 stream
+            failed = failed or b"event: error" in chunk
+        status = 502 if failed else response.status_code
+    return time.perf_counter() - started, first_byte or 0.0, status
+
+
+async def run_level(client: httpx.AsyncClient, stub: httpx.AsyncClient, route: Route, concurrency: int, total: int):
+    await stub.post("/stub/reset")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded():
+        async with semaphore:
+            return await one_request(client, route)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(bounded() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+    upstream = (await stub.get("/stub/stats")).json()
+
+    seconds = np.array([r[0] for r in results]) * 1000
+    p50, p95, p99 = np.percentile(seconds, [50, 95, 99])
+    result = {
+        "route": route.name,
+        "path": route.path,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": sum(1 for r in results if r[2] >= 400),
+        "throughput_rps": round(total / elapsed, 2),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "upstream_requests": upstream["requests"],
+        "prompt_bytes": upstream["request_bytes"],
+    }
+    if route.stream:
+        result["ttfb_p50_ms"] = round(float(np.percentile([r[1] for r in results], 50)) * 1000, 2)
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: Dict[str, Any], results: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    """Human-readable regressions of `results` against a saved run."""
+    previous = {(r["route"], r["concurrency"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        old = previous.get((r["route"], r["concurrency"]))
+        if old is None:
+            continue
+        where = f"{r['route']} @ {r['concurrency']}"
+        if r["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{where}: p95 {old['p95_ms']:.1f} -> {r['p95_ms']:.1f} ms")
+        if r["throughput_rps"] < old["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{where}: throughput {old['throughput_rps']:.1f} -> {r['throughput_rps']:.1f} req/s")
+        if r["prompt_bytes"]["max"] > old["prompt_bytes"]["max"] * (1 + tolerance):
+            regressions.append(f"{where}: prompt {old['prompt_bytes']['max']} -> {r['prompt_bytes']['max']} bytes")
+        if r["errors"] > old["errors"]:
+            regressions.append(f"{where}: errors {old['errors']} -> {r['errors']}")
+    return regressions
+
+
+async def main(args) -> int:
+    with open(SAMPLE_PATH, "r", encoding="utf-8") as f:
+        transactions = json.load(f)["transactions1"][:SCORED_TRANSACTIONS]
+    selected = [r for r in routes(transactions) if not args.routes or r.name in args.routes]
+
+    with stub_llm.StubServer(**stub_llm.options_from(args)) as url:
+        os.environ["BANK_BASE_URL"] = url
+        from bank_config import app
+
+        results = []
+        async with app.router.lifespan_context(app), \
+                httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://npc", timeout=300) as client, \
+                httpx.AsyncClient(base_url=url) as stub:
+            print(f"{'route':<16} {'conc':>5} {'reqs':>5} {'err':>4} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+                  f"{'p99 ms':>8} {'ttfb ms':>8} {'prompt B':>9}")
+            for route in selected:
+                await run_level(client, stub, route, 1, 2)  # warm caches and indexes
+                for concurrency in args.levels:
+                    r = await run_level(client, stub, route, concurrency, max(args.min_requests, concurrency * args.rounds))
+                    results.append(r)
+                    ttfb = f"{r['ttfb_p50_ms']:>8.1f}" if "ttfb_p50_ms" in r else f"{'-':>8}"
+                    print(f"{r['route']:<16} {concurrency:>5} {r['requests']:>5} {r['errors']:>4} {r['throughput_rps']:>8.1f} "
+                          f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {ttfb} {r['prompt_bytes']['max']:>9}")
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "levels": args.levels,
+            "stub": {k: v for k, v in stub_llm.options_from(args).items()},
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"saved {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("stub") != report["meta"]["stub"]:
+            print(f"note: stub settings differ from the baseline: {baseline['meta'].get('stub')}")
+        regressions = compare(baseline, results, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    stub_llm.add_arguments(parser)
+    parser.set_defaults(latency=0.1)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--rounds", type=int, default=4, help="requests per concurrency slot")
+    parser.add_argument("--min-requests", type=int, default=20)
+    parser.add_argument("--routes", nargs="+", help="route names to run (default: all)")
+    parser.add_argument("--output", default="e2e_routes.json", help="JSON results file ('' to skip)")
+    parser.add_argument("--baseline", help="previous results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    sys.exit(asyncio.run(main(parser.parse_args())))
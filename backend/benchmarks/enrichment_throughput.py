@@ -0,0 +1,95 @@
+"""
+Enrichment throughput in rows/sec: the old per-list script logic against the
+chunked, vectorized pipeline with 1..N worker processes.
+
+    cd backend && python benchmarks/enrichment_throughput.py --users 2000
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+warnings.filterwarnings("ignore")
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from enrichment import MODEL_PATH, TRANSACTION_KEYS, load_bundle, run_pipeline  # noqa: E402
+
+SAMPLE_PATH = "user_full_banking_data.json"
+
+
+def synthetic_users(count: int):
+    with open(SAMPLE_PATH, "r", encoding="utf-8") as f:
+        sample = json.load(f)
+    rnd = random.Random(42)
+    for i in range(count):
+        user = copy.deepcopy(sample)
+        user["user_id"] = f"user_{i:06d}"
+        for key in TRANSACTION_KEYS:
+            for tx in user.get(key, []):
+                tx["amount"] = round(tx["amount"] * rnd.uniform(0.5, 1.5), 2)
+        yield user
+
+
+def legacy_enrich(user, bundle):
+    """The per-list logic of the old enriching.py script."""
+    features, imputer, model = bundle["features"], bundle["imputer"], bundle["model"]
+    income = user.get("monthly_income", 0)
+    for key in TRANSACTION_KEYS:
+        df = pd.DataFrame(user[key])
+        df["day_of_week"] = df["date"].apply(lambda x: datetime.strptime(x, "%Y-%m-%d").weekday())
+        df["is_weekend"] = df["day_of_week"].isin([5, 6]).astype(int)
+        df["transaction_hour"] = np.random.randint(0, 24, len(df))
+        df["amount_normalized"] = df["amount"].abs() / (income if income else 1)
+        df["merchant_frequency"] = df["merchant"].map(df["merchant"].value_counts())
+        df["category_frequency"] = df["category"].map(df["category"].value_counts())
+        df["balance_before"] = df["balance_after"] - df["amount"]
+        df["is_high_risk_merchant"] = df["merchant"].isin(["Netflix", "Spotify", "AliExpress", "Burger King"]).astype(int)
+        df["timestamp"] = pd.to_datetime(df["date"])
+        df = df.sort_values("timestamp")
+        df["delta_time_previous"] = (df["timestamp"].diff().dt.total_seconds() / 3600).fillna(0)
+        df["mcc_encoded"] = pd.factorize(df.get("mcc", np.nan))[0]
+        X = df[features]
+        preds = model.predict(pd.DataFrame(imputer.transform(X), columns=X.columns))
+        for i, tx in enumerate(user[key]):
+            tx["is_spontanius_predicted"] = bool(preds[i])
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "users.jsonl")
+        with open(input_path, "w", encoding="utf-8") as f:
+            for user in synthetic_users(args.users):
+                f.write(json.dumps(user, ensure_ascii=False) + "\n")
+
+        bundle = load_bundle(MODEL_PATH)
+        legacy_users = list(synthetic_users(args.legacy_users))
+        rows = sum(len(u[key]) for u in legacy_users for key in TRANSACTION_KEYS)
+        start = time.perf_counter()
+        for user in legacy_users:
+            legacy_enrich(user, bundle)
+        elapsed = time.perf_counter() - start
+        print(f"{'legacy script':<22} {len(legacy_users):>7} users {rows:>9} rows {rows / elapsed:>10.0f} rows/s")
+
+        for workers in args.workers:
+            stats = run_pipeline([input_path], os.path.join(tmp, "out.jsonl"), MODEL_PATH, workers, args.chunk_users)
+            print(f"{f'pipeline x{workers}':<22} {stats['users']:>7} users {stats['rows']:>9} rows {stats['rows_per_sec']:>10.0f} rows/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--legacy-users", type=int, default=50)
+    parser.add_argument("--chunk-users", type=int, default=256)
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, os.cpu_count() or 1}))
+    main(parser.parse_args())
@@ -0,0 +1,126 @@
+"""
+Appending new transactions to a user: incremental ingestion (ingestion.py,
+POST /transactions) against regenerating the enriched profile in batch
+(enrichment.enrich_users over the whole history, as enriching.py does).
+
+The demo user's transactions are repeated to `--history` rows per profile;
+every step appends `--batch` rows dated after the history. Reported per
+history size: milliseconds per step and where the incremental time goes
+(enrichment + scoring vs the atomic JSON rewrite).
+
+    cd backend && python benchmarks/ingest_transactions.py --history 1000 10000 100000 --batch 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+import numpy as np  # noqa: E402
+
+import ingestion  # noqa: E402
+from enrichment import enrich_users, load_bundle  # noqa: E402
+from profile_store import ProfileStore  # noqa: E402
+
+SAMPLE_PATH = "user_full_banking_data_enriched.json"
+USER_ID = "bench_user"
+
+
+def synthetic_profile(sample, rows: int):
+    """The sample user with `rows` dated current-period transactions (other periods dropped)."""
+    source = sample["transactions3Current"]
+    start = date(2020, 1, 1)
+    transactions = []
+    for i in range(rows):
+        tx = dict(source[i % len(source)])
+        tx["date"] = (start + timedelta(days=i // 20)).isoformat()
+        transactions.append(tx)
+    profile = {**sample, "user_id": USER_ID, "transactions1": [], "transactions2": [], "transactions3Current": transactions}
+    return profile, start + timedelta(days=rows // 20 + 1)
+
+
+def new_rows(sample, day: date, batch: int, step: int):
+    source = sample["transactions3Current"]
+    keep = ("amount", "merchant", "category", "category_name", "mcc", "description")
+    return [
+        {**{k: source[(step * batch + j) % len(source)].get(k) for k in keep}, "date": day.isoformat()}
+        for j in range(batch)
+    ]
+
+
+async def incremental(path: str, sample, day: date, args):
+    ingestor = ingestion.TransactionIngestor()
+    times, writes = [], []
+    write = ingestion._write_chunks_temp
+
+    def timed_write(*a):
+        started = time.perf_counter()
+        tmp_path = write(*a)
+        writes.append(time.perf_counter() - started)
+        return tmp_path
+
+    ingestion._write_chunks_temp = timed_write
+    try:
+        # First step builds the feature state and parses the file; report the steady state after it
+        for step in range(args.steps + 1):
+            started = time.perf_counter()
+            await ingestor.ingest(USER_ID, new_rows(sample, day, args.batch, step))
+            if step:
+                times.append(time.perf_counter() - started)
+    finally:
+        ingestion._write_chunks_temp = write
+    return np.median(times) * 1000, np.median(writes[1:]) * 1000
+
+
+def full_rebuild(path: str, sample, day: date, bundle, args):
+    times = []
+    for step in range(args.steps):
+        started = time.perf_counter()
+        with open(path, "r", encoding="utf-8") as f:
+            profile = json.load(f)
+        profile["transactions3Current"].extend(new_rows(sample, day, args.batch, step))
+        enrich_users([profile], bundle)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(profile, f, ensure_ascii=False)
+        times.append(time.perf_counter() - started)
+    return np.median(times) * 1000
+
+
+async def main(args):
+    with open(SAMPLE_PATH, "r", encoding="utf-8") as f:
+        sample = json.load(f)
+    bundle = load_bundle()
+    workdir = tempfile.mkdtemp(prefix="ingest-bench-")
+    path = os.path.join(workdir, f"{USER_ID}.json")
+    ProfileStore("bench", lambda user_id: path)
+    print(f"{'history':>9} {'batch':>6} {'incremental ms':>15} {'(write ms)':>11} {'full rebuild ms':>16} {'speedup':>8}")
+    try:
+        for rows in args.history:
+            profile, day = synthetic_profile(sample, rows)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(profile, f, ensure_ascii=False)
+            step_ms, write_ms = await incremental(path, sample, day, args)
+
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(profile, f, ensure_ascii=False)
+            rebuild_ms = full_rebuild(path, sample, day, bundle, args)
+            print(f"{rows:>9} {args.batch:>6} {step_ms:>15.1f} {write_ms:>11.1f} {rebuild_ms:>16.1f} {rebuild_ms / step_ms:>7.1f}x")
+    finally:
+        await ingestion.scorer.close()
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--batch", type=int, default=5, help="rows appended per step")
+    parser.add_argument("--steps", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,110 @@
+"""
+Accuracy and latency of the local intent router on a labeled query set
+(benchmarks/intent_queries.jsonl), and /support/ask-banker latency with and
+without it against the stub LLM.
+
+A query counts as correct when a product question gets the right intent and
+product, or when an out-of-scope question (intent "llm") goes to the LLM.
+
+    cd backend && python benchmarks/intent_router.py --latency 0.3
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+import numpy as np  # noqa: E402
+
+from stub_llm import StubServer  # noqa: E402
+
+QUERIES_PATH = os.path.join(BACKEND_DIR, "benchmarks", "intent_queries.jsonl")
+
+
+def load_queries():
+    with open(QUERIES_PATH, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(router, queries, repeats: int):
+    correct = local = local_correct = expected_local = 0
+    mistakes = []
+    for q in queries:
+        route = router.route(q["text"])
+        answered = route.answer is not None
+        ok = (route.intent == q["intent"] and route.product == q["product"]) if answered else q["intent"] == "llm"
+        correct += ok
+        local += answered
+        local_correct += answered and ok
+        expected_local += q["intent"] != "llm"
+        if not ok:
+            mistakes.append((q["text"], q["intent"], route.intent, route.product, route.confidence))
+
+    timings = []
+    for _ in range(repeats):
+        for q in queries:
+            start = time.perf_counter()
+            router.route(q["text"])
+            timings.append(time.perf_counter() - start)
+    p50, p99 = np.percentile(np.array(timings) * 1e6, [50, 99])
+
+    print(f"queries: {len(queries)} ({expected_local} answerable locally)")
+    print(f"accuracy:            {correct / len(queries):.1%}")
+    print(f"local precision:     {local_correct / local:.1%} of {local} local answers")
+    print(f"local recall:        {local_correct / expected_local:.1%}")
+    print(f"route latency:       p50 {p50:.0f} us, p99 {p99:.0f} us")
+    for text, expected, intent, product, confidence in mistakes:
+        print(f"  miss: {text!r} expected {expected}, got {intent}/{product} ({confidence})")
+
+
+async def endpoint_latency(queries, latency: float):
+    import httpx
+
+    from bank_config import app
+    from completion_cache import completion_cache
+    from llm_client import llm_client
+    from npc_support import intent_router
+
+    await llm_client.start()
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://npc", timeout=60) as client:
+            print(f"\n/support/ask-banker, stub LLM latency {latency * 1000:.0f} ms")
+            print(f"{'mode':<10} {'p50 ms':>8} {'p95 ms':>8} {'LLM calls':>10}")
+            for mode, threshold in (("llm only", 2.0), ("router", intent_router.min_confidence)):
+                intent_router.min_confidence = threshold
+                completion_cache.memory._entries.clear()
+                calls = completion_cache.misses
+                latencies = []
+                for q in queries:
+                    start = time.perf_counter()
+                    response = await client.post("/support/ask-banker", json={"text": q["text"]})
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                p50, p95 = np.percentile(np.array(latencies) * 1000, [50, 95])
+                print(f"{mode:<10} {p50:>8.1f} {p95:>8.1f} {completion_cache.misses - calls:>10}")
+    finally:
+        await llm_client.aclose()
+
+
+def main(args):
+    with StubServer(latency=args.latency) as url:
+        # Before the backend modules are imported: the LLM client reads it at import
+        os.environ["BANK_BASE_URL"] = url
+        from intent_router import IntentRouter
+
+        queries = load_queries()
+        evaluate(IntentRouter(), queries, args.repeats)
+        asyncio.run(endpoint_latency(queries, args.latency))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.3, help="stub LLM latency in seconds")
+    parser.add_argument("--repeats", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,132 @@
+"""
+Bytes and microseconds of the JSON work in one request, before (json module,
+FastAPI's jsonable_encoder + JSONResponse, pretty-printed prompt data) and
+after json_codec.py (orjson when installed, compact output, bodies memoized
+per profile version).
+
+Cases:
+- profile load: parsing the enriched demo profile file (once per file version);
+- LLM request body / LLM response: one analyst chat-completions call;
+- SSE events: a 200-delta streamed reply;
+- cache key: completion_cache.cache_key of the analyst payload;
+- /analyst/stats and /analyst/score-transactions response bodies;
+- prompt data: the transaction list as the prompts embedded it originally
+  (json.dumps(indent=2)) against compact JSON, in bytes and tokens.
+
+    cd backend && python benchmarks/json_serialization.py --repeats 200
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+import json_codec  # noqa: E402
+from analytics import AnalyticsIndex  # noqa: E402
+from completion_cache import cache_key, normalize_text  # noqa: E402
+from json_codec import JSONBytesResponse, dumps, dumps_text, fragments, loads  # noqa: E402
+from llm_client import build_payload  # noqa: E402
+from npc_analyst import build_analysis_messages  # noqa: E402
+from prompt_context import build_context, render_context  # noqa: E402
+from tokens import count_tokens  # noqa: E402
+
+PROFILE_PATH = "user_full_banking_data_enriched.json"
+SSE_DELTAS = 200
+SCORED_TRANSACTIONS = 50
+
+
+def timed(function, repeats: int) -> float:
+    """Median microseconds per call."""
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return samples[len(samples) // 2] * 1e6
+
+
+def old_cache_blob(payload) -> bytes:
+    normalized = {"messages": [[m["role"], normalize_text(m["content"])] for m in payload["messages"]],
+                  "params": {k: v for k, v in payload.items() if k not in ("messages", "stream", "user")}}
+    return json.dumps(normalized, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def old_cache_key(payload) -> str:
+    """completion_cache.cache_key before json_codec."""
+    return hashlib.sha256(old_cache_blob(payload)).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+    repeats = args.repeats
+
+    with open(PROFILE_PATH, "rb") as f:
+        raw = f.read()
+    profile = json.loads(raw)
+    index = AnalyticsIndex(profile)
+    summary = render_context(build_context(profile, index))
+    payload = build_payload(
+        build_analysis_messages("Сколько я потратил на кофе в августе?", summary), max_tokens=1500, temperature=0.7
+    )
+    reply = "Ассаламу алейкум! " * 40
+    response = {"id": "chatcmpl-1", "choices": [{"message": {"role": "assistant", "content": reply}}],
+                "usage": {"prompt_tokens": 900, "completion_tokens": 300}}
+    response_raw = json.dumps(response, ensure_ascii=False).encode("utf-8")
+    stats = index.to_dict()
+    transactions = profile["transactions1"][:SCORED_TRANSACTIONS]
+    predictions = {"predictions": [{"transaction_id": tx.get("transaction_id"), "is_spontanius_predicted": False,
+                                    "probability": 0.1234} for tx in transactions]}
+    deltas = [{"text": word + " "} for word in reply.split()][:SSE_DELTAS]
+    prompt_rows = profile["transactions3Current"]
+
+    def old_response(content):
+        return JSONResponse(jsonable_encoder(content)).body
+
+    stats_key = ("bench_stats",)
+    cases = [
+        ("profile load", lambda: json.loads(raw.decode("utf-8")), lambda: loads(raw), len(raw), len(raw)),
+        ("LLM request body", lambda: json.dumps(payload, ensure_ascii=False).encode("utf-8"), lambda: dumps(payload),
+         len(json.dumps(payload, ensure_ascii=False).encode("utf-8")), len(dumps(payload))),
+        ("LLM response", lambda: json.loads(response_raw), lambda: loads(response_raw), len(response_raw), len(response_raw)),
+        ("SSE events", lambda: [json.dumps(d, ensure_ascii=False) for d in deltas], lambda: [dumps_text(d) for d in deltas],
+         sum(len(json.dumps(d, ensure_ascii=False).encode("utf-8")) for d in deltas), sum(len(dumps(d)) for d in deltas)),
+        ("cache key", lambda: old_cache_key(payload), lambda: cache_key(payload),
+         len(old_cache_blob(payload)), len(old_cache_blob(payload))),
+        ("/analyst/stats", lambda: old_response(stats),
+         lambda: JSONBytesResponse(fragments.get(stats_key, lambda: stats)).body,
+         len(old_response(stats)), len(dumps(stats))),
+        ("score response", lambda: old_response(predictions), lambda: JSONBytesResponse(predictions).body,
+         len(old_response(predictions)), len(dumps(predictions))),
+        ("prompt data", lambda: json.dumps(prompt_rows, indent=2, ensure_ascii=False), lambda: dumps_text(prompt_rows),
+         len(json.dumps(prompt_rows, indent=2, ensure_ascii=False).encode("utf-8")), len(dumps(prompt_rows))),
+    ]
+
+    encoder = "orjson" if json_codec.orjson is not None else "json (orjson not installed)"
+    print(f"encoder: {encoder}")
+    print(f"{'case':<18} {'bytes before':>12} {'bytes after':>12} {'us before':>10} {'us after':>10} {'speedup':>8}")
+    per_request = [0.0, 0.0]
+    for name, before, after, bytes_before, bytes_after in cases:
+        us_before, us_after = timed(before, repeats), timed(after, repeats)
+        if name not in ("profile load", "prompt data"):
+            per_request[0] += us_before
+            per_request[1] += us_after
+        print(f"{name:<18} {bytes_before:>12} {bytes_after:>12} {us_before:>10.1f} {us_after:>10.1f} {us_before / us_after:>7.1f}x")
+    print(f"{'per request':<18} {'':>12} {'':>12} {per_request[0]:>10.1f} {per_request[1]:>10.1f} "
+          f"{per_request[0] / per_request[1]:>7.1f}x   (all cases except profile load and prompt data)")
+    pretty = json.dumps(prompt_rows, indent=2, ensure_ascii=False)
+    print(f"prompt data tokens: {count_tokens(pretty)} pretty-printed vs {count_tokens(dumps_text(prompt_rows))} compact")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Burst simulation for the LLM dispatch scheduler (llm_scheduler.py) against the
+local stub completion server.
+
+A game event makes a few players fire many long analyses at once; shortly
+after, many other players ask short banker / support questions. Compared:
+
+    fifo       one priority, one user, unbounded queue (plain semaphore behaviour)
+    scheduler  priorities + per-user round robin + bounded queue with 429 shedding
+
+Reported per request class: completed, shed (429), p50 / p99 latency, plus the
+highest upstream concurrency and the achieved requests/min when --rpm is set.
+
+    cd backend && python benchmarks/llm_scheduler.py --latency 0.2 --concurrency 16
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+import numpy as np  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+
+from stub_llm import StubServer  # noqa: E402
+
+# (class name, max_tokens) as sent by the NPC routers
+CLASSES = {"banker": 500, "support": 1000, "analyst": 1500}
+
+
+def requests_plan(args):
+    """(arrival offset, class, user) for every request of the burst."""
+    plan = []
+    for user in range(args.heavy_users):
+        plan += [(0.0, "analyst", f"heavy_{user}")] * args.analyses_per_user
+    for user in range(args.players):
+        plan.append((args.players_delay, "support" if user % 2 else "banker", f"player_{user}"))
+    return plan
+
+
+async def run(mode: str, url: str, args):
+    from llm_client import LLMClient, build_payload
+    from llm_scheduler import NORMAL, LLMScheduler, request_user
+
+    fifo = mode == "fifo"
+    scheduler = LLMScheduler(
+        max_concurrency=args.concurrency,
+        max_queue=10 ** 9 if fifo else args.queue,
+        queue_timeout=3600 if fifo else args.queue_timeout,
+        requests_per_minute=args.rpm,
+    )
+    client = LLMClient(base_url=url, max_concurrency=args.concurrency, scheduler=scheduler)
+    await client.start()
+    latencies = {name: [] for name in CLASSES}
+    shed = {name: 0 for name in CLASSES}
+
+    async def one(offset: float, name: str, user: str, i: int):
+        await asyncio.sleep(offset)
+        request_user.set("-" if fifo else user)
+        payload = build_payload([{"role": "user", "content": f"{name} question #{i}"}], max_tokens=CLASSES[name])
+        started = time.perf_counter()
+        try:
+            await client.chat_completion(payload, priority=NORMAL if fifo else None)
+        except HTTPException as e:
+            if e.status_code != 429:
+                raise
+            shed[name] += 1
+            return
+        latencies[name].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(offset, name, user, i) for i, (offset, name, user) in enumerate(requests_plan(args))))
+    elapsed = time.perf_counter() - started
+    await client.aclose()
+
+    for name in CLASSES:
+        values = np.array(latencies[name]) * 1000
+        p50, p99 = np.percentile(values, [50, 99]) if len(values) else (float("nan"), float("nan"))
+        print(f"{mode:<10} {name:<8} {len(values):>6} {shed[name]:>6} {p50:>9.0f} {p99:>9.0f}")
+    completed = sum(len(v) for v in latencies.values())
+    print(f"{mode:<10} (upstream max concurrency {scheduler.max_active}, max queue {scheduler.max_waiting}, "
+          f"{completed / elapsed * 60:.0f} req/min over {elapsed:.1f}s)")
+
+
+async def main(args):
+    with StubServer(latency=args.latency) as url:
+        print(f"{'mode':<10} {'class':<8} {'done':>6} {'429':>6} {'p50 ms':>9} {'p99 ms':>9}")
+        for mode in ("fifo", "scheduler"):
+            await run(mode, url, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub seconds per completion")
+    parser.add_argument("--concurrency", type=int, default=16, help="upstream calls at once")
+    parser.add_argument("--queue", type=int, default=128, help="scheduler queue size")
+    parser.add_argument("--queue-timeout", type=float, default=30.0)
+    parser.add_argument("--rpm", type=float, default=0, help="requests/min bucket (0 = off)")
+    parser.add_argument("--heavy-users", type=int, default=5)
+    parser.add_argument("--analyses-per-user", type=int, default=40)
+    parser.add_argument("--players", type=int, default=100, help="players asking one short question each")
+    parser.add_argument("--players-delay", type=float, default=0.05, help="seconds after the burst they arrive")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,64 @@
+"""
+Load test: concurrent NPC requests against a local stub completion server.
+
+With the shared async client the event loop stays free during the upstream
+round trip, so throughput grows with concurrency instead of staying at
+1 / latency requests per second.
+
+    cd backend && python benchmarks/load_llm_client.py --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+from stub_llm import StubServer  # noqa: E402
+
+
+async def run_level(client, concurrency: int, total: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            response = await client.post("/support/ask-banker", json={"text": f"Что такое мурабаха? #{i}"})
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return time.perf_counter() - start
+
+
+async def main(args):
+    import httpx
+
+    with StubServer(latency=args.latency) as url:
+        os.environ["BANK_BASE_URL"] = url
+        from bank_config import app
+        from llm_client import llm_client
+
+        await llm_client.start()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://npc", timeout=120) as client:
+            print(f"stub latency: {args.latency:.3f}s, serialized ceiling: {1 / args.latency:.1f} req/s")
+            print(f"{'concurrency':>11} {'requests':>9} {'seconds':>8} {'req/s':>8} {'speedup':>8}")
+            baseline = None
+            for concurrency in args.levels:
+                total = concurrency * args.rounds
+                elapsed = await run_level(client, concurrency, total)
+                throughput = total / elapsed
+                baseline = baseline or throughput
+                print(f"{concurrency:>11} {total:>9} {elapsed:>8.2f} {throughput:>8.1f} {throughput / baseline:>7.1f}x")
+        await llm_client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub completion latency, seconds")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--rounds", type=int, default=3, help="requests per concurrency slot")
+    asyncio.run(main(parser.parse_args()))
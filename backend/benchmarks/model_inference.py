@@ -0,0 +1,96 @@
+"""
+Cold start, memory and per-row latency of the exported NumPy forest
+(spontaneous_model.npz) against the pickled scikit-learn bundle.
+
+    cd backend && python tree_model.py export && python benchmarks/model_inference.py
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import warnings
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+warnings.filterwarnings("ignore")
+
+import numpy as np  # noqa: E402
+
+from enrichment import user_lists  # noqa: E402
+from features import build_feature_matrix, extract_columns  # noqa: E402
+from tree_model import MODEL_NPZ_PATH, MODEL_PATH, BundlePredictor, TreePredictor, load_predictor  # noqa: E402
+
+SAMPLE_PATH = "user_full_banking_data.json"
+
+# Run in a fresh interpreter: imports + model load, then peak RSS. VmHWM is
+# read from /proc because ru_maxrss keeps the parent's peak across fork/exec
+COLD_START = """
+import sys, time, warnings
+warnings.filterwarnings("ignore")
+start = time.perf_counter()
+from tree_model import load_predictor
+predictor = load_predictor({model!r}, {npz!r})
+elapsed = time.perf_counter() - start
+with open("/proc/self/status") as f:
+    peak_kb = next(int(line.split()[1]) for line in f if line.startswith("VmHWM"))
+print(elapsed, peak_kb, "sklearn" in sys.modules, "pandas" in sys.modules)
+"""
+
+
+def cold_start(model_path: str, npz_path: str, repeats: int):
+    runs = []
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, "-c", COLD_START.format(model=model_path, npz=npz_path)],
+            capture_output=True, text=True, check=True,
+        ).stdout.split()
+        runs.append((float(out[0]), int(out[1]) / 1024, out[2] == "True", out[3] == "True"))
+    seconds = np.median([r[0] for r in runs])
+    return seconds, runs[0][1], runs[0][2], runs[0][3]
+
+
+def latency_us(predictor, X: np.ndarray, batch: int, repeats: int) -> float:
+    rows = X[:batch]
+    predictor.predict_proba(rows)  # warm-up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predictor.predict_proba(rows)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) / len(rows) * 1e6
+
+
+def main(args):
+    if not os.path.exists(MODEL_NPZ_PATH):
+        sys.exit(f"{MODEL_NPZ_PATH} not found: run `python tree_model.py export` first")
+
+    with open(SAMPLE_PATH, "r", encoding="utf-8") as f:
+        user = json.load(f)
+    lists = user_lists([user]) * max(1, args.rows // 300 + 1)
+    X = build_feature_matrix(extract_columns(lists))[:args.rows]
+
+    pickled = load_predictor(MODEL_PATH, npz_path=None)
+    exported = TreePredictor.load(MODEL_NPZ_PATH)
+    assert isinstance(pickled, BundlePredictor)
+    identical = np.array_equal(pickled.predict_proba(X), exported.predict_proba(X))
+    print(f"{len(X)} rows, predict_proba bit-identical: {identical}\n")
+
+    print(f"{'backend':<8} {'cold s':>7} {'peak MB':>7} {'sklearn':>8} {'pandas':>7}"
+          + "".join(f" {f'us/row@{b}':>11}" for b in args.batches))
+    for name, predictor, npz_path in (("pickle", pickled, None), ("npz", exported, MODEL_NPZ_PATH)):
+        seconds, rss, sklearn, pandas = cold_start(MODEL_PATH, npz_path, args.repeats)
+        row = f"{name:<8} {seconds:>7.3f} {rss:>7.1f} {str(sklearn):>8} {str(pandas):>7}"
+        for batch in args.batches:
+            row += f" {latency_us(predictor, X, batch, args.repeats):>11.1f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 100, 5000])
+    parser.add_argument("--repeats", type=int, default=5)
+    main(parser.parse_args())
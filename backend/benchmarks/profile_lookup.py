@@ -0,0 +1,120 @@
+"""
+Profile lookup latency as the number of stored users grows (sharded per-user
+JSON files + index, see profile_shards.py).
+
+Fills a temporary profile directory up to each user count, then hammers it
+with concurrent ProfileStore lookups of random users: a hot set that fits the
+LRU (cache hits) and uniformly random users (mostly parses of one small file).
+Event-loop lag (p99) is sampled meanwhile: parsing runs in worker threads, so the
+loop should stay responsive.
+
+    cd backend && python benchmarks/profile_lookup.py --users 100 1000 10000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+import numpy as np  # noqa: E402
+
+from analytics import TRANSACTION_KEYS  # noqa: E402
+from profile_shards import ProfileShards  # noqa: E402
+from profile_store import ProfileStore  # noqa: E402
+
+SAMPLE_PATH = "user_full_banking_data_enriched.json"
+HOT_USERS = 200
+
+
+def make_profiles(template, start: int, stop: int, transactions: int):
+    for i in range(start, stop):
+        user = dict(template, user_id=f"user_{i:06d}", age=18 + i % 50, monthly_income=150_000 + i % 97 * 5_000)
+        for key in TRANSACTION_KEYS:
+            user[key] = template[key][:transactions]
+        yield user
+
+
+async def loop_lag(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - start - 0.001)
+
+
+async def hammer(store: ProfileStore, user_ids, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(user_id: str):
+        async with semaphore:
+            await asyncio.sleep(0)  # a request arrives: let other tasks run
+            start = time.perf_counter()
+            await store.get_entry(user_id)
+            latencies.append(time.perf_counter() - start)
+
+    stop, lags = asyncio.Event(), []
+    sampler = asyncio.create_task(loop_lag(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(one(random.choice(user_ids)) for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+    return np.array(latencies) * 1000, requests / elapsed, float(np.percentile(lags, 99)) * 1000 if lags else 0.0
+
+
+def index_lookup_us(shards: ProfileShards, user_ids, repeats: int = 20000) -> float:
+    sample = [random.choice(user_ids) for _ in range(repeats)]
+    start = time.perf_counter()
+    for user_id in sample:
+        shards.path_for(user_id)
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+async def main(args):
+    random.seed(0)
+    with open(SAMPLE_PATH, "r", encoding="utf-8") as f:
+        template = json.load(f)
+
+    root = tempfile.mkdtemp(prefix="profiles-")
+    shards = ProfileShards(root)
+    try:
+        print(f"{'users':>7} {'index us':>9} {'mode':<8} {'p50 ms':>7} {'p99 ms':>7} {'hit %':>6} {'req/s':>8} {'loop lag p99 ms':>16}")
+        stored = 0
+        for count in sorted(args.users):
+            started = time.perf_counter()
+            for first in range(stored, count, 1000):
+                shards.put_many(make_profiles(template, first, min(first + 1000, count), args.transactions))
+            stored = count
+            fill = time.perf_counter() - started
+
+            user_ids = shards.user_ids()
+            index_us = index_lookup_us(shards, user_ids)
+            for mode, pool in (("hot", user_ids[:HOT_USERS]), ("uniform", user_ids)):
+                store = ProfileStore(f"bench-{count}-{mode}", shards.resolver(), max_entries=args.cache)
+                await hammer(store, pool, min(args.requests, 500), args.concurrency)  # warm-up
+                store.hits = store.misses = 0
+                latencies, throughput, lag = await hammer(store, pool, args.requests, args.concurrency)
+                p50, p99 = np.percentile(latencies, [50, 99])
+                hit_ratio = store.stats()["hit_ratio"] * 100
+                print(f"{count:>7} {index_us:>9.2f} {mode:<8} {p50:>7.2f} {p99:>7.2f} {hit_ratio:>6.1f} {throughput:>8.0f} {lag:>16.2f}")
+            print(f"        (stored {count} users in {fill:.1f}s)")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--cache", type=int, default=256, help="ProfileStore LRU size")
+    parser.add_argument("--transactions", type=int, default=10, help="transactions kept per period in generated profiles")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,126 @@
+"""
+Prompt size benchmark: full-JSON prompts (previous behaviour) against the
+compact summary from prompt_context; then the prompt_layout sections per NPC,
+the prefix two questions share (what a provider prompt cache can
+reuse between two questions of one user) and the budget cut of a long conversation
+(under an explicit PROMPT_TOKEN_BUDGET, 8000 unless set: the derived budget
+of a 128k-context model would keep the whole conversation).
+
+    cd backend && python benchmarks/prompt_tokens.py
+"""
+import json
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+os.environ.setdefault("PROMPT_TOKEN_BUDGET", "8000")
+
+import npc_analyst  # noqa: E402
+import npc_banker  # noqa: E402
+import npc_support  # noqa: E402
+from npc_analyst import USER_DATA_PATH as ANALYST_DATA_PATH, build_analysis_messages  # noqa: E402
+from npc_banker import USER_DATA_PATH as BANKER_DATA_PATH, build_services_messages  # noqa: E402
+from profile_store import ProfileStore  # noqa: E402
+from prompt_context import build_context, context_for, render_context  # noqa: E402
+from prompt_layout import SECTIONS  # noqa: E402
+from tokens import TOKENIZER, count_tokens  # noqa: E402
+
+QUERY = "Сравни мои расходы по месяцам и скажи, какие подписки мне не нужны"
+OTHER_QUERY = "Могу ли я взять ипотеку на квартиру за 30 миллионов?"
+LONG_HISTORY_TURNS = 60
+
+
+def legacy_analyst_prompt(user_data):
+    return f"\nFinancial Data (JSON):\n{json.dumps(user_data, indent=2)}\n\nUser Query: {QUERY}\n"
+
+
+def legacy_services_prompt(user_data):
+    transactions = []
+    for key in ["transactions1", "transactions2", "transactions3Current"]:
+        transactions.extend(user_data.get(key, []))
+    return (
+        f"Transactions: {json.dumps(transactions, indent=2, ensure_ascii=False)}\n"
+        f"Subscriptions: {json.dumps(user_data.get('subscriptions', []), indent=2)}\n\n"
+    )
+
+
+def messages_text(messages):
+    return "\n".join(m["content"] for m in messages)
+
+
+def shared_prefix_tokens(a, b):
+    """Tokens of the common prefix of two message lists (the part a prefix cache can reuse)."""
+    a, b = messages_text(a), messages_text(b)
+    n = 0
+    while n < min(len(a), len(b)) and a[n] == b[n]:
+        n += 1
+    return count_tokens(a[:n])
+
+
+def layout_report(analyst_summary, banker_entry, banker_summary):
+    print(f"\n{'layout':<10} {'budget':>7} " + " ".join(f"{s:>8}" for s in SECTIONS) + f" {'total':>7} {'shared':>7}")
+    cases = {
+        "analyst": (npc_analyst.layout, lambda q: dict(query=f"User Query: {q}", profile=f"Financial Summary:\n{analyst_summary}")),
+        "banker": (npc_banker.query_layout, lambda q: dict(query=f"User Query: {q}", profile=f"User Data (summary):\n{banker_summary}")),
+        "support": (npc_support.layout, lambda q: dict(query=f"User Question: {q}")),
+    }
+    for name, (layout, sections) in cases.items():
+        prompt = layout.build(**sections(QUERY))
+        shared = shared_prefix_tokens(prompt.messages, layout.build(**sections(OTHER_QUERY)).messages)
+        print(f"{name:<10} {prompt.budget:>7} " + " ".join(f"{prompt.tokens[s]:>8}" for s in SECTIONS)
+              + f" {prompt.total:>7} {shared:>7}")
+    services = [build_services_messages(banker_entry.data, banker_summary, query) for query in (QUERY, OTHER_QUERY)]
+    print(f"services: {shared_prefix_tokens(*services)} of {count_tokens(messages_text(services[0]))} tokens shared")
+
+    turns = [{"role": role, "content": f"Turn {i}: " + "расходы на кофе и подписки " * 40}
+             for i in range(LONG_HISTORY_TURNS) for role in ("user", "assistant")]
+    prompt = npc_analyst.layout.build(query=f"User Query: {QUERY}", profile=f"Financial Summary:\n{analyst_summary}",
+                                      history=turns)
+    kept = len(prompt.messages) - 3
+    print(f"analyst, {len(turns)}-message history: {prompt.total} of {prompt.budget} budget tokens, "
+          f"{kept} messages kept, cut {({s: n for s, n in prompt.cut.items() if n})}")
+
+
+def report(name, old, new):
+    old_tokens, new_tokens = count_tokens(old), count_tokens(new)
+    print(f"{name:<28} {len(old):>9} {len(new):>9} {old_tokens:>9} {new_tokens:>9} {old_tokens / max(new_tokens, 1):>7.1f}x")
+
+
+def main():
+    analyst_entry = ProfileStore("bench-analyst", lambda user_id: ANALYST_DATA_PATH).load_entry("bench")
+    banker_entry = ProfileStore("bench-banker", lambda user_id: BANKER_DATA_PATH).load_entry("bench")
+
+    print(f"token counter: {TOKENIZER}")
+    print(f"{'prompt':<28} {'old chars':>9} {'new chars':>9} {'old tok':>9} {'new tok':>9} {'ratio':>8}")
+    analyst_summary = context_for(analyst_entry)
+    report(
+        "analyst user prompt",
+        legacy_analyst_prompt(analyst_entry.data),
+        messages_text(build_analysis_messages(QUERY, analyst_summary)[1:]),
+    )
+    banker_summary = context_for(banker_entry)
+    new_services = messages_text(build_services_messages(banker_entry.data, banker_summary, QUERY))
+    old_services = new_services.replace(
+        f"Spending summary (transactions and subscriptions):\n{banker_summary}",
+        legacy_services_prompt(banker_entry.data),
+    )
+    report("banker suggest-services", old_services, new_services)
+    layout_report(analyst_summary, banker_entry, banker_summary)
+
+    runs = 50
+    start = time.perf_counter()
+    for _ in range(runs):
+        render_context(build_context(analyst_entry.data))
+    build_ms = (time.perf_counter() - start) / runs * 1000
+    start = time.perf_counter()
+    for _ in range(10_000):
+        context_for(analyst_entry)
+    cached_us = (time.perf_counter() - start) / 10_000 * 1e6
+    print(f"\ncontext build: {build_ms:.1f} ms per profile version, cached lookup: {cached_us:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Local retrieval (retrieval.py) for the NPC prompts: index build time, query
+latency and how many prompt tokens the retrieved block takes compared with
+listing every transaction (or the whole FAQ).
+
+The demo user's transactions are repeated to `--history` rows per profile,
+spread over the months of the sample year; each size is queried with QUERIES.
+
+    cd backend && python benchmarks/retrieval.py --history 300 10000 100000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+import numpy as np  # noqa: E402
+
+from analytics import TRANSACTION_KEYS  # noqa: E402
+from faq import FAQ  # noqa: E402
+from retrieval import TransactionIndex, faq_retriever, render_matches  # noqa: E402
+from tokens import count_tokens  # noqa: E402
+
+SAMPLE_PATH = "as.json"
+
+QUERIES = [
+    "How much did I spend on coffee in August?",
+    "Сколько я потратил на такси в сентябре?",
+    "что я покупал на Wildberries",
+    "расходы на спортзал",
+    "Netflix",
+    "покажи траты за октябрь 2025",
+    "траты в Казани",
+    "subscriptions and streaming",
+]
+
+FAQ_QUERIES = [
+    "Что такое мурабаха?",
+    "what is riba",
+    "есть ли штрафы за просрочку",
+    "можно ли погасить досрочно",
+    "how does an islamic mortgage work",
+    "закят сколько платить",
+]
+
+
+def synthetic_transactions(sample, rows: int):
+    source = [tx for key in TRANSACTION_KEYS for tx in sample.get(key) or []]
+    transactions = []
+    for i in range(rows):
+        tx = dict(source[i % len(source)])
+        # Keep the sample's month and day, shift whole copies back by years
+        tx["date"] = f"{int(tx['date'][:4]) - i // len(source)}{tx['date'][4:]}"
+        transactions.append(tx)
+    return transactions
+
+
+def render_all(transactions) -> str:
+    """Every transaction in the row format of render_matches: the prompt without retrieval."""
+    return "\n".join(
+        f"- {tx.get('date')} {tx.get('merchant') or '?'} {float(tx.get('amount') or 0):g}"
+        f" ({tx.get('category_name') or tx.get('category')} / {tx.get('subcategory')})"
+        for tx in transactions
+    )
+
+
+def percentiles(samples):
+    ms = np.array(samples) * 1000
+    return np.percentile(ms, 50), np.percentile(ms, 99)
+
+
+def bench_history(sample, rows: int, repeats: int):
+    transactions = synthetic_transactions(sample, rows)
+    started = time.perf_counter()
+    index = TransactionIndex.from_transactions(transactions)
+    build = time.perf_counter() - started
+
+    times, retrieved = [], []
+    for _ in range(repeats):
+        for query in QUERIES:
+            started = time.perf_counter()
+            render_matches(index.search(query))
+            times.append(time.perf_counter() - started)
+    for query in QUERIES:
+        retrieved.append(count_tokens(render_matches(index.search(query))))
+    p50, p99 = percentiles(times)
+    full = count_tokens(render_all(transactions))
+    return {
+        "rows": rows,
+        "documents": index.text.size,
+        "build_ms": round(build * 1000, 1),
+        "query_p50_ms": round(p50, 3),
+        "query_p99_ms": round(p99, 3),
+        "all_rows_tokens": full,
+        "retrieved_tokens_avg": round(float(np.mean(retrieved)), 1),
+        "retrieved_tokens_max": max(retrieved),
+    }
+
+
+def bench_faq(repeats: int):
+    times = []
+    for _ in range(repeats):
+        for query in FAQ_QUERIES:
+            started = time.perf_counter()
+            faq_retriever.context(query)
+            times.append(time.perf_counter() - started)
+    p50, p99 = percentiles(times)
+    whole = "\n".join(f"Q: {e['question']['ru']}\nA: {e['answer']['ru']}" for e in FAQ)
+    retrieved = [count_tokens(faq_retriever.context(query)) for query in FAQ_QUERIES]
+    return {
+        "entries": len(FAQ),
+        "query_p50_ms": round(p50, 3),
+        "query_p99_ms": round(p99, 3),
+        "whole_faq_tokens": count_tokens(whole),
+        "retrieved_tokens_avg": round(float(np.mean(retrieved)), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=int, nargs="+", default=[300, 10000, 100000], help="transactions per profile")
+    parser.add_argument("--repeats", type=int, default=20, help="passes over the query set")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    with open(SAMPLE_PATH, "r", encoding="utf-8") as f:
+        sample = json.load(f)
+
+    results = {"transactions": [], "faq": bench_faq(args.repeats)}
+    print(f"{'rows':>8} {'docs':>6} {'build ms':>9} {'p50 ms':>8} {'p99 ms':>8} {'all rows tok':>13} {'retrieved tok':>14}")
+    for rows in args.history:
+        r = bench_history(sample, rows, args.repeats)
+        results["transactions"].append(r)
+        print(f"{r['rows']:>8} {r['documents']:>6} {r['build_ms']:>9} {r['query_p50_ms']:>8} {r['query_p99_ms']:>8} "
+              f"{r['all_rows_tokens']:>13} {r['retrieved_tokens_avg']:>10} (max {r['retrieved_tokens_max']})")
+    faq = results["faq"]
+    print(f"FAQ: {faq['entries']} entries, query p50 {faq['query_p50_ms']} ms / p99 {faq['query_p99_ms']} ms, "
+          f"{faq['retrieved_tokens_avg']} tokens retrieved vs {faq['whole_faq_tokens']} for the whole FAQ")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
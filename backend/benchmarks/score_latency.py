@@ -0,0 +1,69 @@
+"""
+Latency of /analyst/score-transactions under concurrent load, with and
+without micro-batching of model calls.
+
+    cd backend && python benchmarks/score_latency.py --requests 400 --levels 1 16 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import warnings
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+warnings.filterwarnings("ignore")
+
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+
+from bank_config import app  # noqa: E402
+from spontaneous_scorer import scorer  # noqa: E402
+
+SAMPLE_PATH = "user_full_banking_data.json"
+
+
+async def run_level(client, transactions, concurrency: int, total: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        batch = transactions[i % 90:i % 90 + 10]
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/analyst/score-transactions", json={"transactions": batch, "monthly_income": 300000})
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return np.array(latencies) * 1000, total / (time.perf_counter() - start)
+
+
+async def main(args):
+    with open(SAMPLE_PATH, "r", encoding="utf-8") as f:
+        transactions = json.load(f)["transactions2"]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://npc") as client:
+        print(f"{'mode':<10} {'conc':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'rows/batch':>10}")
+        for mode, max_batch_rows in (("unbatched", 1), ("batched", scorer.max_batch_rows)):
+            scorer.max_batch_rows = max_batch_rows
+            await scorer.start()
+            await run_level(client, transactions, 4, 20)  # warm-up
+            for concurrency in args.levels:
+                scorer.batches = scorer.rows = 0
+                latencies, throughput = await run_level(client, transactions, concurrency, args.requests)
+                p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+                print(f"{mode:<10} {concurrency:>5} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {throughput:>8.0f} {scorer.stats()['avg_batch_rows']:>10}")
+            await scorer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 16, 64])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,241 @@
+"""
+Local OpenAI-compatible stub of the chat-completions API for benchmarks.
+
+    python benchmarks/stub_llm.py --port 9100 --latency 0.5 --token-rate 50 \
+        --reply-words 120 --error-rate 0.05 --error-status 500 503 429
+
+`latency` is the time to the first token; the reply then takes one word per
+`1 / token-rate` seconds (streamed as it goes with `stream: true`, all at once
+otherwise). Injected faults: `error-rate` answers with one of `error-status`
+(429 carries Retry-After), `cut-rate` drops a streamed reply halfway.
+
+    GET  /stub/stats   requests, errors, in-flight peak, request body sizes
+    POST /stub/reset   clear the counters
+    POST /stub/config  change any setting, e.g. {"latency": 1.0, "error_rate": 0.2}
+"""
+import argparse
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+STUB_REPLY = "Ассаламу алейкум! Это тестовый ответ локального LLM-стаба."
+
+SETTINGS = ("latency", "token_delay", "reply_words", "error_rate", "error_status", "cut_rate")
+
+
+def _reply_words(reply_words: Optional[int]) -> List[str]:
+    words = STUB_REPLY.split(" ")
+    if not reply_words:
+        return words
+    return [words[i % len(words)] for i in range(reply_words)]
+
+
+def _reset(state) -> None:
+    state.requests = 0
+    state.errors = 0
+    state.cuts = 0
+    state.in_flight = 0
+    state.max_in_flight = 0
+    state.request_bytes = []
+
+
+def _enter(state) -> None:
+    state.in_flight += 1
+    state.max_in_flight = max(state.max_in_flight, state.in_flight)
+
+
+def _percentile(values: Sequence[int], q: float) -> int:
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _stream_chunks(app: FastAPI, model: str, words: List[str], cut: bool):
+    async def generate():
+        _enter(app.state)
+        try:
+            await asyncio.sleep(app.state.latency)
+            for i, word in enumerate(words):
+                if cut and i == len(words) // 2:
+                    return  # connection closes without [DONE]
+                if i:
+                    await asyncio.sleep(app.state.token_delay)
+                chunk = {
+                    "object": "chat.completion.chunk",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}}],
+                }
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+        finally:
+            app.state.in_flight -= 1
+    return generate()
+
+
+def create_app(
+    latency: float = 0.5,
+    token_delay: float = 0.0,
+    reply_words: Optional[int] = None,
+    error_rate: float = 0.0,
+    error_status: Sequence[int] = (500,),
+    cut_rate: float = 0.0,
+    seed: Optional[int] = None,
+) -> FastAPI:
+    app = FastAPI(title="Stub LLM")
+    app.state.latency = latency
+    app.state.token_delay = token_delay
+    app.state.reply_words = reply_words
+    app.state.error_rate = error_rate
+    app.state.error_status = list(error_status)
+    app.state.cut_rate = cut_rate
+    app.state.random = random.Random(seed)
+    _reset(app.state)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        state = app.state
+        body = await request.body()
+        payload = json.loads(body)
+        state.requests += 1
+        state.request_bytes.append(len(body))
+
+        if state.error_rate and state.random.random() < state.error_rate:
+            state.errors += 1
+            await asyncio.sleep(state.latency / 10)
+            status = state.random.choice(state.error_status)
+            headers = {"Retry-After": "1"} if status == 429 else None
+            return JSONResponse({"error": {"message": "injected stub error", "code": status}}, status_code=status, headers=headers)
+
+        words = _reply_words(state.reply_words)
+        if payload.get("stream"):
+            cut = bool(state.cut_rate) and state.random.random() < state.cut_rate
+            state.cuts += cut
+            return StreamingResponse(_stream_chunks(app, payload.get("model", "stub"), words, cut), media_type="text/event-stream")
+        _enter(state)
+        try:
+            await asyncio.sleep(state.latency + state.token_delay * len(words))
+        finally:
+            state.in_flight -= 1
+        reply = " ".join(words)
+        prompt_chars = sum(len(m.get("content", "")) for m in payload.get("messages", []))
+        return {
+            "id": f"stub-{state.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_chars // 4,
+                "completion_tokens": len(reply) // 4,
+                "total_tokens": (prompt_chars + len(reply)) // 4,
+            },
+        }
+
+    @app.get("/stub/stats")
+    async def stub_stats() -> Dict[str, Any]:
+        state = app.state
+        sizes = state.request_bytes
+        return {
+            "requests": state.requests,
+            "errors": state.errors,
+            "cuts": state.cuts,
+            "in_flight": state.in_flight,
+            "max_in_flight": state.max_in_flight,
+            "request_bytes": {
+                "mean": round(sum(sizes) / len(sizes)) if sizes else 0,
+                "p50": _percentile(sizes, 0.5),
+                "p95": _percentile(sizes, 0.95),
+                "max": max(sizes, default=0),
+            },
+            "settings": {name: getattr(state, name) for name in SETTINGS},
+        }
+
+    @app.post("/stub/reset")
+    async def stub_reset() -> Dict[str, Any]:
+        _reset(app.state)
+        return {"ok": True}
+
+    @app.post("/stub/config")
+    async def stub_config(request: Request) -> Dict[str, Any]:
+        changes = await request.json()
+        for name, value in changes.items():
+            if name in SETTINGS:
+                setattr(app.state, name, value)
+        return {name: getattr(app.state, name) for name in SETTINGS}
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class StubServer:
+    """Runs the stub in a background thread: `with StubServer(latency=0.2) as url: ...` (create_app options as keywords)."""
+
+    def __init__(self, latency: float = 0.5, token_delay: float = 0.0, port: int = 0, **options):
+        self.app = create_app(latency, token_delay, **options)
+        self.port = port or free_port()
+        config = uvicorn.Config(self.app, host="127.0.0.1", port=self.port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> str:
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self.url
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Stub options shared with the benchmarks that start their own stub."""
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds to the first token")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="reply words per second (0 = instant)")
+    parser.add_argument("--reply-words", type=int, default=None, help="reply length in words (default: a short greeting)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with an error")
+    parser.add_argument("--error-status", type=int, nargs="+", default=[500], help="status codes of injected errors")
+    parser.add_argument("--cut-rate", type=float, default=0.0, help="share of streamed replies dropped halfway")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def options_from(args: argparse.Namespace) -> Dict[str, Any]:
+    return {
+        "latency": args.latency,
+        "token_delay": 1.0 / args.token_rate if args.token_rate else 0.0,
+        "reply_words": args.reply_words,
+        "error_rate": args.error_rate,
+        "error_status": args.error_status,
+        "cut_rate": args.cut_rate,
+        "seed": args.seed,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(**options_from(args)), host="127.0.0.1", port=args.port)
@@ -0,0 +1,176 @@
+"""
+Throughput of server.py from 1 to N worker processes on a CPU-bound route
+mix (analytics stats, model scoring, what-if simulation, locally answered
+support questions and analyst chats against the stub LLM), plus the memory
+the workers really use: RSS counts shared copy-on-write pages once per
+worker, PSS splits them between the processes sharing them (Linux only).
+
+Load comes from --clients separate processes so the client is not the
+bottleneck. Each worker count gets a fresh server and a fresh shared cache
+directory.
+
+    cd backend && python benchmarks/worker_scaling.py --workers 1 2 4 8 --duration 10
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+
+import stub_llm  # noqa: E402
+
+SAMPLE_PATH = "as.json"
+SCORED_TRANSACTIONS = 50
+
+
+def request_mix(transactions: List[Dict[str, Any]]):
+    """(method, path, body factory) cycled through by every client connection."""
+    return [
+        ("GET", "/analyst/stats", None),
+        ("POST", "/analyst/score-transactions", lambda i: {"transactions": transactions}),
+        ("POST", "/banker/simulate", lambda i: {"amount": 1_000_000 + i, "term_months": 24}),
+        ("POST", "/support/ask-banker", lambda i: {"text": "Какой срок у мурабахи?", "session_id": f"scale-{i}"}),
+        ("POST", "/analyst/analyze-finances", lambda i: {"text": f"Сколько я потратил на кофе в августе? (#{i})", "session_id": f"scale-{i}"}),
+    ]
+
+
+async def drive(url: str, concurrency: int, duration: float, client_id: int) -> Tuple[List[float], int]:
+    with open(SAMPLE_PATH, "r", encoding="utf-8") as f:
+        transactions = json.load(f)["transactions1"][:SCORED_TRANSACTIONS]
+    mix = request_mix(transactions)
+    numbers = itertools.count(client_id * 10_000_000)
+    deadline = time.perf_counter() + duration
+    latencies: List[float] = []
+    errors = 0
+
+    async def connection(client: httpx.AsyncClient, offset: int):
+        nonlocal errors
+        for method, path, body in itertools.islice(itertools.cycle(mix), offset, None):
+            if time.perf_counter() >= deadline:
+                return
+            started = time.perf_counter()
+            response = await client.request(method, path, json=body(next(numbers)) if body else None)
+            latencies.append(time.perf_counter() - started)
+            errors += response.status_code >= 400
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        await asyncio.gather(*(connection(client, i) for i in range(concurrency)))
+    return latencies, errors
+
+
+def run_client(url: str, concurrency: int, duration: float, client_id: int):
+    return asyncio.run(drive(url, concurrency, duration, client_id))
+
+
+def worker_memory(parent: int) -> Optional[Dict[str, float]]:
+    """Summed RSS / PSS of the server's worker processes in MB (None where /proc is unavailable)."""
+    try:
+        with open(f"/proc/{parent}/task/{parent}/children") as f:
+            # A single worker is served by the launcher process itself
+            pids = [int(pid) for pid in f.read().split()] or [parent]
+        totals = {"rss_mb": 0.0, "pss_mb": 0.0}
+        for pid in pids:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    name, value = line.split(":", 1)
+                    if name in ("Rss", "Pss"):
+                        totals[f"{name.lower()}_mb"] += int(value.split()[0]) / 1024
+        return {k: round(v, 1) for k, v in totals.items()}
+    except (OSError, ValueError):
+        return None
+
+
+def start_server(workers: int, port: int, shared_dir: str, stub_url: str) -> subprocess.Popen:
+    env = {**os.environ, "BANK_BASE_URL": stub_url, "SHARED_STATE_DIR": shared_dir}
+    process = subprocess.Popen(
+        [sys.executable, "server.py", "--workers", str(workers), "--port", str(port), "--host", "127.0.0.1",
+         "--log-level", "warning", "--shared-dir", shared_dir],
+        env=env,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/stats", timeout=1).status_code == 200:
+                return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("server did not start")
+
+
+def bench(workers: int, args, stub_url: str) -> Dict[str, Any]:
+    port = stub_llm.free_port()
+    with tempfile.TemporaryDirectory() as shared_dir:
+        server = start_server(workers, port, shared_dir, stub_url)
+        url = f"http://127.0.0.1:{port}"
+        try:
+            run_client(url, 4, 1.0, 999)  # warm up every worker's caches and connections
+            per_client = max(1, args.concurrency // args.clients)
+            with ProcessPoolExecutor(args.clients) as pool:
+                started = time.perf_counter()
+                results = list(pool.map(run_client, [url] * args.clients, [per_client] * args.clients,
+                                        [args.duration] * args.clients, range(args.clients)))
+                elapsed = time.perf_counter() - started
+            memory = worker_memory(server.pid)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(30)
+
+    latencies = np.array([s for r in results for s in r[0]]) * 1000
+    p50, p99 = np.percentile(latencies, [50, 99])
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "errors": sum(r[1] for r in results),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(p50), 2),
+        "p99_ms": round(float(p99), 2),
+        "memory": memory,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    stub_llm.add_arguments(parser)
+    parser.set_defaults(latency=0.05)
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per worker count")
+    parser.add_argument("--concurrency", type=int, default=64, help="open connections in total")
+    parser.add_argument("--clients", type=int, default=2, help="load generator processes")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs")
+    print(f"{'workers':>7} {'reqs':>7} {'err':>4} {'req/s':>8} {'speedup':>8} {'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>8} {'PSS MB':>8}")
+    results = []
+    with stub_llm.StubServer(**stub_llm.options_from(args)) as stub_url:
+        for workers in args.workers:
+            r = bench(workers, args, stub_url)
+            results.append(r)
+            speedup = r["throughput_rps"] / results[0]["throughput_rps"]
+            memory = r["memory"] or {"rss_mb": "-", "pss_mb": "-"}
+            print(f"{workers:>7} {r['requests']:>7} {r['errors']:>4} {r['throughput_rps']:>8} {speedup:>7.2f}x "
+                  f"{r['p50_ms']:>8} {r['p99_ms']:>8} {memory['rss_mb']:>8} {memory['pss_mb']:>8}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"cpus": os.cpu_count(), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
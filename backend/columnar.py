@@ -0,0 +1,384 @@
+"""
+Columnar on-disk transaction history: one NumPy .npy file per transaction
+field, memory-mapped on load so a reader touches only the columns it uses.
+
+    user_00001.cols/
+        meta.json                 row count, period offsets, field order and kinds, generation
+        profile.<gen>.json        everything except the transaction lists
+        amount.<gen>.npy          float64 (NaN = null)
+        date.<gen>.npy            datetime64[D]
+        merchant.<gen>.npy        int32 codes into merchant.dict.<gen>.npy (-1 = null)
+        merchant.dict.<gen>.npy   UTF-8 dictionary (fixed-width bytes)
+        mcc.present.<gen>.npy     bool, only for fields missing from some rows
+        ...
+
+Field kinds are inferred from the JSON: bool, int, float, date (ISO day),
+string (dictionary-encoded) and json (anything else, as dictionary-encoded
+JSON text).
+
+Every write stores its files under a new generation and then replaces
+meta.json in one atomic rename, so its mtime is the version and a reader
+that loaded a meta.json only ever maps the columns written with it, never
+a mix of two writes. Files of the generation before are kept for readers
+still holding the previous meta.json; older ones are removed.
+
+    cd backend && python columnar.py user_full_banking_data_enriched.json
+"""
+import argparse
+import json
+import os
+import re
+import secrets
+import sys
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TRANSACTION_KEYS = ("transactions1", "transactions2", "transactions3Current")
+
+COLUMNAR_SUFFIX = ".cols"
+META_NAME = "meta.json"
+PROFILE_NAME = "profile.json"
+FORMAT_VERSION = 1
+
+_FIELD_RE = re.compile(r"[A-Za-z0-9_]+")
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def is_columnar(path: str) -> bool:
+    return path.endswith(COLUMNAR_SUFFIX)
+
+
+def columnar_path(json_path: str) -> str:
+    return os.path.splitext(json_path)[0] + COLUMNAR_SUFFIX
+
+
+# === Writing ===
+
+def _kind(values: List[Any]) -> str:
+    if all(isinstance(v, bool) for v in values):
+        return "bool"
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+        return "int"
+    if all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in values):
+        return "float"
+    if all(v is None or isinstance(v, str) for v in values):
+        return "date" if all(v is None or _DATE_RE.fullmatch(v) for v in values) else "string"
+    return "json"
+
+
+def _dictionary(values: List[Optional[str]]) -> Tuple[np.ndarray, np.ndarray]:
+    """(int32 codes, UTF-8 bytes dictionary) numbered by first appearance; None -> -1."""
+    table: Dict[str, int] = {}
+    codes = np.array([-1 if v is None else table.setdefault(v, len(table)) for v in values], dtype="int32")
+    return codes, np.array([t.encode("utf-8") for t in table], dtype="S") if table else np.zeros(0, dtype="S1")
+
+
+def _encode(kind: str, values: List[Any], present: np.ndarray) -> Dict[str, np.ndarray]:
+    n = len(present)
+    if kind == "bool":
+        column = np.zeros(n, dtype=bool)
+        column[present] = values
+    elif kind == "int":
+        column = np.zeros(n, dtype="int64")
+        column[present] = values
+    elif kind == "float":
+        column = np.full(n, np.nan)
+        column[present] = np.array(values, dtype="float64")
+    elif kind == "date":
+        column = np.full(n, np.datetime64("NaT"), dtype="datetime64[D]")
+        column[present] = np.array(values, dtype="datetime64[D]")  # None -> NaT
+    else:
+        texts = values if kind == "string" else [json.dumps(v, ensure_ascii=False) for v in values]
+        codes, table = _dictionary(texts)
+        column = np.full(n, -1, dtype="int32")
+        column[present] = codes
+        return {"": column, ".dict": table}
+    return {"": column}
+
+
+def _save(directory: str, name: str, array: np.ndarray) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        np.save(f, array, allow_pickle=False)
+    os.replace(tmp_path, os.path.join(directory, name))
+
+
+def _versioned(name: str, generation: Optional[str]) -> str:
+    """File name of `name` ("amount.npy", "profile.json") in a generation (None: unversioned, older writes)."""
+    if not generation:
+        return name
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{generation}{ext}"
+
+
+def _read_meta(directory: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, META_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_columnar(user_data: Dict[str, Any], directory: str) -> Dict[str, Any]:
+    """Store a profile as columns (transactions) + profile.json (everything else); returns the meta."""
+    os.makedirs(directory, exist_ok=True)
+    previous = _read_meta(directory)
+    generation = secrets.token_hex(6)
+    files = []
+
+    def save(name: str, array: np.ndarray) -> None:
+        files.append(_versioned(name, generation))
+        _save(directory, files[-1], array)
+    rows = [tx for key in TRANSACTION_KEYS for tx in user_data.get(key) or []]
+    periods, start = {}, 0
+    for key in TRANSACTION_KEYS:
+        if key in user_data:
+            periods[key] = [start, start + len(user_data.get(key) or [])]
+            start = periods[key][1]
+
+    fields: Dict[str, None] = {}
+    for tx in rows:
+        fields.update(dict.fromkeys(tx))
+    columns = {}
+    for field in fields:
+        if not _FIELD_RE.fullmatch(field):
+            raise ValueError(f"Unsupported transaction field name: {field!r}")
+        present = np.array([field in tx for tx in rows], dtype=bool)
+        values = [tx[field] for tx in rows if field in tx]
+        kind = _kind(values)
+        for suffix, array in _encode(kind, values, present).items():
+            save(f"{field}{suffix}.npy", array)
+        if not present.all():
+            save(f"{field}.present.npy", present)
+        columns[field] = {"kind": kind, "partial": not present.all()}
+
+    profile = {k: v for k, v in user_data.items() if k not in TRANSACTION_KEYS}
+    files.append(_versioned(PROFILE_NAME, generation))
+    _write_json(os.path.join(directory, files[-1]), profile)
+    meta = {"format": FORMAT_VERSION, "rows": len(rows), "periods": periods, "columns": columns,
+            "generation": generation, "files": files}
+    # The switch to the new generation: one rename
+    _write_json(os.path.join(directory, META_NAME), meta)
+    _remove_stale(directory, {META_NAME, *files, *((previous or {}).get("files") or [])})
+    return meta
+
+
+def _remove_stale(directory: str, keep: Iterable[str]) -> None:
+    """Delete column and profile files of generations older than the previous one."""
+    keep = set(keep)
+    for name in os.listdir(directory):
+        if name not in keep and not name.endswith(".tmp") and (name.endswith(".npy") or name.startswith("profile.")):
+            try:
+                os.unlink(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def _write_json(path: str, data: Any) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+# === Reading ===
+
+class ColumnarTransactions:
+    """Lazily memory-mapped transaction columns of one profile."""
+
+    def __init__(self, directory: str, mmap: bool = True):
+        self.directory = directory
+        self.mmap_mode = "r" if mmap else None
+        with open(os.path.join(directory, META_NAME), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported columnar format in {directory}: {self.meta.get('format')}")
+        self.fields: List[str] = list(self.meta["columns"])
+        self.generation: Optional[str] = self.meta.get("generation")
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.meta["rows"]
+
+    def __contains__(self, field: str) -> bool:
+        return field in self.meta["columns"]
+
+    def _array(self, name: str) -> np.ndarray:
+        array = self._arrays.get(name)
+        if array is None:
+            path = os.path.join(self.directory, _versioned(name + ".npy", self.generation))
+            array = self._arrays[name] = np.load(path, mmap_mode=self.mmap_mode)
+        return array
+
+    def kind(self, field: str) -> str:
+        return self.meta["columns"][field]["kind"]
+
+    def present(self, field: str) -> np.ndarray:
+        """Rows that have the field."""
+        if field not in self:
+            return np.zeros(len(self), dtype=bool)
+        if not self.meta["columns"][field]["partial"]:
+            return np.ones(len(self), dtype=bool)
+        return self._array(field + ".present")
+
+    def raw(self, field: str) -> np.ndarray:
+        """Stored column: values, or int32 dictionary codes for string/json fields."""
+        return self._array(field)
+
+    def dictionary(self, field: str) -> List[Any]:
+        """Decoded dictionary of a string / json field (small, cached)."""
+        table = self._arrays.get(field + ".decoded")
+        if table is None:
+            table = [b.decode("utf-8") for b in self._array(field + ".dict").tolist()]
+            if self.kind(field) == "json":
+                table = [json.loads(t) for t in table]
+            table = self._arrays[field + ".decoded"] = np.array(table + [None], dtype=object)
+        return table
+
+    def floats(self, field: str) -> np.ndarray:
+        """float64 column, NaN where missing."""
+        if field not in self:
+            return np.full(len(self), np.nan)
+        if self.kind(field) not in ("bool", "int", "float"):
+            return np.array(self.strings(field).tolist(), dtype="float64")
+        values = np.asarray(self.raw(field), dtype="float64")
+        partial = self.meta["columns"][field]["partial"]
+        return np.where(self.present(field), values, np.nan) if partial else values
+
+    def strings(self, field: str) -> np.ndarray:
+        """Object array of decoded values (strings; any JSON value for json fields), None where missing."""
+        out = np.full(len(self), None, dtype=object)
+        if field not in self:
+            return out
+        kind = self.kind(field)
+        if kind in ("string", "json"):
+            # The decoded dictionary ends with None, so code -1 (null) maps to it
+            return self.dictionary(field)[np.asarray(self.raw(field))]
+        values = np.asarray(self.raw(field))
+        present = self.present(field) & ~np.isnat(values) if kind == "date" else self.present(field)
+        out[present] = values[present].astype(str).astype(object)
+        return out
+
+    def dates(self, field: str = "date") -> np.ndarray:
+        if field in self and self.kind(field) == "date":
+            return np.asarray(self.raw(field))
+        return np.array(self.strings(field).tolist(), dtype="datetime64[D]")
+
+    def period_codes(self) -> np.ndarray:
+        """Index into TRANSACTION_KEYS of the period each row belongs to."""
+        codes = np.zeros(len(self), dtype="int32")
+        for key, (start, end) in self.meta["periods"].items():
+            codes[start:end] = TRANSACTION_KEYS.index(key)
+        return codes
+
+    # --- Views for the other modules ---
+
+    def feature_columns(self, monthly_income: float) -> Dict[str, np.ndarray]:
+        """The columns features.build_feature_matrix needs, read without materializing rows."""
+        n = len(self)
+        return {
+            "group": np.zeros(n, dtype="int64"),
+            "day": self.dates("date"),
+            "amount": self.floats("amount"),
+            "merchant": self.strings("merchant"),
+            "category": self.strings("category"),
+            "mcc": self.floats("mcc"),
+            "balance_after": self.floats("balance_after"),
+            "transaction_hour": self.floats("transaction_hour"),
+            "monthly_income": np.full(n, float(monthly_income or 0)),
+        }
+
+    def analytics_columns(self) -> Dict[str, Any]:
+        """The columns analytics.AnalyticsIndex is built from."""
+        day = self.dates("date")
+        month = np.where(np.isnat(day), "", day.astype("datetime64[M]").astype(str)).astype(object)
+        # tx.get("category_name") or tx.get("category") or "Other"
+        category = self.strings("category_name")
+        missing = (category == None) | (category == "")  # noqa: E711
+        category = np.where(missing, self.strings("category"), category)
+        missing = (category == None) | (category == "")  # noqa: E711
+        category = np.where(missing, "Other", category)
+        merchant = self.strings("merchant")
+        merchant = np.where(merchant == None, "", merchant)  # noqa: E711
+        spontaneous = (
+            np.asarray(self.raw("is_spontanius_predicted")).astype(bool) & self.present("is_spontanius_predicted")
+            if "is_spontanius_predicted" in self and self.kind("is_spontanius_predicted") == "bool"
+            else np.zeros(len(self), dtype=bool)
+        )
+        return {
+            "month": month,
+            "period": self.period_codes(),
+            "category": category,
+            "merchant": merchant,
+            "amount": np.nan_to_num(self.floats("amount"), nan=0.0),
+            "spontaneous": spontaneous,
+            "scored": "is_spontanius_predicted" in self,
+        }
+
+    def retrieval_columns(self, fields: Sequence[str]) -> Dict[str, np.ndarray]:
+        """The columns retrieval.TransactionIndex is built from: date, amount and the text `fields`."""
+        columns = {field: self.strings(field) for field in fields}
+        columns["date"] = self.dates("date")
+        columns["amount"] = np.nan_to_num(self.floats("amount"), nan=0.0)
+        return columns
+
+    def records(self, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Transactions as JSON-style dicts (materializes every requested column)."""
+        fields = list(fields) if fields is not None else self.fields
+        decoded = []
+        for field in fields:
+            kind = self.kind(field)
+            if kind in ("bool", "int"):
+                values = np.asarray(self.raw(field)).tolist()
+            elif kind == "float":
+                values = [None if v != v else v for v in np.asarray(self.raw(field)).tolist()]
+            else:
+                values = self.strings(field).tolist()
+            decoded.append((field, values, self.present(field).tolist()))
+        return [
+            {field: values[i] for field, values, present in decoded if present[i]}
+            for i in range(len(self))
+        ]
+
+
+def load_profile(directory: str, with_transactions: bool = False) -> Dict[str, Any]:
+    """profile.json of a columnar profile; optionally with the transaction lists rebuilt."""
+    columns = ColumnarTransactions(directory)
+    with open(os.path.join(directory, _versioned(PROFILE_NAME, columns.generation)), "r", encoding="utf-8") as f:
+        profile = json.load(f)
+    if with_transactions:
+        rows = columns.records()
+        for key, (start, end) in columns.meta["periods"].items():
+            profile[key] = rows[start:end]
+    return profile
+
+
+def convert(paths: Iterable[str], out_dir: Optional[str] = None) -> List[str]:
+    """Convert single-user .json files (or .jsonl lines) to columnar directories."""
+    written = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            users = [json.loads(line) for line in f if line.strip()] if path.endswith(".jsonl") else [json.load(f)]
+        for user in users:
+            if len(users) == 1 and out_dir is None:
+                target = columnar_path(path)
+            else:
+                target = os.path.join(out_dir or os.path.dirname(path), f"{user['user_id']}{COLUMNAR_SUFFIX}")
+            write_columnar(user, target)
+            written.append(target)
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help=".json or .jsonl files with user profiles")
+    parser.add_argument("--out-dir", help="directory for <user_id>.cols (default: next to each .json)")
+    args = parser.parse_args(argv)
+    for target in convert(args.inputs, args.out_dir):
+        print(f"✅ {target}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
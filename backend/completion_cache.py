@@ -0,0 +1,243 @@
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+
+from json_codec import dumps, dumps_text, loads
+from shared_cache import SQLiteConnection, shared_path
+
+DEFAULT_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL", "3600"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+# Set to a file path to keep cached completions across restarts; shared by the workers of server.py
+SQLITE_PATH = os.getenv("LLM_CACHE_SQLITE_PATH", "") or shared_path("completions.sqlite")
+
+# Request fields that do not change the answer
+_IGNORED_FIELDS = {"messages", "stream", "user"}
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCT = " ?!.…"
+
+
+def normalize_text(text: str) -> str:
+    """Case-, whitespace- and trailing-punctuation-insensitive form of a message."""
+    return _WHITESPACE_RE.sub(" ", text).strip().rstrip(_TRAILING_PUNCT).casefold()
+
+
+def cache_key(payload: Dict[str, Any]) -> str:
+    """Hash of model, normalized messages and sampling parameters."""
+    normalized = {
+        "messages": [
+            [m.get("role", ""), normalize_text(m.get("content") or "")]
+            for m in payload.get("messages", [])
+        ],
+        "params": {k: v for k, v in payload.items() if k not in _IGNORED_FIELDS},
+    }
+    return hashlib.sha256(dumps(normalized, sort_keys=True)).hexdigest()
+
+
+class CachedCompletion(NamedTuple):
+    response: Dict[str, Any]
+    elapsed: float  # upstream seconds spent producing it
+    expires_at: float
+
+
+class MemoryBackend:
+    """In-process TTL + LRU store."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedCompletion]" = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[CachedCompletion]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: CachedCompletion) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """
+    On-disk TTL + LRU store that survives restarts (WAL mode, safe for several
+    processes; each process opens its own connection).
+    """
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES * 8):
+        self.path = path
+        self.max_entries = max_entries
+        self._db = SQLiteConnection(path, [
+            "CREATE TABLE IF NOT EXISTS completions ("
+            " key TEXT PRIMARY KEY, response TEXT NOT NULL, elapsed REAL NOT NULL,"
+            " expires_at REAL NOT NULL, last_access REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS completions_lru ON completions(last_access)",
+        ])
+        self._lock = self._db.lock
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        return self._db.get()
+
+    def get(self, key: str) -> Optional[CachedCompletion]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, elapsed, expires_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[2] <= now:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE completions SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return CachedCompletion(loads(row[0]), row[1], row[2])
+
+    def set(self, key: str, entry: CachedCompletion) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?)",
+                (key, dumps_text(entry.response), entry.elapsed, entry.expires_at, time.time()),
+            )
+            self._conn.execute("DELETE FROM completions WHERE expires_at <= ?", (time.time(),))
+            self._conn.execute(
+                "DELETE FROM completions WHERE key IN ("
+                " SELECT key FROM completions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+
+class CompletionCache:
+    """
+    Completion cache keyed by cache_key(payload): a memory LRU in front of an
+    optional SQLite store, plus single-flight deduplication so concurrent
+    identical requests share one upstream call.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES, sqlite_path: str = SQLITE_PATH):
+        self.ttl = ttl
+        self.memory = MemoryBackend(max_entries)
+        self.disk = SQLiteBackend(sqlite_path) if sqlite_path else None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    async def get(self, key: str) -> Optional[CachedCompletion]:
+        entry = self.memory.get(key)
+        if entry is None and self.disk is not None:
+            entry = await asyncio.to_thread(self.disk.get, key)
+            if entry is not None:
+                self.disk_hits += 1
+                self.memory.set(key, entry)
+        return entry
+
+    async def put(self, key: str, response: Dict[str, Any], elapsed: float) -> None:
+        entry = CachedCompletion(response, elapsed, time.time() + self.ttl)
+        self.memory.set(key, entry)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, entry)
+
+    async def lookup(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Cached response for the payload, counted as a hit; None on miss (not counted)."""
+        entry = await self.get(cache_key(payload))
+        if entry is None:
+            return None
+        self.hits += 1
+        self.saved_seconds += entry.elapsed
+        return entry.response
+
+    async def store(self, payload: Dict[str, Any], response: Dict[str, Any], elapsed: float) -> None:
+        self.misses += 1
+        await self.put(cache_key(payload), response, elapsed)
+
+    async def get_or_compute(
+        self,
+        payload: Dict[str, Any],
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        key = cache_key(payload)
+        entry = await self.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.saved_seconds += entry.elapsed
+            return entry.response
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            started = time.perf_counter()
+            try:
+                response = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # The leading request was cancelled (client went away): compute ourselves
+                if inflight.cancelled():
+                    return await self.get_or_compute(payload, compute)
+                raise
+            self.saved_seconds += max(0.0, self._elapsed_of(key) - (time.perf_counter() - started))
+            return response
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.misses += 1
+        try:
+            started = time.perf_counter()
+            response = await compute()
+            await self.put(key, response, time.perf_counter() - started)
+            future.set_result(response)
+            return response
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; don't log "never retrieved"
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def _elapsed_of(self, key: str) -> float:
+        entry = self.memory.get(key)
+        return entry.elapsed if entry is not None else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.coalesced + self.misses
+        return {
+            "entries": len(self.memory),
+            "disk_entries": len(self.disk) if self.disk is not None else None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            "evictions": self.memory.evictions,
+            "saved_upstream_seconds": round(self.saved_seconds, 3),
+        }
+
+
+# Shared instance used through llm_client
+completion_cache = CompletionCache()
@@ -0,0 +1,400 @@
+"""
+Conversation memory per (player, NPC, session).
+
+A session keeps the static profile context once (rebuilt only when the
+profile version changes), a rolling summary of older turns and the most
+recent turns verbatim. Summary + recent turns stay under a token budget:
+turns that no longer fit are folded into the summary by a background LLM
+call, so the request path never waits for summarization. Until that call
+finishes, the folded turns are simply left out of the prompt.
+
+With SHARED_STATE_DIR (server.py workers) the summary and turns live in
+<dir>/conversations.sqlite, so a conversation continues on whichever worker
+gets the next request. Each write is a compare-and-set on the session's
+revision and is reapplied to the latest state when another worker wrote
+first; a summary is folded by one worker at a time, which holds a lease on
+it. The SQLite calls run in worker threads, off the event loop. The profile
+context stays per worker.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from llm_client import llm_client
+from llm_scheduler import BACKGROUND
+from metrics import span
+from shared_cache import TRIM_EVERY, SQLiteConnection, shared_path
+from tokens import count_tokens, truncate_to_tokens
+
+# Tokens of history (summary + recent turns) sent with each request
+TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "1500"))
+# Part of the budget reserved for the rolling summary
+SUMMARY_MAX_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_TOKENS", "300"))
+# A single message is cut to this share of the recent-turns budget
+MAX_MESSAGE_SHARE = 0.5
+# Idle sessions are dropped after this many seconds, and the oldest beyond MAX_SESSIONS
+SESSION_TTL = float(os.getenv("CONVERSATION_TTL", "3600"))
+MAX_SESSIONS = int(os.getenv("CONVERSATION_MAX_SESSIONS", "10000"))
+# A worker folding a shared session's summary must store it within this many seconds, else another may take over
+FOLD_LEASE_SECONDS = float(os.getenv("CONVERSATION_FOLD_LEASE", "120"))
+
+DEFAULT_SESSION_ID = "default"
+
+SUMMARY_PROMPT = (
+    "You maintain the memory of a conversation between a bank customer and an NPC assistant. "
+    "Merge the previous summary and the new messages into one short summary (at most {words} words) "
+    "that keeps the customer's goals, numbers, decisions and open questions. "
+    "Write it in the language of the conversation. Reply with the summary only."
+)
+
+
+class Turn(NamedTuple):
+    role: str  # "user" | "assistant"
+    content: str
+    tokens: int
+
+
+class Session:
+    """State of one conversation; only touched from the event loop."""
+
+    __slots__ = ("key", "context", "context_version", "summary", "summary_tokens", "turns", "turn_tokens",
+                 "folding", "summarizing", "last_used", "revision", "lease", "lock")
+
+    def __init__(self, key: Tuple[str, str, str]):
+        self.key = key
+        self.context: Optional[str] = None
+        self.context_version: Any = None
+        self.summary = ""
+        self.summary_tokens = 0
+        self.turns: Deque[Turn] = deque()
+        self.turn_tokens = 0
+        self.folding: List[Turn] = []  # evicted turns waiting to be summarized
+        self.summarizing = False
+        self.last_used = time.monotonic()
+        self.revision = 0  # of the shared copy this state was loaded from
+        self.lease = 0.0  # wall-clock end of the shared summary lease
+        self.lock = asyncio.Lock()  # one load-modify-save of the shared copy at a time
+
+    def history(self) -> List[Dict[str, str]]:
+        """Chat messages to put before the new user message."""
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"})
+        messages.extend({"role": turn.role, "content": turn.content} for turn in self.turns)
+        return messages
+
+    def history_tokens(self) -> int:
+        return self.summary_tokens + self.turn_tokens
+
+
+class SharedSessions:
+    """
+    Session summaries and turns in a SQLite file shared by the worker
+    processes. Rows carry a revision: `save` only succeeds on the revision
+    the session was loaded from, so concurrent writers reload and retry.
+    Queries run in a worker thread; the Session is only changed on the loop.
+    """
+
+    def __init__(self, path: str, max_sessions: int = MAX_SESSIONS, ttl: float = SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.db = SQLiteConnection(path, [
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " key TEXT PRIMARY KEY, state TEXT NOT NULL, revision INTEGER NOT NULL, used REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS sessions_used ON sessions(used)",
+        ])
+        self.writes = 0
+        self.conflicts = 0
+
+    @staticmethod
+    def _key(key: Tuple[str, str, str]) -> str:
+        return json.dumps(key, ensure_ascii=False)
+
+    def _fetch(self, key: Tuple[str, str, str], known_revision: int) -> Optional[Tuple[Dict[str, Any], int]]:
+        """(state, revision) of the shared copy; None if it is still `known_revision`."""
+        with self.db.lock:
+            row = self.db.get().execute(
+                "SELECT state, revision, used FROM sessions WHERE key = ?", (self._key(key),)).fetchone()
+        if row is None:
+            return {}, 0
+        if time.time() - row[2] > self.ttl:
+            return {}, row[1]  # expired: start over, overwriting the row on the next save
+        if row[1] == known_revision:
+            return None
+        return json.loads(row[0]), row[1]
+
+    async def load(self, session: Session) -> None:
+        """Replace the session's summary and turns with the shared copy, if it changed since the last load."""
+        fetched = await asyncio.to_thread(self._fetch, session.key, session.revision)
+        if fetched is None:
+            return
+        state, revision = fetched
+        session.summary = state.get("summary", "")
+        session.summary_tokens = state.get("summary_tokens", 0)
+        session.turns = deque(Turn(*turn) for turn in state.get("turns", ()))
+        session.turn_tokens = sum(turn.tokens for turn in session.turns)
+        session.folding = [Turn(*turn) for turn in state.get("folding", ())]
+        session.lease = state.get("lease", 0.0)
+        session.summarizing = session.lease > time.time()
+        session.revision = revision
+
+    async def save(self, session: Session) -> bool:
+        """Write the session unless another worker did since it was loaded; False means reload and retry."""
+        state = json.dumps({
+            "summary": session.summary,
+            "summary_tokens": session.summary_tokens,
+            "turns": list(session.turns),
+            "folding": session.folding,
+            "lease": session.lease,
+        }, ensure_ascii=False)
+        if not await asyncio.to_thread(self._write, session.key, state, session.revision):
+            self.conflicts += 1
+            return False
+        session.revision += 1
+        return True
+
+    def _write(self, key: Tuple[str, str, str], state: str, revision: int) -> bool:
+        key, now = self._key(key), time.time()
+        with self.db.lock:
+            conn = self.db.get()
+            if revision == 0:
+                saved = conn.execute("INSERT OR IGNORE INTO sessions VALUES (?, ?, 1, ?)", (key, state, now)).rowcount
+            else:
+                saved = conn.execute(
+                    "UPDATE sessions SET state = ?, revision = revision + 1, used = ? WHERE key = ? AND revision = ?",
+                    (state, now, key, revision),
+                ).rowcount
+            if saved:
+                self.writes += 1
+                if self.writes % TRIM_EVERY == 0:
+                    conn.execute("DELETE FROM sessions WHERE used < ?", (now - self.ttl,))
+                    conn.execute(
+                        "DELETE FROM sessions WHERE key IN ("
+                        " SELECT key FROM sessions ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                        (self.max_sessions,),
+                    )
+            conn.commit()
+        return bool(saved)
+
+    async def delete(self, key: Tuple[str, str, str]) -> None:
+        await asyncio.to_thread(self._delete, key)
+
+    def _delete(self, key: Tuple[str, str, str]) -> None:
+        with self.db.lock:
+            conn = self.db.get()
+            conn.execute("DELETE FROM sessions WHERE key = ?", (self._key(key),))
+            conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.db.lock:
+            sessions = self.db.get().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {"path": self.db.path, "sessions": sessions, "writes": self.writes, "conflicts": self.conflicts}
+
+
+class ConversationStore:
+    """Sessions keyed by (user_id, npc, session_id), bounded in count and idle time."""
+
+    def __init__(
+        self,
+        token_budget: int = TOKEN_BUDGET,
+        summary_max_tokens: int = SUMMARY_MAX_TOKENS,
+        max_sessions: int = MAX_SESSIONS,
+        ttl: float = SESSION_TTL,
+        summarize: Optional[Callable[[str, List[Turn]], Awaitable[str]]] = None,
+        shared: Optional[SharedSessions] = None,
+    ):
+        self.token_budget = token_budget
+        self.summary_max_tokens = min(summary_max_tokens, token_budget // 2)
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.summarize = summarize or summarize_with_llm
+        self.shared = shared
+        self._sessions: "OrderedDict[Tuple[str, str, str], Session]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+        self.summaries = 0
+        self.summary_failures = 0
+        self.folded_turns = 0
+
+    @property
+    def turns_budget(self) -> int:
+        return self.token_budget - self.summary_max_tokens
+
+    async def session(self, user_id: str, npc: str, session_id: Optional[str] = None) -> Session:
+        key = (user_id, npc, session_id or DEFAULT_SESSION_ID)
+        now = time.monotonic()
+        session = self._sessions.get(key)
+        if session is not None and now - session.last_used > self.ttl:
+            session = None
+        if session is None:
+            session = self._sessions[key] = Session(key)
+        self._sessions.move_to_end(key)
+        session.last_used = now
+        self._expire(now)
+        if self.shared is not None:
+            # Another worker may have continued the conversation
+            async with session.lock:
+                await self.shared.load(session)
+        return session
+
+    def _expire(self, now: float) -> None:
+        while self._sessions:
+            key, oldest = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - oldest.last_used <= self.ttl:
+                break
+            del self._sessions[key]
+
+    async def reset(self, user_id: str, npc: str, session_id: Optional[str] = None) -> None:
+        key = (user_id, npc, session_id or DEFAULT_SESSION_ID)
+        self._sessions.pop(key, None)
+        if self.shared is not None:
+            await self.shared.delete(key)
+
+    async def context(self, session: Session, version: Any, build: Callable[[], Awaitable[str]]) -> str:
+        """Static profile context, built once per session (again only if the profile changed)."""
+        if session.context is None or session.context_version != version:
+            session.context = await build()
+            session.context_version = version
+        return session.context
+
+    async def record(self, session: Session, user_message: str, reply: str) -> None:
+        """Append a finished exchange; turns over the budget are folded into the summary in the background."""
+        limit = int(self.turns_budget * MAX_MESSAGE_SHARE)
+        new_turns = []
+        for role, content in (("user", user_message), ("assistant", reply)):
+            content = truncate_to_tokens(content, limit)
+            new_turns.append(Turn(role, content, count_tokens(content)))
+
+        # One change of a session at a time in this process; other workers are handled by the revision check
+        async with session.lock:
+            start = await self._append(session, new_turns)
+        if start:
+            self._start_summary(session)
+
+    async def _append(self, session: Session, new_turns: List[Turn]) -> bool:
+        """Add the turns and evict what is over budget; True if this call must start the summary."""
+        # A shared session is appended to its latest state; a concurrent write by another worker means retry
+        while True:
+            if self.shared is not None:
+                await self.shared.load(session)
+            for turn in new_turns:
+                session.turns.append(turn)
+                session.turn_tokens += turn.tokens
+            while session.turn_tokens > self.turns_budget:
+                turn = session.turns.popleft()
+                session.turn_tokens -= turn.tokens
+                session.folding.append(turn)
+            start = bool(session.folding) and not session.summarizing
+            if start:
+                session.summarizing = True
+                session.lease = time.time() + FOLD_LEASE_SECONDS
+            if self.shared is None or await self.shared.save(session):
+                return start
+
+    def _start_summary(self, session: Session) -> None:
+        task = asyncio.get_running_loop().create_task(self._fold(session))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fold(self, session: Session) -> None:
+        try:
+            while session.folding:
+                # Turns stay in `folding` until their summary is stored, so a lost worker's fold can be redone
+                turns = list(session.folding)
+                try:
+                    with span("conversation_summary"):
+                        summary = await self.summarize(session.summary, turns)
+                    self.summaries += 1
+                except Exception:
+                    # Keep the memory bounded even without the LLM: append the turns, cut to size
+                    summary = " ".join([session.summary] + [f"{t.role}: {t.content}" for t in turns]).strip()
+                    self.summary_failures += 1
+                async with session.lock:
+                    stored = await self._store_summary(session, turns, truncate_to_tokens(summary.strip(), self.summary_max_tokens))
+                if not stored:
+                    return
+                self.folded_turns += len(turns)
+        finally:
+            if self.shared is None:
+                session.summarizing = False
+
+    async def _store_summary(self, session: Session, turns: List[Turn], summary: str) -> bool:
+        """Replace the folded `turns` with `summary`; False if another worker took them over after the lease ran out."""
+        while True:
+            if self.shared is not None:
+                await self.shared.load(session)
+            if session.folding[:len(turns)] != turns:
+                return False
+            session.folding = session.folding[len(turns):]
+            session.summary = summary
+            session.summary_tokens = count_tokens(summary)
+            if self.shared is None:
+                return True
+            session.lease = time.time() + FOLD_LEASE_SECONDS if session.folding else 0.0
+            session.summarizing = bool(session.folding)
+            if await self.shared.save(session):
+                return True
+
+    async def drain(self) -> None:
+        """Wait for background summaries (tests, benchmarks)."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def aclose(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        sessions = list(self._sessions.values())
+        stats = {
+            "sessions": len(sessions),
+            "token_budget": self.token_budget,
+            "max_history_tokens": max((s.history_tokens() for s in sessions), default=0),
+            "summaries": self.summaries,
+            "summary_failures": self.summary_failures,
+            "folded_turns": self.folded_turns,
+            "summarizing": len(self._tasks),
+        }
+        if self.shared is not None:
+            stats["shared"] = self.shared.stats()
+        return stats
+
+
+async def summarize_with_llm(summary: str, turns: List[Turn]) -> str:
+    """Fold `turns` into `summary` with one short LLM call."""
+    transcript = "\n".join(f"{turn.role}: {turn.content}" for turn in turns)
+    return await llm_client.complete(
+        [
+            {"role": "system", "content": SUMMARY_PROMPT.format(words=SUMMARY_MAX_TOKENS // 2)},
+            {"role": "user", "content": f"Previous summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"},
+        ],
+        max_tokens=SUMMARY_MAX_TOKENS,
+        temperature=0.2,
+        priority=BACKGROUND,
+    )
+
+
+# Shared store for every NPC router
+_shared_path = shared_path("conversations.sqlite")
+conversations = ConversationStore(shared=SharedSessions(_shared_path) if _shared_path else None)
+
+
+async def session_id_from_request(request) -> Optional[str]:
+    """Optional `session_id` from the query string or JSON body (a new id starts a fresh conversation)."""
+    session_id = request.query_params.get("session_id")
+    if session_id is None and request.method != "GET":
+        try:
+            body = await request.json()
+        except ValueError:
+            body = None
+        if isinstance(body, dict) and body.get("session_id") is not None:
+            session_id = str(body["session_id"])[:64]
+    return session_id
+
+
+async def session_from_request(request, npc: str, user_id: str) -> Session:
+    """The (user, NPC) conversation this request continues."""
+    return await conversations.session(user_id, npc, await session_id_from_request(request))
@@ -0,0 +1,196 @@
+"""
+Batch enrichment of user banking data with spontaneous-purchase predictions.
+
+Streams user profiles from .json files (one user or a list of users) and
+.jsonl files (one user per line), builds model features for whole chunks
+of users at once and writes enriched users incrementally as JSONL.
+
+    python enrichment.py users/*.json big_dump.jsonl --out enriched.jsonl --workers 8
+"""
+import argparse
+import json
+import os
+import pickle
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from features import TransactionList, compute_features, extract_columns, feature_columns, impute, to_matrix
+from tree_model import MODEL_PATH
+TRANSACTION_KEYS = ("transactions1", "transactions2", "transactions3Current")
+
+DEFAULT_CHUNK_USERS = 256
+
+
+def load_bundle(path: str = MODEL_PATH) -> Dict[str, Any]:
+    """Load the {"model", "imputer", "features"} bundle."""
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def user_lists(users: List[Dict[str, Any]]) -> List[TransactionList]:
+    """Every non-empty transaction list of `users` as (transactions, monthly_income)."""
+    return [
+        (user[key], user.get("monthly_income", 0) or 0)
+        for user in users
+        for key in TRANSACTION_KEYS
+        if user.get(key)
+    ]
+
+
+def predict_proba(bundle: Dict[str, Any], X: np.ndarray) -> np.ndarray:
+    """Class probabilities for a raw feature matrix (NaN filled with the imputer statistics)."""
+    X_imputed = impute(X, bundle["imputer"].statistics_)
+    # Both estimators were fitted on a DataFrame, so keep the column names
+    return bundle["model"].predict_proba(pd.DataFrame(X_imputed, columns=bundle["features"]))
+
+
+def predict(bundle: Dict[str, Any], X: np.ndarray) -> np.ndarray:
+    model = bundle["model"]
+    return model.classes_[np.argmax(predict_proba(bundle, X), axis=1)]
+
+
+def enrich_users(users: List[Dict[str, Any]], bundle: Dict[str, Any], with_features: bool = True) -> List[Dict[str, Any]]:
+    """Add `is_spontanius_predicted` (and feature columns) to every transaction, in place."""
+    lists = user_lists(users)
+    if not lists:
+        return users
+    computed = compute_features(extract_columns(lists), bundle["features"])
+    preds = predict(bundle, to_matrix(computed, bundle["features"])).astype(bool).tolist()
+
+    columns = feature_columns(computed, bundle["features"]) if with_features else {}
+    i = 0
+    for transactions, _ in lists:
+        for tx in transactions:
+            for col, values in columns.items():
+                tx[col] = values[i]
+            tx["is_spontanius_predicted"] = preds[i]
+            i += 1
+    return users
+
+
+# === Process pool workers ===
+
+_worker_bundle: Optional[Dict[str, Any]] = None
+
+
+def _init_worker(model_path: str) -> None:
+    global _worker_bundle
+    _worker_bundle = load_bundle(model_path)
+
+
+def _parse_users(text: str) -> List[Dict[str, Any]]:
+    data = json.loads(text)
+    return data if isinstance(data, list) else [data]
+
+
+def _process_chunk(texts: List[str], with_features: bool) -> Tuple[List[str], int]:
+    users = [user for text in texts for user in _parse_users(text)]
+    enrich_users(users, _worker_bundle, with_features)
+    rows = sum(len(user.get(key) or []) for user in users for key in TRANSACTION_KEYS)
+    return [json.dumps(user, ensure_ascii=False) for user in users], rows
+
+
+def iter_user_texts(paths: Iterable[str]) -> Iterator[str]:
+    """Raw JSON texts: a whole .json file, or one line of a .jsonl file."""
+    for path in paths:
+        if path.endswith(".jsonl"):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield line
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                yield f.read()
+
+
+def _chunks(items: Iterator[str], size: int) -> Iterator[List[str]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_pipeline(
+    paths: List[str],
+    out_path: str,
+    model_path: str = MODEL_PATH,
+    workers: int = 1,
+    chunk_users: int = DEFAULT_CHUNK_USERS,
+    with_features: bool = True,
+) -> Dict[str, float]:
+    """
+    Enrich every user in `paths` and append them to `out_path` (JSONL) in input order.
+    At most 2 * workers chunks are in flight, so memory stays bounded.
+    """
+    started = time.perf_counter()
+    users = rows = 0
+    with open(out_path, "w", encoding="utf-8") as out:
+        def write(result: Tuple[List[str], int]) -> None:
+            nonlocal users, rows
+            lines, chunk_rows = result
+            for line in lines:
+                out.write(line)
+                out.write("\n")
+            users += len(lines)
+            rows += chunk_rows
+
+        chunks = _chunks(iter_user_texts(paths), chunk_users)
+        if workers <= 1:
+            _init_worker(model_path)
+            for chunk in chunks:
+                write(_process_chunk(chunk, with_features))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path,)) as pool:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(_process_chunk, chunk, with_features))
+                    if len(pending) >= workers * 2:
+                        write(pending.popleft().result())
+                while pending:
+                    write(pending.popleft().result())
+
+    elapsed = time.perf_counter() - started
+    return {"users": users, "rows": rows, "seconds": elapsed, "rows_per_sec": rows / elapsed if elapsed else 0.0}
+
+
+def enrich_file(input_path: str, output_path: str, model_path: str = MODEL_PATH) -> Dict[str, Any]:
+    """Enrich a single user JSON file and save it as pretty-printed JSON."""
+    bundle = load_bundle(model_path)
+    with open(input_path, "r", encoding="utf-8") as f:
+        user_data = json.load(f)
+    enrich_users([user_data], bundle)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(user_data, f, ensure_ascii=False, indent=2)
+    return user_data
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help=".json or .jsonl files with user profiles")
+    parser.add_argument("--out", required=True, help="output .jsonl file")
+    parser.add_argument("--model", default=MODEL_PATH, help="pickled model bundle")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-users", type=int, default=DEFAULT_CHUNK_USERS)
+    parser.add_argument("--predictions-only", action="store_true", help="do not write feature columns")
+    args = parser.parse_args(argv)
+
+    stats = run_pipeline(args.inputs, args.out, args.model, args.workers, args.chunk_users, not args.predictions_only)
+    print(
+        f"✅ {stats['users']} users / {stats['rows']} transactions in {stats['seconds']:.1f}s "
+        f"({stats['rows_per_sec']:.0f} rows/s) -> {args.out}",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
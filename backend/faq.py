@@ -0,0 +1,229 @@
+"""
+Islamic-banking FAQ used by the support NPC: short questions and answers in
+Russian and English. retrieval.FaqRetriever indexes them and puts the few
+entries relevant to a question into the support prompt.
+"""
+from typing import Dict, List
+
+FAQ: List[Dict[str, Dict[str, str]]] = [
+    {
+        "question": {
+            "ru": "Что такое риба и почему исламский банк не берёт проценты?",
+            "en": "What is riba and why does an Islamic bank not charge interest?",
+        },
+        "answer": {
+            "ru": "Риба — любой заранее оговорённый прирост к долгу, то есть процент. Шариат запрещает зарабатывать на самих деньгах, поэтому банк получает доход от торговли, аренды или участия в прибыли реальных сделок.",
+            "en": "Riba is any predetermined increase on a debt, i.e. interest. Sharia forbids earning on money itself, so the bank earns from trade, leasing or sharing the profit of real transactions.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Как работает мурабаха и чем она отличается от кредита?",
+            "en": "How does murabaha work and how is it different from a loan?",
+        },
+        "answer": {
+            "ru": "При мурабахе банк покупает товар и перепродаёт его клиенту с фиксированной наценкой, известной заранее; клиент платит в рассрочку. Банк продаёт товар, а не деньги, и наценка не растёт при просрочке.",
+            "en": "In murabaha the bank buys the goods and resells them to the client at a fixed markup agreed upfront; the client pays in installments. The bank sells goods, not money, and the markup does not grow when a payment is late.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Что такое иджара (исламский лизинг)?",
+            "en": "What is ijara (Islamic leasing)?",
+        },
+        "answer": {
+            "ru": "Иджара — аренда: банк покупает имущество (например, автомобиль или квартиру) и сдаёт его клиенту за арендную плату. В конце срока имущество может перейти клиенту (иджара мунтахия биттамлик).",
+            "en": "Ijara is a lease: the bank buys an asset (e.g. a car or a flat) and rents it to the client. At the end of the term ownership can pass to the client (ijara muntahia bittamleek).",
+        },
+    },
+    {
+        "question": {
+            "ru": "Что такое мудараба?",
+            "en": "What is mudaraba?",
+        },
+        "answer": {
+            "ru": "Мудараба — партнёрство, где одна сторона даёт капитал, а другая управляет делом. Прибыль делится в согласованной пропорции, убытки по капиталу несёт владелец капитала. Так работают инвестиционные депозиты.",
+            "en": "Mudaraba is a partnership where one party provides the capital and the other manages the business. Profit is split in an agreed ratio; capital losses are borne by the capital provider. Investment deposits work this way.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Что такое мушарака?",
+            "en": "What is musharaka?",
+        },
+        "answer": {
+            "ru": "Мушарака — совместное участие банка и клиента капиталом в проекте или покупке. Прибыль делится по договорённости, убытки — пропорционально долям. В убывающей мушараке клиент постепенно выкупает долю банка, например при покупке жилья.",
+            "en": "Musharaka is a joint venture where the bank and the client both invest capital. Profit is shared as agreed, losses in proportion to the shares. In diminishing musharaka the client gradually buys out the bank's share, e.g. when buying a home.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Что такое вакала и как работает вклад Вакала?",
+            "en": "What is wakala and how does a wakala deposit work?",
+        },
+        "answer": {
+            "ru": "Вакала — договор поручения: клиент поручает банку инвестировать его средства в халяльные активы за фиксированное вознаграждение агента. Доход клиента зависит от результата инвестиций и не гарантирован как процент.",
+            "en": "Wakala is an agency contract: the client appoints the bank to invest the funds in halal assets for a fixed agency fee. The client's return depends on the investment result and is not guaranteed like interest.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Что такое такафул (исламское страхование)?",
+            "en": "What is takaful (Islamic insurance)?",
+        },
+        "answer": {
+            "ru": "Такафул — взаимное страхование: участники делают взносы-пожертвования (табарру) в общий фонд, из которого покрываются убытки. Излишек фонда может возвращаться участникам.",
+            "en": "Takaful is mutual insurance: participants make donation contributions (tabarru) to a common fund that covers losses. A surplus of the fund may be returned to the participants.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Что такое сукук и чем он отличается от облигаций?",
+            "en": "What are sukuk and how do they differ from bonds?",
+        },
+        "answer": {
+            "ru": "Сукук — сертификаты долевого владения реальными активами или проектом. Держатель получает доход от этих активов (аренды, прибыли), а не проценты по долгу, как по облигации.",
+            "en": "Sukuk are certificates of ownership in real assets or a project. Holders earn income from those assets (rent, profit) rather than interest on a debt, as with a bond.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Что такое гарар и майсир?",
+            "en": "What are gharar and maysir?",
+        },
+        "answer": {
+            "ru": "Гарар — чрезмерная неопределённость в условиях сделки, майсир — азартная игра и спекуляция. Оба запрещены, поэтому в исламских договорах заранее определены товар, цена и сроки, а спекулятивные деривативы не используются.",
+            "en": "Gharar is excessive uncertainty in the terms of a contract, maysir is gambling and speculation. Both are forbidden, so Islamic contracts fix the goods, price and dates upfront and avoid speculative derivatives.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Что будет при просрочке платежа? Есть ли штрафы и пени?",
+            "en": "What happens if I pay late? Are there penalties or late fees?",
+        },
+        "answer": {
+            "ru": "Наценка при просрочке не увеличивается. Договор может предусматривать обязательство пожертвования: эта сумма не идёт в доход банка, а направляется на благотворительность. При трудностях лучше заранее обратиться в банк за реструктуризацией.",
+            "en": "The markup does not increase when a payment is late. The contract may include a charity undertaking: that amount is not bank income and goes to charity. If you have difficulties, contact the bank early to restructure.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Можно ли погасить финансирование досрочно?",
+            "en": "Can I repay financing early?",
+        },
+        "answer": {
+            "ru": "Да, досрочное погашение возможно. Цена по мурабахе фиксирована в договоре, но банк может по своему усмотрению предоставить скидку (ибра) на непогашенную часть наценки.",
+            "en": "Yes, early repayment is possible. The murabaha price is fixed in the contract, but the bank may at its discretion grant a rebate (ibra) on the unpaid part of the markup.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Как банк определяет наценку, если процентов нет?",
+            "en": "How does the bank set the markup if there is no interest?",
+        },
+        "answer": {
+            "ru": "Наценка — это торговая прибыль банка от продажи товара, она фиксируется один раз при заключении договора и не зависит от времени просрочки. Банк может ориентироваться на рыночные ставки при расчёте, но сделка остаётся куплей-продажей.",
+            "en": "The markup is the bank's trading profit on the sale of goods; it is fixed once when the contract is signed and does not depend on late payment. The bank may benchmark it against market rates, but the deal remains a sale.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Что такое закят и как его рассчитать?",
+            "en": "What is zakat and how is it calculated?",
+        },
+        "answer": {
+            "ru": "Закят — обязательная ежегодная милостыня, обычно 2,5% от сбережений, превышающих нисаб (порог, примерно стоимость 85 г золота) и пролежавших лунный год. Банк может помочь рассчитать сумму по вашим счетам.",
+            "en": "Zakat is the obligatory annual alms, usually 2.5% of savings above the nisab (a threshold of about the value of 85 g of gold) held for a lunar year. The bank can help calculate it from your accounts.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Кто проверяет соответствие продуктов шариату?",
+            "en": "Who checks that the products comply with Sharia?",
+        },
+        "answer": {
+            "ru": "Шариатский совет банка — независимые учёные в области исламского права — одобряет каждый продукт и договор и регулярно проверяет сделки. Продукты без заключения совета не выпускаются.",
+            "en": "The bank's Sharia board, independent scholars of Islamic law, approves every product and contract and regularly audits transactions. Products are not launched without the board's approval.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Во что инвестируются деньги на депозите? Это халяль?",
+            "en": "Where is deposit money invested? Is it halal?",
+        },
+        "answer": {
+            "ru": "Средства вкладываются только в разрешённые отрасли и активы: торговлю, недвижимость, производство. Алкоголь, табак, азартные игры, свинина, обычные банки и страховщики исключены.",
+            "en": "Funds are invested only in permitted sectors and assets: trade, real estate, manufacturing. Alcohol, tobacco, gambling, pork, conventional banks and insurers are excluded.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Гарантирован ли доход по исламскому вкладу?",
+            "en": "Is the return on an Islamic deposit guaranteed?",
+        },
+        "answer": {
+            "ru": "Нет, фиксированный доход на вклад был бы рибой. Объявляется ожидаемая доходность, а фактическая зависит от прибыли инвестиций; банк может сглаживать выплаты за счёт резерва выравнивания прибыли.",
+            "en": "No, a fixed return on a deposit would be riba. An expected rate is announced and the actual return depends on investment profit; the bank may smooth payouts with a profit equalisation reserve.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Что такое кард хасан (беспроцентный заём)?",
+            "en": "What is qard hasan (a benevolent loan)?",
+        },
+        "answer": {
+            "ru": "Кард хасан — беспроцентный заём, который возвращается ровно в той же сумме. Текущие счета в исламском банке часто устроены как кард хасан клиента банку, поэтому деньги на них доступны в любой момент.",
+            "en": "Qard hasan is an interest-free loan repaid in exactly the same amount. Current accounts in an Islamic bank are often a qard hasan from the client to the bank, so the money is available at any time.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Как работает рассрочка BNPL по шариату?",
+            "en": "How does Sharia-compliant BNPL work?",
+        },
+        "answer": {
+            "ru": "Покупка оформляется как продажа с отсрочкой платежа: цена и фиксированная комиссия известны заранее и делятся на равные платежи. Процентов и увеличения суммы при просрочке нет.",
+            "en": "The purchase is a deferred-payment sale: the price and a fixed fee are known upfront and split into equal installments. There is no interest and the amount does not grow when a payment is late.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Как устроена исламская ипотека?",
+            "en": "How does an Islamic mortgage work?",
+        },
+        "answer": {
+            "ru": "Банк покупает жильё сам и продаёт его клиенту в рассрочку (мурабаха) или сдаёт в аренду с постепенным выкупом (иджара или убывающая мушарака). Клиент вносит первоначальный взнос, а цена или график известны заранее.",
+            "en": "The bank buys the home itself and sells it to the client in installments (murabaha) or leases it with gradual buyout (ijara or diminishing musharaka). The client makes a down payment and the price or schedule is known upfront.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Можно ли открыть счёт, если я не мусульманин?",
+            "en": "Can I open an account if I am not Muslim?",
+        },
+        "answer": {
+            "ru": "Да, продукты исламского банка доступны всем клиентам независимо от вероисповедания; условия одинаковы для всех.",
+            "en": "Yes, Islamic banking products are available to all clients regardless of religion; the terms are the same for everyone.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Какие документы нужны для финансирования?",
+            "en": "What documents do I need for financing?",
+        },
+        "answer": {
+            "ru": "Обычно нужны удостоверение личности, подтверждение дохода и, для покупки товара или жилья, документы о самом объекте сделки. Точный список зависит от продукта и суммы.",
+            "en": "Usually an ID, proof of income and, when buying goods or a home, documents about the asset itself. The exact list depends on the product and the amount.",
+        },
+    },
+    {
+        "question": {
+            "ru": "Можно ли копить на цель в исламском банке?",
+            "en": "Can I save towards a goal with an Islamic bank?",
+        },
+        "answer": {
+            "ru": "Да: накопительные счета на основе вакалы или мудараба приносят долю прибыли от халяльных инвестиций. Регулярные автоматические пополнения помогают быстрее достичь цели.",
+            "en": "Yes: savings accounts based on wakala or mudaraba earn a share of the profit from halal investments. Regular automatic top-ups help reach the goal faster.",
+        },
+    },
+]
@@ -0,0 +1,277 @@
+"""
+Deterministic, vectorized features for the spontaneous-purchase model.
+
+Shared by batch enrichment, online scoring and incremental ingestion.
+Features are computed in float64 (the values persisted with each transaction)
+and stacked into a float32 matrix in the column order of the model bundle's
+`features` list for the model only. Missing values stay NaN and are filled by
+the imputer.
+Only NumPy is needed, so the serving path does not import pandas.
+"""
+import re
+from collections import Counter
+from datetime import date
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+FEATURES = [
+    "amount", "day_of_week", "is_weekend", "transaction_hour", "amount_normalized",
+    "merchant_frequency", "category_frequency", "balance_before", "is_high_risk_merchant",
+    "delta_time_previous", "mcc_encoded",
+]
+RISKY_MERCHANTS = ["Netflix", "Spotify", "AliExpress", "Burger King"]
+
+# Feature columns written back into each transaction (same layout as the enriched JSON)
+BOOL_FEATURES = {"is_weekend", "is_high_risk_merchant"}
+INT_FEATURES = {"day_of_week", "transaction_hour", "merchant_frequency", "category_frequency", "mcc_encoded"}
+# Model inputs copied from the transaction itself; never written back
+INPUT_FEATURES = {"amount"}
+
+# 1970-01-01 was a Thursday
+_EPOCH_WEEKDAY = 3
+
+# YYYY-MM-DD, optionally followed by a time (only the day is used)
+ISO_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}(?:[T ].*)?")
+# Optional numeric inputs read by extract_columns
+NUMERIC_FIELDS = ("mcc", "balance_after", "transaction_hour")
+# Optional text inputs counted by extract_columns (as dict keys, so they must be hashable strings)
+TEXT_FIELDS = ("merchant", "category")
+
+TransactionList = Tuple[Sequence[Dict[str, Any]], float]
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value == value
+
+
+def validate_transaction(tx: Any) -> None:
+    """
+    Raise ValueError unless extract_columns can read `tx`: an ISO `date`, a
+    numeric `amount`, numeric optional fields and string (or null) text fields.
+    """
+    if not isinstance(tx, dict):
+        raise ValueError("Each transaction must be an object.")
+    day = tx.get("date")
+    try:
+        if not isinstance(day, str) or not ISO_DATE_RE.fullmatch(day):
+            raise ValueError
+        date.fromisoformat(day[:10])
+    except ValueError:
+        raise ValueError(f"Invalid date: {day!r} (expected YYYY-MM-DD).")
+    if not _is_number(tx.get("amount")):
+        raise ValueError(f"Invalid amount: {tx.get('amount')!r} (expected a number).")
+    for key in NUMERIC_FIELDS:
+        if tx.get(key) is not None and not _is_number(tx[key]):
+            raise ValueError(f"Invalid {key}: {tx[key]!r} (expected a number).")
+    for key in TEXT_FIELDS:
+        if tx.get(key) is not None and not isinstance(tx[key], str):
+            raise ValueError(f"Invalid {key}: {tx[key]!r} (expected a string).")
+
+
+def _float_column(transactions: Sequence[Dict[str, Any]], key: str) -> np.ndarray:
+    return np.array([tx.get(key) for tx in transactions], dtype="float64")
+
+
+def extract_columns(lists: Sequence[TransactionList]) -> Dict[str, np.ndarray]:
+    """
+    Columns of many transaction lists, each given as (transactions, monthly_income).
+    `group` numbers the lists: frequencies, time deltas and MCC codes are per list.
+    """
+    transactions = [tx for txs, _ in lists for tx in txs]
+    sizes = [len(txs) for txs, _ in lists]
+    # float() with the 'or 0' guard keeps None incomes from turning into NaN
+    incomes = np.array([float(income or 0) for _, income in lists], dtype="float64")
+    return {
+        "group": np.repeat(np.arange(len(lists)), sizes),
+        "day": np.array([tx.get("date") for tx in transactions], dtype="datetime64[D]"),
+        "amount": _float_column(transactions, "amount"),
+        "merchant": np.array([tx.get("merchant") for tx in transactions], dtype=object),
+        "category": np.array([tx.get("category") for tx in transactions], dtype=object),
+        "mcc": _float_column(transactions, "mcc"),
+        "balance_after": _float_column(transactions, "balance_after"),
+        "transaction_hour": _float_column(transactions, "transaction_hour"),
+        "monthly_income": np.repeat(incomes, sizes),
+    }
+
+
+def _factorize(values: np.ndarray) -> np.ndarray:
+    """Integer label per distinct value, -1 for None (object arrays of mixed types)."""
+    labels: Dict[Any, int] = {}
+    return np.array(
+        [-1 if v is None else labels.setdefault(v, len(labels)) for v in values.tolist()],
+        dtype="int64",
+    )
+
+
+def _group_counts(group: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """How often each row's value occurs within its group (NaN for missing values)."""
+    codes = _factorize(values)
+    key = group.astype("int64") * (codes.max() + 2) + codes
+    _, inverse, counts = np.unique(key, return_inverse=True, return_counts=True)
+    out = counts[inverse].astype("float64")
+    out[codes < 0] = np.nan
+    return out
+
+
+def _weekday(day: np.ndarray) -> np.ndarray:
+    days = day.astype("int64").astype("float64")
+    days[np.isnat(day)] = np.nan
+    return (days + _EPOCH_WEEKDAY) % 7
+
+
+def compute_features(columns: Dict[str, np.ndarray], features: Sequence[str] = FEATURES) -> Dict[str, np.ndarray]:
+    """float64 column per model feature, one row per transaction in input order (NaN where unknown)."""
+    n = len(columns["amount"])
+    group, day, amount = columns["group"], columns["day"], columns["amount"]
+    computed = {}
+
+    computed["amount"] = amount
+    computed["day_of_week"] = _weekday(day)
+    computed["is_weekend"] = np.where(np.isnan(computed["day_of_week"]), np.nan, computed["day_of_week"] >= 5)
+    # Recorded hour if known, otherwise left to the imputer (never random)
+    computed["transaction_hour"] = columns["transaction_hour"]
+    income = columns["monthly_income"]
+    computed["amount_normalized"] = np.abs(amount) / np.where(income == 0, 1.0, income)
+    computed["merchant_frequency"] = _group_counts(group, columns["merchant"])
+    computed["category_frequency"] = _group_counts(group, columns["category"])
+    computed["balance_before"] = columns["balance_after"] - amount
+    computed["is_high_risk_merchant"] = np.isin(columns["merchant"], RISKY_MERCHANTS).astype("float64")
+
+    # Chronological order inside each list; a stable sort keeps ties in input order
+    order = np.lexsort((day, group))
+    sorted_group = group[order]
+    sorted_day = day[order].astype("int64").astype("float64")
+    sorted_day[np.isnat(day[order])] = np.nan
+    first_in_group = np.ones(n, dtype=bool)
+    first_in_group[1:] = sorted_group[1:] != sorted_group[:-1]
+    delta = np.zeros(n)
+    delta[1:] = (sorted_day[1:] - sorted_day[:-1]) * 24.0
+    delta[first_in_group] = 0.0
+    delta = np.nan_to_num(delta, nan=0.0)
+    computed["delta_time_previous"] = np.empty(n)
+    computed["delta_time_previous"][order] = delta
+
+    computed["mcc_encoded"] = np.empty(n)
+    computed["mcc_encoded"][order] = _mcc_codes(sorted_group, columns["mcc"][order])
+
+    return {name: computed[name] if name in computed else np.full(n, np.nan) for name in features}
+
+
+def to_matrix(computed: Dict[str, np.ndarray], features: Sequence[str] = FEATURES) -> np.ndarray:
+    """float32 model input from compute_features() columns."""
+    return np.column_stack([computed[name] for name in features]).astype("float32")
+
+
+def build_feature_matrix(columns: Dict[str, np.ndarray], features: Sequence[str] = FEATURES) -> np.ndarray:
+    """float32 matrix of model features, one row per transaction in input order."""
+    return to_matrix(compute_features(columns, features), features)
+
+
+def _mcc_codes(sorted_group: np.ndarray, sorted_mcc: np.ndarray) -> np.ndarray:
+    """Per-list MCC codes numbered by first appearance in time order; -1 for missing."""
+    n = len(sorted_mcc)
+    codes = np.full(n, -1.0)
+    known = ~np.isnan(sorted_mcc)
+    if not known.any():
+        return codes
+    _, mcc_ids = np.unique(sorted_mcc[known], return_inverse=True)
+    key = sorted_group[known].astype("int64") * (mcc_ids.max() + 1) + mcc_ids
+    _, first_pos, inverse = np.unique(key, return_index=True, return_inverse=True)
+    # Rank every (list, mcc) pair by where it first appears inside its list
+    by_first = np.argsort(first_pos, kind="stable")
+    pair_group = sorted_group[known][first_pos[by_first]]
+    group_start = np.r_[0, np.flatnonzero(pair_group[1:] != pair_group[:-1]) + 1]
+    starts = np.repeat(group_start, np.diff(np.r_[group_start, len(by_first)]))
+    rank = np.empty(len(by_first))
+    rank[by_first] = np.arange(len(by_first)) - starts
+    codes[known] = rank[inverse]
+    return codes
+
+
+def feature_columns(computed: Dict[str, np.ndarray], features: Sequence[str] = FEATURES) -> Dict[str, list]:
+    """
+    Derived compute_features() columns as JSON values (bool / int / float, None
+    for NaN), to be stored with each transaction. Input fields such as `amount`
+    are left out, so stored values are never replaced by their float copies.
+    """
+    columns = {}
+    for name in features:
+        if name in INPUT_FEATURES:
+            continue
+        cast = bool if name in BOOL_FEATURES else int if name in INT_FEATURES else float
+        columns[name] = [None if v != v else cast(v) for v in computed[name].tolist()]
+    return columns
+
+
+def impute(matrix: np.ndarray, statistics: np.ndarray) -> np.ndarray:
+    """SimpleImputer.transform for a float matrix: NaN -> per-column statistic."""
+    filled = matrix.copy()
+    rows, cols = np.nonzero(np.isnan(filled))
+    filled[rows, cols] = statistics[cols]
+    return filled
+
+
+class FeatureState:
+    """
+    Running per-list state for incremental scoring: merchant/category counts,
+    MCC codes and the last transaction date. Features of appended rows are the
+    same whether they arrive one at a time or in one batch.
+    """
+
+    __slots__ = ("merchant_counts", "category_counts", "mcc_codes", "last_day")
+
+    def __init__(self):
+        self.merchant_counts: Counter = Counter()
+        self.category_counts: Counter = Counter()
+        self.mcc_codes: Dict[float, int] = {}
+        self.last_day: Optional[np.datetime64] = None
+
+    @classmethod
+    def from_transactions(cls, transactions: Sequence[Dict[str, Any]]) -> "FeatureState":
+        state = cls()
+        for tx in sorted(transactions, key=lambda t: t.get("date") or ""):
+            state._observe(tx)
+        return state
+
+    def _observe(self, tx: Dict[str, Any]) -> None:
+        if tx.get("merchant") is not None:
+            self.merchant_counts[tx["merchant"]] += 1
+        if tx.get("category") is not None:
+            self.category_counts[tx["category"]] += 1
+        mcc = tx.get("mcc")
+        if mcc is not None and float(mcc) not in self.mcc_codes:
+            self.mcc_codes[float(mcc)] = len(self.mcc_codes)
+        if tx.get("date"):
+            day = np.datetime64(tx["date"], "D")
+            if self.last_day is None or day > self.last_day:
+                self.last_day = day
+
+    def append(
+        self,
+        transactions: Sequence[Dict[str, Any]],
+        monthly_income: float,
+        features: Sequence[str] = FEATURES,
+    ) -> Dict[str, np.ndarray]:
+        """
+        compute_features() columns for newly appended transactions (in input order); updates the state.
+        Frequencies count occurrences in the list so far, including the row itself,
+        and time deltas are measured from the latest earlier transaction of the list.
+        """
+        computed = compute_features(extract_columns([(transactions, monthly_income)]), features)
+        for i in sorted(range(len(transactions)), key=lambda i: transactions[i].get("date") or ""):
+            tx = transactions[i]
+            day = np.datetime64(tx["date"], "D") if tx.get("date") else None
+            if "delta_time_previous" in computed:
+                hours = 0.0
+                if day is not None and self.last_day is not None:
+                    hours = float((day - self.last_day).astype("int64")) * 24.0
+                computed["delta_time_previous"][i] = hours
+            self._observe(tx)
+            if "merchant_frequency" in computed and tx.get("merchant") is not None:
+                computed["merchant_frequency"][i] = self.merchant_counts[tx["merchant"]]
+            if "category_frequency" in computed and tx.get("category") is not None:
+                computed["category_frequency"][i] = self.category_counts[tx["category"]]
+            if "mcc_encoded" in computed and tx.get("mcc") is not None:
+                computed["mcc_encoded"][i] = self.mcc_codes[float(tx["mcc"])]
+        return computed
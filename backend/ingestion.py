@@ -0,0 +1,419 @@
+"""
+Incremental transaction ingestion: POST /transactions appends a player's new
+transactions to transactions3Current without rerunning enrichment.
+
+Per request only the new rows are processed:
+
+- enriched fields (day_of_week, merchant_frequency, category_frequency,
+  delta_time_previous, balance_before, mcc_encoded, ...) come from a cached
+  features.FeatureState of the user's current period, so running counts and
+  time deltas continue where the stored list ends;
+- the rows are scored with the shared spontaneous-purchase model;
+- category_summary, goal / goal_progress, the main account balance and
+  last_update are adjusted by the new amounts;
+- the profile is rewritten atomically (temp file + os.replace) from the
+  cached, already encoded JSON of the transaction lists plus the new rows,
+  instead of serializing the whole history again; the new version is put straight into
+  the NPC profile stores and the analytics cache, so the next NPC answer
+  already sees the purchases. A user served from several files has every
+  temp file written before any of them replaces its profile.
+
+Rows must not be older than the latest stored transaction: earlier dates
+would change the features of rows that are already enriched. Columnar
+(.cols) profiles are read-only here; re-import them with profile_shards.py.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import threading
+import traceback
+import uuid
+import weakref
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+from fastapi import APIRouter, HTTPException, Request
+
+import analytics
+from columnar import is_columnar
+from features import FeatureState, feature_columns, to_matrix, validate_transaction
+from json_codec import JSONBytesResponse
+from profile_shards import _write_chunks_temp
+from profile_store import ProfileEntry, ProfileStore, UnknownUserError, stores, user_id_from_request
+from shared_cache import file_lock
+from spontaneous_scorer import scorer
+
+router = APIRouter(tags=["Transactions"])
+
+CURRENT_PERIOD = analytics.CURRENT_PERIOD
+TRANSACTION_KEYS = analytics.TRANSACTION_KEYS
+
+# Upper bound for one /transactions request
+MAX_INGESTED_TRANSACTIONS = 1000
+# Ingestion states kept in memory (one per user and profile file)
+MAX_FEATURE_STATES = int(os.getenv("INGEST_MAX_FEATURE_STATES", "1024"))
+# Encoded chunks of one transaction list before they are merged into one
+MAX_LIST_CHUNKS = 64
+# Text fields analytics groups by, checked besides features.TEXT_FIELDS
+TEXT_FIELDS = ("category_name", "subcategory")
+
+# goal_progress labels ("October 2025"), independent of the process locale
+MONTH_NAMES = (
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+)
+
+
+class IngestionError(ValueError):
+    """The transactions cannot be appended to this profile; `status_code` is the HTTP answer."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+def _round(value: float) -> float:
+    return round(float(value), 2)
+
+
+def normalize_transactions(
+    transactions: Sequence[Any],
+    current: Sequence[Dict[str, Any]],
+    accounts: Dict[str, Any],
+) -> List[Dict[str, Any]]:
+    """
+    Validated copies of the new rows in date order, with type,
+    category / category_name and balance_after filled in.
+    balance_after continues from the last stored row (else the main account balance).
+    """
+    last = current[-1] if current else {}
+    last_date = str(last.get("date") or "")[:10]
+    balance = last.get("balance_after")
+    if balance is None:
+        balance = (accounts.get("main_account") or {}).get("balance") or 0
+    today = date.today().isoformat()
+
+    rows = []
+    for tx in transactions:
+        if not isinstance(tx, dict):
+            raise IngestionError("Each transaction must be an object.")
+        row = dict(tx)
+        row["date"] = str(row.get("date") or today)[:10]
+        # Rejected here (400), not by enrichment halfway through the request
+        try:
+            validate_transaction(row)
+        except ValueError as e:
+            raise IngestionError(str(e))
+        for key in TEXT_FIELDS:
+            if row.get(key) is not None and not isinstance(row[key], str):
+                raise IngestionError(f"Invalid {key}: {row[key]!r} (expected a string).")
+        amount = row["amount"]
+        if row["date"] < last_date:
+            raise IngestionError(f"Transactions must not be older than the latest stored one ({last_date}).")
+        row.setdefault("type", "income" if amount > 0 else "expense")
+        # analytics groups by category_name, the model counts category: keep both
+        if row.get("category_name") is None and row.get("category") is not None:
+            row["category_name"] = row["category"]
+        if row.get("category") is None and row.get("category_name") is not None:
+            row["category"] = row["category_name"]
+        rows.append(row)
+
+    rows.sort(key=lambda row: row["date"])  # stable: same-day rows keep their order
+    for row in rows:
+        if row.get("balance_after") is None:
+            balance = _round(float(balance) + row["amount"])
+            row["balance_after"] = balance
+        else:
+            balance = row["balance_after"]
+    return rows
+
+
+def apply_aggregates(user_data: Dict[str, Any], rows: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Profile-level fields updated by the new rows, as a dict of replacements
+    (the cached profile is shared and is not mutated).
+    """
+    net = sum(row["amount"] for row in rows)
+
+    category_summary = dict(user_data.get("category_summary") or {})
+    for row in rows:
+        name = row.get("category_name")
+        if name is not None:
+            category_summary[name] = _round(category_summary.get(name, 0) + row["amount"])
+
+    accounts = {name: dict(account) for name, account in (user_data.get("accounts") or {}).items()}
+    if "main_account" in accounts:
+        accounts["main_account"]["balance"] = _round((accounts["main_account"].get("balance") or 0) + net)
+
+    goal = dict(user_data.get("goal") or {})
+    target = float(goal.get("target_amount") or 0)
+    goal["current_amount"] = _round((goal.get("current_amount") or 0) + net)
+    if target:
+        goal["progress_percent"] = _round(goal["current_amount"] / target * 100)
+
+    # monthly_update holds the running saved amount: extend the last month or open a new one
+    monthly = [dict(m) for m in (user_data.get("goal_progress") or {}).get("monthly_update") or []]
+    for row in rows:
+        day = date.fromisoformat(row["date"])
+        month = f"{MONTH_NAMES[day.month - 1]} {day.year}"
+        if not monthly or monthly[-1].get("month") != month:
+            monthly.append({"month": month, "saved": monthly[-1].get("saved", 0) if monthly else 0})
+        entry = monthly[-1]
+        entry["saved"] = _round((entry.get("saved") or 0) + row["amount"])
+        if target:
+            entry["progress"] = _round(entry["saved"] / target * 100)
+
+    last_update = max(str(user_data.get("last_update") or ""), max(row["date"] for row in rows))
+    return {
+        "category_summary": category_summary,
+        "accounts": accounts,
+        "goal": goal,
+        "goal_progress": {**(user_data.get("goal_progress") or {}), "monthly_update": monthly},
+        "last_update": last_update,
+    }
+
+
+class _FileState:
+    """What ingestion keeps per profile file between requests."""
+
+    __slots__ = ("version", "features", "list_chunks")
+
+    def __init__(self, version: Tuple[int, int], features: FeatureState, list_chunks: Dict[str, List[bytes]]):
+        self.version = version
+        self.features = features  # running state of the current period
+        self.list_chunks = list_chunks  # UTF-8 JSON of each transaction list's items, in runs
+
+    @staticmethod
+    def _items(transactions: Sequence[Dict[str, Any]]) -> List[bytes]:
+        # "[a, b]" -> [b"a, b"]; an empty list has no chunks
+        return [_dumps(list(transactions))[1:-1]] if transactions else []
+
+    @classmethod
+    def build(cls, entry: ProfileEntry) -> "_FileState":
+        data = entry.data
+        return cls(
+            entry.version,
+            FeatureState.from_transactions(data.get(CURRENT_PERIOD) or []),
+            {key: cls._items(data[key]) for key in TRANSACTION_KEYS if isinstance(data.get(key), list)},
+        )
+
+    def append(self, rows: Sequence[Dict[str, Any]]) -> None:
+        chunks = self.list_chunks.setdefault(CURRENT_PERIOD, [])
+        chunks.extend(self._items(rows))
+        if len(chunks) > MAX_LIST_CHUNKS:
+            chunks[:] = [b", ".join(chunks)]
+
+    def chunks(self, updated: Dict[str, Any]) -> Iterator[bytes]:
+        """UTF-8 JSON of `updated`, whose lists match list_chunks (same text as json.dumps)."""
+        yield b"{"
+        for i, (key, value) in enumerate(updated.items()):
+            yield (b", " if i else b"") + _dumps(key) + b": "
+            if key in self.list_chunks:
+                yield b"["
+                for j, chunk in enumerate(self.list_chunks[key]):
+                    yield (b", " + chunk) if j else chunk
+                yield b"]"
+            else:
+                yield _dumps(value)
+        yield b"}"
+
+
+class _PendingFile:
+    """One profile file of an ingest request: written to `tmp_path`, not yet in place."""
+
+    __slots__ = ("entry", "stores", "state", "rows", "probabilities", "updated", "tmp_path")
+
+    def __init__(self, entry: ProfileEntry, stores: List[ProfileStore], state: _FileState, rows: List[Dict[str, Any]],
+                 probabilities: Sequence[float], updated: Dict[str, Any], tmp_path: str):
+        self.entry = entry
+        self.stores = stores
+        self.state = state
+        self.rows = rows
+        self.probabilities = probabilities
+        self.updated = updated
+        self.tmp_path = tmp_path
+
+
+class TransactionIngestor:
+    """
+    Appends transactions to stored profiles, one request per user at a time.
+
+    A user may be served from several files (the demo user: the enriched JSON
+    for the analyst, as.json for banker and support); every file is updated.
+    """
+
+    def __init__(self, max_states: int = MAX_FEATURE_STATES):
+        self.max_states = max_states
+        # (user_id, path) -> state of the file version last written or read here
+        self._states: "OrderedDict[Tuple[str, str], _FileState]" = OrderedDict()
+        self._states_lock = threading.Lock()
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self.requests = 0
+        self.rows = 0
+        self.state_hits = 0
+        self.state_misses = 0
+
+    def _lock(self, user_id: str) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
+    @staticmethod
+    def _stores_by_path(user_id: str) -> Dict[str, List[ProfileStore]]:
+        by_path: Dict[str, List[ProfileStore]] = {}
+        for store in stores.values():
+            by_path.setdefault(store.resolve_path(user_id), []).append(store)
+        return by_path
+
+    async def _file_state(self, entry: ProfileEntry) -> _FileState:
+        """
+        The file's state, rebuilt (in a thread) only when this version was not
+        written or read here. It is taken out of the cache while in use, so a
+        failed request leaves nothing half-advanced behind.
+        """
+        key = (entry.user_id, entry.path)
+        with self._states_lock:
+            state = self._states.pop(key, None)
+        if state is not None and state.version == entry.version:
+            self.state_hits += 1
+            return state
+        self.state_misses += 1
+        return await asyncio.to_thread(_FileState.build, entry)
+
+    def _keep_state(self, entry: ProfileEntry, state: _FileState) -> None:
+        state.version = entry.version
+        with self._states_lock:
+            self._states[(entry.user_id, entry.path)] = state
+            while len(self._states) > self.max_states:
+                self._states.popitem(last=False)
+
+    async def ingest(self, user_id: str, transactions: Sequence[Any]) -> Dict[str, Any]:
+        """Append `transactions` to every profile file of the user; returns the enriched rows and new aggregates."""
+        # Ids are assigned once, so every file of the user stores the same rows
+        transactions = [
+            {"transaction_id": f"TX-G-{uuid.uuid4().hex[:12]}", **tx} if isinstance(tx, dict) else tx
+            for tx in transactions
+        ]
+        async with self._lock(user_id), contextlib.AsyncExitStack() as locks:
+            by_path = self._stores_by_path(user_id)
+            # Other worker processes may append to the same files; sorted, so they lock in the same order
+            for path in sorted(by_path):
+                await locks.enter_async_context(file_lock(path))
+            pending: List[_PendingFile] = []
+            try:
+                for path_stores in by_path.values():
+                    pending.append(await self._prepare_file(user_id, path_stores, transactions))
+                # Every file is written before any replaces its profile, so a failure leaves all of them as they were
+                for item in pending:
+                    os.replace(item.tmp_path, item.entry.path)
+            except BaseException:
+                for item in pending:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.unlink(item.tmp_path)
+                raise
+            result = None
+            for item in pending:
+                result = self._commit_file(user_id, item)
+        self.requests += 1
+        self.rows += len(result["transactions"])
+        return result
+
+    async def _prepare_file(self, user_id: str, path_stores: List[ProfileStore], transactions: Sequence[Any]) -> _PendingFile:
+        entry = await path_stores[0].get_entry(user_id)
+        if is_columnar(entry.path):
+            raise IngestionError("Columnar profiles are read-only; re-import the user with profile_shards.py.", 409)
+        user_data = entry.data
+        current = user_data.get(CURRENT_PERIOD) or []
+        rows = normalize_transactions(transactions, current, user_data.get("accounts") or {})
+
+        await scorer.start()
+        features = scorer.predictor.features
+        state = await self._file_state(entry)
+        computed = state.features.append(rows, user_data.get("monthly_income", 0) or 0, features)
+        predicted, probabilities = await scorer.score_features(to_matrix(computed, features))
+        columns = feature_columns(computed, features)
+        for i, row in enumerate(rows):
+            for name, values in columns.items():
+                row[name] = values[i]
+            row["is_spontanius_predicted"] = predicted[i]
+
+        updated = {**user_data, CURRENT_PERIOD: [*current, *rows], **apply_aggregates(user_data, rows)}
+        state.append(rows)
+        tmp_path = await asyncio.to_thread(_write_chunks_temp, entry.path, state.chunks(updated))
+        return _PendingFile(entry, path_stores, state, rows, probabilities, updated, tmp_path)
+
+    def _commit_file(self, user_id: str, item: _PendingFile) -> Dict[str, Any]:
+        """Publish a file that is in place: stores, analytics cache and ingestion state."""
+        entry, rows, updated = item.entry, item.rows, item.updated
+        new_entry = ProfileEntry(user_id, entry.path, ProfileStore._file_version(entry.path), updated)
+        for store in item.stores:
+            store.put(new_entry)
+        analytics.advance(entry, new_entry, rows)
+        self._keep_state(new_entry, item.state)
+
+        return {
+            "user_id": user_id,
+            "transactions": [{**row, "probability": p} for row, p in zip(rows, item.probabilities)],
+            "category_summary": updated["category_summary"],
+            "goal": updated["goal"],
+            "accounts": updated["accounts"],
+            "last_update": updated["last_update"],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "rows": self.rows,
+            "feature_states": len(self._states),
+            "state_hits": self.state_hits,
+            "state_misses": self.state_misses,
+        }
+
+
+# Shared instance used by the /transactions route
+ingestor = TransactionIngestor()
+
+
+@router.post("/transactions")
+async def ingest_transactions(request: Request) -> Dict[str, Any]:
+    """
+    Append transactions (e.g. in-game purchases) to the user's current period.
+    Body: {"user_id": ..., "transactions": [{"amount", "date", "merchant", "category", "mcc", ...}]}.
+    `date` defaults to today and `balance_after` to the running balance.
+    Returns the enriched, scored rows (with "probability") and the updated
+    category_summary, goal, accounts and last_update.
+    """
+    try:
+        data = await request.json()
+        if not isinstance(data, dict):
+            raise HTTPException(status_code=400, detail="Expected a JSON object.")
+        try:
+            user_id = await user_id_from_request(request)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        transactions = data.get("transactions")
+        if not isinstance(transactions, list) or not transactions:
+            raise HTTPException(status_code=400, detail="No transactions provided in 'transactions' field.")
+        if len(transactions) > MAX_INGESTED_TRANSACTIONS:
+            raise HTTPException(status_code=413, detail=f"At most {MAX_INGESTED_TRANSACTIONS} transactions per request.")
+
+        return JSONBytesResponse(await ingestor.ingest(user_id, transactions))
+
+    except HTTPException as he:
+        raise he
+    except IngestionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except UnknownUserError:
+        raise HTTPException(status_code=404, detail=f"Unknown user: {user_id}")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="User data file not found.")
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -0,0 +1,329 @@
+"""
+Local intent router for product questions.
+
+Questions about product limits, terms, age eligibility or "what is X" are
+answered from the product catalog with Russian/English templates. Intents are
+recognised by TF-IDF (character n-grams) similarity to example phrasings and
+products by keyword aliases. Everything else, or anything the router is not
+sure about, goes to the LLM.
+
+Questions about the user's own situation never get a template: amounts and
+terms ("5 млн на 24 месяца"), wishes and what-ifs ("хочу", "what if I take")
+and personal questions about a product ("какая ипотека мне подходит") need
+the simulator figures and the LLM. Neither do questions a template would only
+half answer: a template intent needs a keyword of its own in the question,
+and compound questions ("что такое X и чем она отличается") or aspects no
+template covers (early repayment, halal / haram, differences) go to the LLM.
+"""
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from metrics import span
+from product_catalog import Product, ProductCatalog, catalog as default_catalog
+
+# Below this similarity (or margin over the runner-up intent) the LLM answers
+MIN_CONFIDENCE = float(os.getenv("INTENT_MIN_CONFIDENCE", "0.5"))
+MIN_MARGIN = float(os.getenv("INTENT_MIN_MARGIN", "0.04"))
+
+# Intent returned when the query should go to the LLM
+LLM_INTENT = "llm"
+
+# Keyword stems per product name; generic ones only count when nothing more specific matched
+PRODUCT_ALIASES = {
+    "BNPL (рассрочка)": ("bnpl", "рассрочк", "buy now", "pay later", "installment"),
+    "Исламская ипотека": ("ипотек", "mortgage", "жиль", "квартир", "housing", "home financ"),
+    "Копилка": ("копилк", "kopilka", "piggy"),
+    "Вакала": ("вакал", "wakala", "vakala"),
+    "Исламское финансирование": ("исламское финансирован", "islamic financing", "islamic finance product"),
+}
+GENERIC_ALIASES = {
+    "Исламское финансирование": ("финансирован", "financing", "кредит", "loan"),
+}
+
+# Example phrasings per intent (product names are masked before matching)
+INTENT_EXAMPLES = {
+    "product_info": [
+        "что такое", "расскажи про", "расскажи о продукте", "что это за продукт", "объясни как работает",
+        "что означает", "подробнее о", "как устроен продукт",
+        "what is", "tell me about", "explain how it works", "what does it mean", "describe the product",
+        "more info about", "how does it work",
+    ],
+    "product_limits": [
+        "какая максимальная сумма", "какая минимальная сумма", "сколько можно взять", "до какой суммы",
+        "какой лимит", "сколько денег можно получить", "минимальная сумма вклада", "максимальная сумма финансирования",
+        "какую сумму можно оформить", "сколько можно вложить", "минимальный взнос",
+        "what is the maximum amount", "what is the minimum amount", "how much can i borrow", "how much can i get",
+        "what is the limit", "max amount", "how much money can i invest", "minimum deposit",
+    ],
+    "product_terms": [
+        "на какой срок", "какой срок", "сколько месяцев", "максимальный срок", "какая наценка",
+        "какая доходность", "сколько процентов", "какая ставка", "какие условия", "на сколько лет",
+        "минимальный срок", "на какой срок можно взять",
+        "what is the term", "for how long", "how many months", "maximum term", "what is the markup",
+        "what is the return", "what rate", "what are the conditions", "terms and conditions", "how many years",
+        "what is the profit rate",
+    ],
+    "product_age": [
+        "с какого возраста", "до какого возраста", "возрастные ограничения", "сколько лет нужно",
+        "какой возраст", "ограничение по возрасту", "можно ли оформить в 17 лет", "подхожу ли я по возрасту",
+        "what is the age limit", "minimum age", "maximum age", "how old do i need to be", "age requirements",
+        "age restrictions", "can i get it at 17",
+    ],
+    "eligible_products": [
+        "какие продукты мне подходят по возрасту", "что мне доступно", "на что я могу претендовать",
+        "какие продукты я могу оформить", "какие услуги доступны для моего возраста", "что я могу получить",
+        "which products am i eligible for", "what can i apply for", "what is available for my age",
+        "which services can i get", "products available to me",
+    ],
+    "list_products": [
+        "какие продукты есть", "какие у вас продукты", "список продуктов", "что предлагает банк",
+        "какие услуги есть у банка", "перечисли продукты", "какие есть продукты",
+        "what products do you have", "list your products", "what does the bank offer",
+        "what services do you offer", "show all products",
+    ],
+    LLM_INTENT: [
+        "посоветуй что выбрать", "смогу ли я себе позволить", "хватит ли моего дохода", "сравни", "что лучше",
+        "как накопить", "как сэкономить", "проанализируй мои траты", "что такое риба",
+        "почему ислам запрещает проценты", "помоги спланировать бюджет", "какой продукт лучше для меня",
+        "что выгоднее", "сколько я потратил", "как мне достичь цели",
+        "which is better for me", "can i afford", "is my income enough", "compare", "how can i save money",
+        "analyze my spending", "what is riba", "why is interest forbidden", "help me plan my budget",
+        "which product should i choose", "what is more profitable", "how much did i spend", "how do i reach my goal",
+    ],
+}
+# Intents answered about exactly one product
+PRODUCT_INTENTS = ("product_info", "product_limits", "product_terms", "product_age")
+
+# Cues of a question about the user's own plans, matched on normalized text
+_NUMBER = r"\d+(?: \d+)*"
+AMOUNT_CUE_RE = re.compile(
+    _NUMBER + r" ?(?:млн|миллион\w*|млрд|тыс\w*|тенге|тг|k|m|mln|million\w*|thousand\w*|tenge|kzt)\b")
+TERM_CUE_RE = re.compile(_NUMBER + r" ?(?:месяц\w*|мес|лет|год\w*|months?|years?)\b")
+WHAT_IF_CUE_RE = re.compile(
+    r"\b(?:хоч\w*|хотел\w*|хотим|планиру\w*|собира\w*|что если|а если|если я|если возьму|"
+    r"i want|i wanna|i d like|i would like|what if|if i|i m going to|i am going to|i plan|planning to|should i)\b")
+PERSONAL_CUE_RE = re.compile(r"\b(?:мне|меня|мой|моя|мое|мои|моего|моей|моих|моим|me|my|mine)\b")
+# "расскажи мне", "tell me about": addressing the bot, not a personal question
+ADDRESS_RE = re.compile(r"\b(?:расскажи|расскажите|покажи|покажите|объясни|объясните|tell|show|explain to|give) (?:мне|me)\b")
+
+# Keyword evidence a template intent needs besides the similarity (normalized text)
+INTENT_CUE_RES = {
+    "product_info": re.compile(
+        r"\b(?:что так\w*|что за|что это|расскаж\w*|объясн\w*|означа\w*|подробн\w*|устроен\w*|работает|"
+        r"what|tell|explain\w*|mean\w*|describe|info\w*|how does|how it works)\b"),
+    "product_limits": re.compile(
+        r"\b(?:сумм\w*|лимит\w*|сколько|взнос\w*|максимум|минимум|максимальн\w*|минимальн\w*|"
+        r"amount|limit|how much|borrow|deposit|max|min|maximum|minimum)\b"),
+    "product_terms": re.compile(
+        r"\b(?:срок\w*|месяц\w*|лет|год\w*|наценк\w*|доходн\w*|процент\w*|ставк\w*|услови\w*|"
+        r"terms?|long|months?|years?|markup|return|rate|conditions?|profit)\b"),
+    "product_age": re.compile(r"\b(?:возраст\w*|лет|\d+|age|old)\b"),
+    "eligible_products": re.compile(
+        r"\b(?:доступ\w*|подход\w*|претендова\w*|оформ\w*|получ\w*|возраст\w*|eligible|available|apply|get|age)\b"),
+    "list_products": re.compile(
+        r"\b(?:продукт\w*|услуг\w*|предлага\w*|список|перечисл\w*|products?|services?|offer\w*|list)\b"),
+}
+# Aspects no template covers: repayment, Sharia compliance, comparisons, penalties
+UNCOVERED_CUE_RE = re.compile(
+    r"\b(?:досрочн\w*|погас\w*|early|prepay\w*|repay\w*|халял\w*|харам\w*|halal|haram|шариат\w*|sharia\w*|"
+    r"запрещ\w*|разреш\w*|forbidden|permissible|allowed|отлича\w*|отличи\w*|разниц\w*|differ\w*|"
+    r"сравн\w*|compar\w*|vs|versus|лучше|better|штраф\w*|penalt\w*|просроч\w*|overdue)\b")
+# A second question joined to the first: "... и чем она отличается", "..., and is it halal"
+COMPOUND_CUE_RE = re.compile(
+    r"\b(?:и|а также|and|also) (?:чем|как|почему|зачем|это|можно|ли|нужно|how|what|why|is|are|does|do|can|should)\b")
+
+_TOKEN_RE = re.compile(r"\w+")
+_CYRILLIC_RE = re.compile(r"[а-яё]")
+_LATIN_RE = re.compile(r"[a-z]")
+
+
+def normalize(text: str) -> str:
+    return " ".join(_TOKEN_RE.findall(text.casefold().replace("ё", "е")))
+
+
+def detect_language(text: str) -> str:
+    text = text.casefold()
+    return "ru" if len(_CYRILLIC_RE.findall(text)) >= len(_LATIN_RE.findall(text)) else "en"
+
+
+def _features(text: str) -> Counter:
+    """Whole words plus character 3-grams of each padded word (robust to Russian endings)."""
+    features = Counter()
+    for word in text.split():
+        features["w:" + word] += 1
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            features[padded[i:i + 3]] += 1
+    return features
+
+
+class Route(NamedTuple):
+    intent: str
+    product: Optional[str]
+    confidence: float
+    language: str
+    answer: Optional[str]  # None -> ask the LLM
+
+
+class IntentRouter:
+    """Keyword + TF-IDF intent classifier with templated answers over the product catalog."""
+
+    def __init__(
+        self,
+        catalog: ProductCatalog = default_catalog,
+        min_confidence: float = MIN_CONFIDENCE,
+        min_margin: float = MIN_MARGIN,
+    ):
+        self.catalog = catalog
+        self.min_confidence = min_confidence
+        self.min_margin = min_margin
+        # One pattern per product and alias group, compiled once (longest stems first within the alternation)
+        self.alias_patterns = [
+            [
+                (name, re.compile(r"\b(?:" + "|".join(re.escape(s) for s in sorted(stems, key=len, reverse=True)) + r")\w*"))
+                for name, stems in aliases.items() if name in catalog.by_name
+            ]
+            for aliases in (PRODUCT_ALIASES, GENERIC_ALIASES)
+        ]
+
+        examples = [(intent, normalize(text)) for intent, texts in INTENT_EXAMPLES.items() for text in texts]
+        counts = [_features(text) for _, text in examples]
+        vocabulary = sorted({f for c in counts for f in c})
+        self.vocabulary = {f: i for i, f in enumerate(vocabulary)}
+        document_frequency = Counter(f for c in counts for f in c)
+        n = len(examples)
+        self.idf = np.array([math.log((1 + n) / (1 + document_frequency[f])) + 1 for f in vocabulary])
+        self.matrix = np.vstack([self._vector(c) for c in counts])
+        self.intents = sorted(INTENT_EXAMPLES)
+        intent_ids = {intent: i for i, intent in enumerate(self.intents)}
+        self.example_intent = np.array([intent_ids[intent] for intent, _ in examples])
+
+        self._lock = threading.Lock()
+        self.local = Counter()
+        self.fallbacks = 0
+
+    def _vector(self, features: Counter) -> np.ndarray:
+        vector = np.zeros(len(self.vocabulary))
+        for feature, count in features.items():
+            i = self.vocabulary.get(feature)
+            if i is not None:
+                vector[i] = (1 + math.log(count)) * self.idf[i]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def find_products(self, text: str) -> Tuple[List[str], str]:
+        """Products mentioned in normalized `text`, and the text with their mentions removed."""
+        found = []
+        for patterns in self.alias_patterns:
+            for name, pattern in patterns:
+                text, mentions = pattern.subn(" ", text)
+                if mentions and name not in found:
+                    found.append(name)
+            if found:
+                break
+        return found, " ".join(text.split())
+
+    def classify(self, query: str) -> Tuple[str, List[str], float, float]:
+        """(intent, mentioned products, similarity, margin over the next intent)."""
+        products, rest = self.find_products(normalize(query))
+        similarity = self.matrix @ self._vector(_features(rest))
+        best = np.full(len(self.intents), -1.0)
+        np.maximum.at(best, self.example_intent, similarity)
+        order = np.argsort(-best)
+        return self.intents[order[0]], products, float(best[order[0]]), float(best[order[0]] - best[order[1]])
+
+    @staticmethod
+    def is_personal(text: str, intent: str, products: List[str]) -> bool:
+        """True for a question about the user's own plans (normalized `text`), which only the LLM answers."""
+        if AMOUNT_CUE_RE.search(text) or WHAT_IF_CUE_RE.search(text):
+            return True
+        # "с 17 лет" is an age question, "на 20 лет" a term
+        if intent != "product_age" and TERM_CUE_RE.search(text):
+            return True
+        # "что мне доступно" is answered from the age; "какая ипотека мне подходит" is not
+        return bool(products) and bool(PERSONAL_CUE_RE.search(ADDRESS_RE.sub(" ", text)))
+
+    @staticmethod
+    def is_beyond_templates(query: str, text: str, intent: str) -> bool:
+        """True when the `intent` template would leave part of `query` (normalized: `text`) unanswered."""
+        if query.count("?") > 1 or COMPOUND_CUE_RE.search(text) or UNCOVERED_CUE_RE.search(text):
+            return True
+        return not INTENT_CUE_RES[intent].search(text)
+
+    def route(self, query: str, age: Optional[int] = None) -> Route:
+        """Classify `query` and render a local answer when confident; `age` enables eligibility answers."""
+        language = detect_language(query)
+        with span("intent_classify"):
+            intent, products, confidence, margin = self.classify(query)
+        product = products[0] if len(products) == 1 else None
+
+        if intent == "product_age" and product is None and not products:
+            intent = "eligible_products"
+        text = normalize(query)
+        if intent != LLM_INTENT and (self.is_personal(text, intent, products) or self.is_beyond_templates(query, text, intent)):
+            intent = LLM_INTENT
+        answer = None
+        if intent != LLM_INTENT and confidence >= self.min_confidence and margin >= self.min_margin:
+            if intent in PRODUCT_INTENTS:
+                if product is not None:
+                    answer = self._render(intent, self.catalog.by_name[product], language)
+            elif intent == "eligible_products":
+                answer = self._eligible(age, language)
+            elif intent == "list_products":
+                answer = self._list(language)
+
+        with self._lock:
+            if answer is None:
+                self.fallbacks += 1
+            else:
+                self.local[intent] += 1
+        return Route(intent, product, round(confidence, 3), language, answer)
+
+    # === Templates ===
+
+    def _render(self, intent: str, p: Product, lang: str) -> str:
+        if intent == "product_limits":
+            return _sentence(f"{p.name}: {p.amount_text(lang)}")
+        if intent == "product_terms":
+            return _sentence(f"{p.name}: " + ", ".join(d for d in (p.term_text(lang), p.price_text(lang)) if d))
+        if intent == "product_age":
+            return _sentence(f"{p.name}: {p.age_text(lang)}")
+        # product_info
+        details = "; ".join(d for d in (p.amount_text(lang), p.term_text(lang), p.price_text(lang), p.age_text(lang)) if d)
+        return (f"{p.name} ({p.type_name(lang)}) — {p.description(lang)}\n"
+                + _sentence(("Условия: " if lang == "ru" else "Terms: ") + details))
+
+    def _eligible(self, age: Optional[int], lang: str) -> str:
+        if age is None:
+            lines = [f"- {p.name}: {p.age_text(lang)}" for p in self.catalog]
+            header = "Возрастные требования по продуктам:" if lang == "ru" else "Age requirements by product:"
+            return "\n".join([header] + lines)
+        eligible = self.catalog.eligible(age=age)
+        if not eligible:
+            return (f"К сожалению, в {age} лет ни один продукт сейчас не доступен." if lang == "ru"
+                    else f"Unfortunately no product is available at age {age}.")
+        header = (f"В {age} лет вам доступны:" if lang == "ru" else f"At age {age} you can apply for:")
+        return "\n".join([header] + [f"- {p.name}: {p.description(lang)}" for p in eligible])
+
+    def _list(self, lang: str) -> str:
+        header = "Продукты банка:" if lang == "ru" else "Our products:"
+        return "\n".join([header] + [f"- {p.name}: {p.description(lang)}" for p in self.catalog])
+
+    def stats(self) -> Dict[str, Any]:
+        local = sum(self.local.values())
+        total = local + self.fallbacks
+        return {
+            "local_answers": dict(self.local),
+            "llm_fallbacks": self.fallbacks,
+            "local_ratio": round(local / total, 4) if total else 0.0,
+        }
+
+
+def _sentence(text: str) -> str:
+    return text if text.endswith(".") else text + "."
@@ -0,0 +1,108 @@
+"""
+JSON for the hot paths: LLM request bodies and responses, SSE events,
+completion cache keys, profile files and API responses. orjson is used when
+installed, the standard library otherwise; the output is compact UTF-8 either
+way (no indentation, no spaces after separators, non-ASCII text as is).
+
+`fragments` memoizes serialized bodies per profile file version, so repeated
+requests for the same data (e.g. /analyst/stats) send stored bytes; they go
+out through JSONBytesResponse without being encoded again.
+"""
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Union
+
+import numpy as np
+from fastapi.responses import Response
+
+# orjson is optional; it is several times faster than the json module on both ends
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MAX_CACHED_FRAGMENTS = 1024
+
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson is not None else 0
+
+
+def _default(value: Any) -> Any:
+    """NumPy scalars and arrays as plain Python values."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any, sort_keys: bool = False) -> bytes:
+    """Compact UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS | (orjson.OPT_SORT_KEYS if sort_keys else 0))
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys, default=_default).encode("utf-8")
+
+
+def dumps_text(value: Any, sort_keys: bool = False) -> str:
+    return dumps(value, sort_keys).decode("utf-8")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Parse JSON text or UTF-8 bytes; raises json.JSONDecodeError (orjson's error is a subclass)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class JSONBytesResponse(Response):
+    """application/json response encoded with dumps(); bytes content is taken as already encoded JSON."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return content if isinstance(content, bytes) else dumps(content)
+
+
+class FragmentCache:
+    """
+    Serialized JSON by key, LRU-bounded. Keys must include the version of the
+    data they are built from (e.g. the profile file version), so entries are
+    never invalidated, only evicted.
+    """
+
+    def __init__(self, max_entries: int = MAX_CACHED_FRAGMENTS):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, build: Callable[[], Any]) -> bytes:
+        """dumps(build()) for `key`, built once; exceptions from `build` are not cached."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+        data = dumps(build())
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = data
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return data
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "encoder": "orjson" if orjson is not None else "json",
+                "entries": len(self._entries),
+                "bytes": sum(len(data) for data in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# Shared instance for the routers
+fragments = FragmentCache()
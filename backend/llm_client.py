@@ -0,0 +1,300 @@
+import asyncio
+import hashlib
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from fastapi import HTTPException
+from completion_cache import completion_cache
+from json_codec import dumps, loads
+from llm_scheduler import LLMScheduler, priority_for, worker_share
+from metrics import LLM_REQUEST_BYTES, LLM_SECONDS, observe_usage
+
+# Bank API configuration (shared by all NPC routers)
+BANK_API_KEY = os.getenv("BANK_API_KEY", "API-KEY")
+BANK_BASE_URL = os.getenv("BANK_BASE_URL", "https://openai-hub.neuraldeep.tech")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+
+# Connection pool / concurrency limits of the whole server, split among the worker processes
+MAX_CONNECTIONS = worker_share(int(os.getenv("LLM_MAX_CONNECTIONS", "64")))
+MAX_KEEPALIVE_CONNECTIONS = worker_share(int(os.getenv("LLM_MAX_KEEPALIVE", "32")))
+MAX_CONCURRENT_REQUESTS = worker_share(int(os.getenv("LLM_MAX_CONCURRENCY", "32")))
+
+# Timeouts in seconds; read timeout covers the whole generation of a long answer
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "90"))
+
+# Retry policy for transport errors, 429 and 5xx
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+COMPLETIONS_PATH = "/v1/chat/completions"
+
+
+class LLMClient:
+    """
+    Async client for the chat-completions API with a keep-alive connection pool,
+    retry with exponential backoff and a scheduler (llm_scheduler.py) that bounds
+    concurrency and queueing by priority and user.
+    One instance is shared by every router; bank_config.app opens and closes it.
+    """
+
+    def __init__(
+        self,
+        base_url: str = BANK_BASE_URL,
+        api_key: str = BANK_API_KEY,
+        max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+        max_retries: int = MAX_RETRIES,
+        scheduler: Optional[LLMScheduler] = None,
+    ):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.scheduler = scheduler or LLMScheduler(max_concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+        # Identical uncached payloads in flight share one upstream call
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def start(self) -> None:
+        """Open the connection pool (idempotent)."""
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+            },
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+
+    async def aclose(self) -> None:
+        """Close the connection pool."""
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+
+    async def _ensure_started(self) -> httpx.AsyncClient:
+        # Routers may be used without the app lifespan (e.g. in scripts)
+        if self._client is None:
+            await self.start()
+        return self._client
+
+    @staticmethod
+    def _backoff_delay(attempt: int) -> float:
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    async def chat_completion(
+        self,
+        payload: Dict[str, Any],
+        timeout: Optional[float] = None,
+        cache: bool = False,
+        priority: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        POST a chat-completions payload and return the parsed JSON response.
+        Concurrent identical requests share one upstream call; with cache=True
+        identical payloads are also answered from the completion cache.
+        `priority` (llm_scheduler) defaults to one derived from max_tokens.
+        Raises 429 (Retry-After) when the scheduler sheds the call.
+        """
+        if priority is None:
+            priority = priority_for(payload.get("max_tokens"))
+        # Serialized once for all attempts (and measured)
+        body = dumps(payload)
+        cost = estimated_tokens(body, payload)
+        if cache:
+            return await completion_cache.get_or_compute(payload, lambda: self._coalesced(body, priority, cost, timeout))
+        return await self._coalesced(body, priority, cost, timeout)
+
+    async def _coalesced(self, body: bytes, priority: int, cost: int, timeout: Optional[float]) -> Dict[str, Any]:
+        key = hashlib.sha256(body).hexdigest()
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # The leading request was cancelled (client went away): send our own
+                if inflight.cancelled():
+                    return await self._coalesced(body, priority, cost, timeout)
+                raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._post(body, priority, cost, timeout)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # followers re-raise it; don't log "never retrieved"
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _post(self, body: bytes, priority: int, cost: int, timeout: Optional[float] = None) -> Dict[str, Any]:
+        client = await self._ensure_started()
+        request_timeout = httpx.Timeout(timeout, connect=CONNECT_TIMEOUT) if timeout else None
+        LLM_REQUEST_BYTES.observe(len(body), "complete")
+        started = time.perf_counter()
+
+        last_error = ""
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.scheduler.slot(priority, cost):
+                    if request_timeout is not None:
+                        response = await client.post(COMPLETIONS_PATH, content=body, timeout=request_timeout)
+                    else:
+                        response = await client.post(COMPLETIONS_PATH, content=body)
+            except httpx.TimeoutException:
+                last_error = "timeout"
+                status_code = 504
+            except httpx.TransportError as e:
+                last_error = f"transport error: {e}"
+                status_code = 502
+            else:
+                if response.status_code == 200:
+                    result = loads(response.content)
+                    LLM_SECONDS.observe(time.perf_counter() - started, "complete", "ok")
+                    observe_usage(result)
+                    return result
+                status_code = response.status_code
+                last_error = f"{response.status_code} - {response.text}"
+                if status_code not in RETRY_STATUS_CODES:
+                    break
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff_delay(attempt))
+
+        LLM_SECONDS.observe(time.perf_counter() - started, "complete", "error")
+        raise HTTPException(
+            status_code=504 if status_code == 504 else 500,
+            detail=f"LLM API error: {last_error}"
+        )
+
+    async def stream_completion(self, payload: Dict[str, Any], priority: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        POST the payload with `stream: true` and yield content deltas as they arrive.
+        Retries only happen before the first chunk; the scheduler slot is held
+        until the stream is exhausted or closed.
+        """
+        client = await self._ensure_started()
+        if priority is None:
+            priority = priority_for(payload.get("max_tokens"))
+        body = dumps(dict(payload, stream=True))
+        LLM_REQUEST_BYTES.observe(len(body), "stream")
+        cost = estimated_tokens(body, payload)
+        started_at = time.perf_counter()
+
+        last_error = ""
+        status_code = 500
+        started = False
+        for attempt in range(self.max_retries + 1):
+            async with self.scheduler.slot(priority, cost):
+                try:
+                    async with client.stream("POST", COMPLETIONS_PATH, content=body) as response:
+                        if response.status_code == 200:
+                            async for delta in _iter_sse_deltas(response):
+                                started = True
+                                yield delta
+                            LLM_SECONDS.observe(time.perf_counter() - started_at, "stream", "ok")
+                            return
+                        status_code = response.status_code
+                        error_body = await response.aread()
+                        last_error = f"{status_code} - {error_body.decode('utf-8', 'replace')}"
+                except httpx.TimeoutException:
+                    last_error = "timeout"
+                    status_code = 504
+                except httpx.TransportError as e:
+                    last_error = f"transport error: {e}"
+                    status_code = 502
+
+            # Part of the answer is already on the wire, a retry would duplicate it
+            if started or status_code not in RETRY_STATUS_CODES:
+                break
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff_delay(attempt))
+
+        LLM_SECONDS.observe(time.perf_counter() - started_at, "stream", "error")
+        raise HTTPException(
+            status_code=504 if status_code == 504 else 500,
+            detail=f"LLM API error: {last_error}"
+        )
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float = 0.7,
+        model: str = LLM_MODEL,
+        cache: bool = False,
+        priority: Optional[int] = None,
+    ) -> str:
+        """Run a completion and return the stripped reply text."""
+        result = await self.chat_completion(build_payload(messages, max_tokens, temperature, model), cache=cache, priority=priority)
+        return extract_reply(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"coalesced": self.coalesced, "inflight": len(self._inflight), "scheduler": self.scheduler.stats()}
+
+
+def build_payload(
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float = 0.7,
+    model: str = LLM_MODEL,
+) -> Dict[str, Any]:
+    """Build a chat-completions request body."""
+    return {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }
+
+
+def estimated_tokens(body: bytes, payload: Dict[str, Any]) -> int:
+    """Upper estimate of the tokens a call uses (~4 bytes per prompt token + max_tokens), for the TPM bucket."""
+    return len(body) // 4 + int(payload.get("max_tokens") or 0)
+
+
+def extract_reply(result: Dict[str, Any]) -> str:
+    """Pull the assistant message text out of a completion response."""
+    return (result.get("choices") or [{}])[0].get("message", {}).get("content", "").strip()
+
+
+async def _iter_sse_deltas(response: httpx.Response) -> AsyncIterator[str]:
+    """Parse an OpenAI-style `data: {...}` event stream into content deltas."""
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        try:
+            chunk = loads(data)
+        except ValueError:
+            continue
+        observe_usage(chunk)  # the last chunk carries usage when the API is asked for it
+        delta = (chunk.get("choices") or [{}])[0].get("delta", {}).get("content")
+        if delta:
+            yield delta
+
+
+# Shared instance used by all routers
+llm_client = LLMClient()
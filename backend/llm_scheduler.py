@@ -0,0 +1,307 @@
+"""
+Dispatch scheduler in front of the upstream chat-completions API.
+
+Every upstream call first takes a slot here:
+
+- at most `max_concurrency` calls run at once; the rest wait in a bounded queue;
+- waiting calls are served by priority (short interactive answers before long
+  analyses and background summaries) and, within a priority, round-robin per
+  user, so one player's burst cannot starve the others;
+- optional token buckets keep requests/min and tokens/min under the upstream quota;
+- when the queue is full (or a call waited too long) the request is shed with
+  429 + Retry-After instead of piling up; a full queue drops its lowest-priority
+  newest waiter first if the newcomer is more important.
+
+The user of the current request is taken from `request_user`, set when the
+request's user_id is parsed.
+
+The LLM_* limits are for the whole server: with LLM_WORKER_PROCESSES worker
+processes (set by server.py) each process enforces its share of them.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from metrics import registry
+
+# Priorities (lower is served first)
+INTERACTIVE = 0  # short answers: banker chat
+NORMAL = 1  # support questions, service suggestions
+BULK = 2  # long analyses
+BACKGROUND = 3  # conversation summaries
+PRIORITY_NAMES = ("interactive", "normal", "bulk", "background")
+
+# max_tokens thresholds used when the caller does not pass a priority
+INTERACTIVE_MAX_TOKENS = 500
+NORMAL_MAX_TOKENS = 1000
+
+# Processes that share the upstream quota and connection limits
+WORKER_PROCESSES = max(1, int(os.getenv("LLM_WORKER_PROCESSES", "1")))
+
+
+def worker_share(limit):
+    """This process's share of a server-wide limit: counts round down (at least 1), rates divide; 0 stays 0."""
+    if not limit:
+        return limit
+    if isinstance(limit, int):
+        return max(1, limit // WORKER_PROCESSES)
+    return limit / WORKER_PROCESSES
+
+
+MAX_QUEUE = worker_share(int(os.getenv("LLM_QUEUE_SIZE", "256")))
+# Seconds a call may wait for a slot before it is shed
+QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+# Upstream quotas; 0 disables the bucket
+RATE_LIMIT_RPM = worker_share(float(os.getenv("LLM_RATE_LIMIT_RPM", "0")))
+RATE_LIMIT_TPM = worker_share(float(os.getenv("LLM_RATE_LIMIT_TPM", "0")))
+# Bucket size in seconds of quota: how much of it a burst may use at once
+RATE_BURST_SECONDS = float(os.getenv("LLM_RATE_BURST_SECONDS", "10"))
+
+ANONYMOUS = "-"
+
+# user_id of the request being served (set by profile_store.user_id_from_request)
+request_user: ContextVar[str] = ContextVar("request_user", default=ANONYMOUS)
+
+QUEUE_WAIT_SECONDS = registry.histogram(
+    "llm_queue_wait_seconds", "Time an upstream call waited for a scheduler slot.", ("priority",))
+
+
+def priority_for(max_tokens: Optional[int]) -> int:
+    """Default priority from the answer length."""
+    if max_tokens is None or max_tokens <= INTERACTIVE_MAX_TOKENS:
+        return INTERACTIVE
+    if max_tokens <= NORMAL_MAX_TOKENS:
+        return NORMAL
+    return BULK
+
+
+class TokenBucket:
+    """`per_minute` units per minute with bursts of `burst_seconds` worth; rate 0 = unlimited."""
+
+    def __init__(self, per_minute: float, burst_seconds: float = RATE_BURST_SECONDS):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)."""
+        if not self.enabled:
+            return 0.0
+        self._refill(time.monotonic())
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.enabled:
+            self.level -= min(amount, self.capacity)
+
+
+class Overloaded(HTTPException):
+    """429 with a Retry-After hint."""
+
+    def __init__(self, retry_after: float, detail: str = "LLM queue is full, try again later."):
+        seconds = max(1, math.ceil(retry_after))
+        super().__init__(status_code=429, detail=detail, headers={"Retry-After": str(seconds)})
+
+
+class _Waiter:
+    __slots__ = ("user", "priority", "cost", "future", "queued_at")
+
+    def __init__(self, user: str, priority: int, cost: float):
+        self.user = user
+        self.priority = priority
+        self.cost = cost
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.queued_at = time.perf_counter()
+
+
+class LLMScheduler:
+    """Priority / per-user fair admission of upstream calls; used from the event loop only."""
+
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        max_queue: int = MAX_QUEUE,
+        queue_timeout: float = QUEUE_TIMEOUT,
+        requests_per_minute: float = RATE_LIMIT_RPM,
+        tokens_per_minute: float = RATE_LIMIT_TPM,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        # One round-robin ring of users per priority: user -> their waiting calls
+        self._queues: List["OrderedDict[str, Deque[_Waiter]]"] = [OrderedDict() for _ in PRIORITY_NAMES]
+        self._waiting = 0
+        self._active = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._service_time = 1.0  # moving average of slot hold time, for Retry-After
+        self.granted = [0] * len(PRIORITY_NAMES)
+        self.shed = [0] * len(PRIORITY_NAMES)
+        self.max_active = 0
+        self.max_waiting = 0
+
+    # === Admission ===
+
+    def retry_after(self) -> float:
+        """Rough time until a new call would get a slot."""
+        drain = (self._waiting + 1) * self._service_time / max(1, self.max_concurrency)
+        return max(drain, self.requests.wait_time(1))
+
+    def check_admission(self, priority: int) -> None:
+        """Raise 429 right away if a call of this priority would be shed (used before streaming starts)."""
+        if self._waiting >= self.max_queue and self._lowest_waiting() <= priority:
+            self.shed[priority] += 1
+            raise Overloaded(self.retry_after())
+
+    def _lowest_waiting(self) -> int:
+        for priority in range(len(self._queues) - 1, -1, -1):
+            if self._queues[priority]:
+                return priority
+        return -1
+
+    def _can_run(self, cost: float) -> float:
+        """0 if a call of `cost` tokens may start now, else seconds to wait for the buckets."""
+        if self._active >= self.max_concurrency:
+            return math.inf
+        return max(self.requests.wait_time(1), self.tokens.wait_time(cost))
+
+    def _start(self, waiter_priority: int, cost: float) -> None:
+        self.requests.take(1)
+        self.tokens.take(cost)
+        self._active += 1
+        self.granted[waiter_priority] += 1
+        self.max_active = max(self.max_active, self._active)
+
+    async def acquire(self, priority: int, cost: float = 0.0, user: Optional[str] = None) -> None:
+        """Wait for a slot; raises Overloaded (429) when shed."""
+        user = user or request_user.get()
+        if self._waiting == 0 and self._can_run(cost) == 0:
+            self._start(priority, cost)
+            QUEUE_WAIT_SECONDS.observe(0.0, PRIORITY_NAMES[priority])
+            return
+
+        if self._waiting >= self.max_queue:
+            lowest = self._lowest_waiting()
+            if lowest <= priority:
+                self.shed[priority] += 1
+                raise Overloaded(self.retry_after())
+            self._shed_newest(lowest)
+
+        waiter = _Waiter(user, priority, cost)
+        self._queues[priority].setdefault(user, deque()).append(waiter)
+        self._waiting += 1
+        self.max_waiting = max(self.max_waiting, self._waiting)
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if self._remove(waiter):
+                self.shed[priority] += 1
+                raise Overloaded(self.retry_after(), "LLM queue wait timed out, try again later.")
+        except asyncio.CancelledError:
+            # The client went away: give the slot back if it was already granted
+            if not self._remove(waiter) and waiter.future.done() and not waiter.future.exception():
+                self.release(0.0)
+            raise
+        waiter.future.result()  # re-raises Overloaded if the waiter was shed
+        QUEUE_WAIT_SECONDS.observe(time.perf_counter() - waiter.queued_at, PRIORITY_NAMES[priority])
+
+    def release(self, held: float) -> None:
+        self._active -= 1
+        if held > 0:
+            self._service_time = 0.9 * self._service_time + 0.1 * held
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: int, cost: float = 0.0, user: Optional[str] = None) -> AsyncIterator[None]:
+        await self.acquire(priority, cost, user)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+    # === Queue ===
+
+    def _remove(self, waiter: _Waiter) -> bool:
+        """Drop a still-waiting call from its queue; False if it already left it."""
+        ring = self._queues[waiter.priority]
+        calls = ring.get(waiter.user)
+        if calls is None or waiter not in calls:
+            return False
+        calls.remove(waiter)
+        if not calls:
+            del ring[waiter.user]
+        self._waiting -= 1
+        return True
+
+    def _shed_newest(self, priority: int) -> None:
+        ring = self._queues[priority]
+        user = next(reversed(ring))
+        waiter = ring[user][-1]
+        self._remove(waiter)
+        self.shed[priority] += 1
+        waiter.future.set_exception(Overloaded(self.retry_after()))
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        for ring in self._queues:
+            if ring:
+                return ring[next(iter(ring))][0]
+        return None
+
+    def _dispatch(self) -> None:
+        """Start waiting calls while slots and quota allow (priority first, users round-robin)."""
+        while self._waiting:
+            waiter = self._next_waiter()
+            delay = self._can_run(waiter.cost)
+            if delay:
+                if delay != math.inf and self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+                return
+            ring = self._queues[waiter.priority]
+            calls = ring.pop(waiter.user)
+            calls.popleft()
+            if calls:
+                ring[waiter.user] = calls  # back of the ring: the next user goes first
+            self._waiting -= 1
+            self._start(waiter.priority, waiter.cost)
+            waiter.future.set_result(None)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self._active,
+            "waiting": {name: sum(len(calls) for calls in ring.values()) for name, ring in zip(PRIORITY_NAMES, self._queues)},
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "granted": dict(zip(PRIORITY_NAMES, self.granted)),
+            "shed": dict(zip(PRIORITY_NAMES, self.shed)),
+            "max_active": self.max_active,
+            "max_waiting": self.max_waiting,
+            "avg_service_seconds": round(self._service_time, 3),
+            "rate_limit_rpm": self.requests.per_minute,
+            "rate_limit_tpm": self.tokens.per_minute,
+            "worker_processes": WORKER_PROCESSES,
+        }
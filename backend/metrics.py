@@ -0,0 +1,367 @@
+"""
+Prometheus-style metrics (text exposition format, no client library needed)
+and opt-in per-request profiling.
+
+    http_request_duration_seconds{method,route,status}  whole request, streamed bodies included
+    npc_span_seconds{span}         timed steps: profile_load, prompt_context, simulation, model_predict, ...
+    llm_upstream_seconds{mode,outcome}  one upstream chat-completions call (all retries)
+    llm_request_bytes{mode}        serialized request body sent upstream
+    llm_tokens{kind}               prompt / completion tokens from the response `usage`
+    model_batch_rows               rows per spontaneous-purchase predict batch
+    npc_prompt_section_tokens{npc,section}  prompt tokens per section (prompt_layout.py)
+
+Profiling is enabled with REQUEST_PROFILING=1; a request then asks for it with
+`?profile=1` or an `X-Profile: 1` header and the report path comes back in the
+`X-Profile-Report` header. pyinstrument is used when installed, cProfile otherwise.
+
+With SHARED_STATE_DIR (server.py workers) every worker process writes its
+series to <dir>/metrics every METRICS_FLUSH_SECONDS, and a scrape of any
+worker returns the sum over all of them; series of workers that exited stay
+in the sum, so the counts never go down while the server runs.
+"""
+import asyncio
+import bisect
+import cProfile
+import glob
+import io
+import itertools
+import json
+import os
+import pstats
+import secrets
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi import Request
+from fastapi.responses import PlainTextResponse
+
+from shared_cache import shared_path
+
+# pyinstrument is optional; it understands async code, cProfile only sees the thread
+try:
+    from pyinstrument import Profiler as _Pyinstrument
+except Exception:
+    _Pyinstrument = None
+
+REQUEST_PROFILING = os.getenv("REQUEST_PROFILING", "").lower() in ("1", "true", "yes")
+PROFILE_REPORT_DIR = os.getenv("PROFILE_REPORT_DIR", "request_profiles")
+PROFILE_TOP_FUNCTIONS = 40
+# How often a worker process publishes its series for the others' /metrics
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = tuple(2 ** i for i in range(8, 22))  # 256 B .. 2 MB
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+ROWS_BUCKETS = (1, 10, 50, 100, 500, 1000, 5000, 10000)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label combination; safe to observe from worker threads."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            series = self._series.get(labels)
+            return sum(series[:-1]) if series else 0
+
+    def snapshot(self) -> Dict[Tuple[str, ...], list]:
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def render(self, snapshot: Optional[Dict[Tuple[str, ...], list]] = None) -> str:
+        """Exposition text of this process's series, or of `snapshot` (e.g. merged over the workers)."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        if snapshot is None:
+            snapshot = self.snapshot()
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                bucket_labels = _format_labels(self.labelnames, labels, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return "\n".join(lines)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Histogram] = {}
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = Histogram(name, documentation, labelnames, buckets)
+        return metric
+
+    def snapshot(self) -> Dict[str, Dict[Tuple[str, ...], list]]:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def reset(self) -> None:
+        for metric in self._metrics.values():
+            metric.reset()
+
+    def render(self, snapshot: Optional[Dict[str, Dict[Tuple[str, ...], list]]] = None) -> str:
+        return "\n".join(
+            metric.render(None if snapshot is None else snapshot.get(name, {})) for name, metric in self._metrics.items()
+        ) + "\n"
+
+
+class WorkerMetrics:
+    """
+    Registry snapshots of every worker process in one directory, one file
+    per process, written by a background thread and summed on scrape.
+    """
+
+    def __init__(self, registry: "Registry", directory: str, flush_seconds: float = METRICS_FLUSH_SECONDS):
+        self.registry = registry
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._path = ""
+
+    def clear(self) -> None:
+        """Remove the files of a previous server run."""
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            os.unlink(path)
+
+    def hand_over(self) -> None:
+        """
+        Publish this process's series once and forget them; the pre-fork
+        parent calls it so its workers do not each count them again.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self._path = os.path.join(self.directory, f"{os.getpid()}-{secrets.token_hex(4)}.json")
+        self.flush()
+        self.registry.reset()
+
+    def ensure_started(self) -> None:
+        """Start publishing this process's series (once per process: threads do not survive fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            # Not just the pid: a restarted worker may get the pid of one that exited
+            self._path = os.path.join(self.directory, f"{os.getpid()}-{secrets.token_hex(4)}.json")
+            threading.Thread(target=self._run, name="metrics-flush", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except OSError:
+                pass  # the next flush retries
+
+    def flush(self) -> None:
+        snapshot = {
+            name: [[list(labels), series] for labels, series in metric.items()]
+            for name, metric in self.registry.snapshot().items()
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self._path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def merged(self) -> Dict[str, Dict[Tuple[str, ...], list]]:
+        """Series summed over every worker's file, this process's series being current."""
+        self.ensure_started()
+        self.flush()
+        merged: Dict[str, Dict[Tuple[str, ...], List]] = {}
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue  # removed or being replaced
+            for name, series_list in snapshot.items():
+                metric = merged.setdefault(name, {})
+                for labels, series in series_list:
+                    total = metric.get(tuple(labels))
+                    metric[tuple(labels)] = series if total is None else [a + b for a, b in zip(total, series)]
+        return merged
+
+
+registry = Registry()
+
+# Set when the app runs as server.py workers sharing SHARED_STATE_DIR
+_metrics_dir = shared_path("metrics")
+worker_metrics: Optional[WorkerMetrics] = WorkerMetrics(registry, _metrics_dir) if _metrics_dir else None
+
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency until the last body chunk.", ("method", "route", "status"))
+SPAN_SECONDS = registry.histogram("npc_span_seconds", "Duration of timed steps inside the NPC routers.", ("span",))
+LLM_SECONDS = registry.histogram(
+    "llm_upstream_seconds", "Upstream chat-completions latency, retries included.", ("mode", "outcome"))
+LLM_REQUEST_BYTES = registry.histogram(
+    "llm_request_bytes", "Serialized chat-completions request size.", ("mode",), BYTES_BUCKETS)
+LLM_TOKENS = registry.histogram("llm_tokens", "Token usage reported by the LLM API.", ("kind",), TOKEN_BUCKETS)
+MODEL_BATCH_ROWS = registry.histogram("model_batch_rows", "Transactions per model predict batch.", (), ROWS_BUCKETS)
+PROMPT_SECTION_TOKENS = registry.histogram(
+    "npc_prompt_section_tokens", "Prompt tokens per section after the budget cut.", ("npc", "section"), TOKEN_BUCKETS)
+
+
+def span(name: str):
+    """Time a block into npc_span_seconds{span=name}: `with span("profile_load"): ...`."""
+    return SPAN_SECONDS.time(name)
+
+
+def observe_usage(result: Dict) -> None:
+    """Record token usage of a chat-completions response (if the API reported it)."""
+    usage = result.get("usage") if isinstance(result, dict) else None
+    if not isinstance(usage, dict):
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = usage.get(kind)
+        if isinstance(value, (int, float)):
+            LLM_TOKENS.observe(value, kind[: -len("_tokens")])
+
+
+# === Request profiling ===
+
+# One profiled request at a time: profilers are per-thread and would see each other's frames
+_profiling = threading.Lock()
+_report_numbers = itertools.count(1)
+
+
+def _wants_profile(request: Request) -> bool:
+    if not REQUEST_PROFILING:
+        return False
+    flag = request.query_params.get("profile") or request.headers.get("x-profile") or ""
+    return flag.lower() in ("1", "true", "yes")
+
+
+class _RequestProfiler:
+    def __init__(self, request: Request):
+        path = request.url.path.strip("/").replace("/", "_") or "root"
+        self.name = f"{time.strftime('%Y%m%d-%H%M%S')}-{next(_report_numbers)}-{request.method}-{path}"
+        self._profiler = _Pyinstrument(async_mode="enabled") if _Pyinstrument is not None else cProfile.Profile()
+
+    def start(self) -> None:
+        if _Pyinstrument is not None:
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self) -> str:
+        """Stop and write the report; returns its path."""
+        os.makedirs(PROFILE_REPORT_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_REPORT_DIR, self.name)
+        if _Pyinstrument is not None:
+            self._profiler.stop()
+            path = base + ".html"
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self._profiler.output_html())
+            return path
+        self._profiler.disable()
+        self._profiler.dump_stats(base + ".prof")  # for snakeviz / pstats
+        out = io.StringIO()
+        pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        path = base + ".txt"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+        return path
+
+
+async def metrics_middleware(request: Request, call_next):
+    """Observe every request (streamed bodies until their last chunk) and profile it on demand."""
+    if worker_metrics is not None:
+        worker_metrics.ensure_started()
+    profiler: Optional[_RequestProfiler] = None
+    if _wants_profile(request) and _profiling.acquire(blocking=False):
+        profiler = _RequestProfiler(request)
+        profiler.start()
+
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except BaseException:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, request.method, _route_of(request), "500")
+        if profiler is not None:
+            profiler.stop()
+            _profiling.release()
+        raise
+
+    if profiler is not None:
+        # Streamed bodies are not included: the report must be named in the headers
+        response.headers["X-Profile-Report"] = profiler.stop()
+        _profiling.release()
+
+    labels = (request.method, _route_of(request), str(response.status_code))
+    body = response.body_iterator
+
+    async def observed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, *labels)
+
+    response.body_iterator = observed_body()
+    return response
+
+
+def _route_of(request: Request) -> str:
+    # The route template keeps label cardinality bounded (no user ids, no 404 paths)
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+async def metrics_endpoint() -> PlainTextResponse:
+    if worker_metrics is None:
+        return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+    merged = await asyncio.to_thread(worker_metrics.merged)
+    return PlainTextResponse(registry.render(merged), media_type=CONTENT_TYPE)
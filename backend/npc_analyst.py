@@ -1,44 +1,31 @@
-import os
 import traceback
-import json
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from fastapi import APIRouter, HTTPException, Request
-import requests
+from analytics import get_index
+from conversation import conversations, session_from_request
+from features import validate_transaction
+from json_codec import JSONBytesResponse, fragments
+from llm_client import build_payload, llm_client
+from profile_shards import shards
+from profile_store import DEFAULT_USER_ID, ProfileEntry, ProfileStore, UnknownUserError, user_id_from_request
+from prompt_context import get_prompt_context
+from prompt_layout import PromptLayout
+from retrieval import relevant_transactions
+from sse import stream_reply
+from spontaneous_scorer import scorer
 
 router = APIRouter(prefix="/analyst")
 
-# Bank API configuration (using the same as Banker for consistency)
-BANK_API_KEY = "API-KEY"
-BANK_BASE_URL = "https://openai-hub.neuraldeep.tech"
-LLM_MODEL = "gpt-4o-mini"
-
 # Path to user data JSON file
 USER_DATA_PATH = "user_full_banking_data_enriched.json"
 
+# Parsed user profiles (per-user shards; the demo user falls back to USER_DATA_PATH), reloaded only when the file changes
+profiles = ProfileStore("analyst", shards.resolver(USER_DATA_PATH))
 
-@router.post("/analyze-finances")
-async def analyze_finances(request: Request) -> Dict[str, Any]:
-    """
-    Endpoint to handle user queries for financial analysis.
-    Analyzes the JSON file for non-essential expenses, suggests alternatives,
-    compares expenses across months, and analyzes subscription usage.
-    """
-    try:
-        # Parse incoming request
-        data = await request.json()
-        user_query = data.get("text", "").strip()
-        if not user_query:
-            raise HTTPException(status_code=400, detail="No query provided in 'text' field.")
-
-        # Load user financial data from JSON file
-        if not os.path.exists(USER_DATA_PATH):
-            raise HTTPException(status_code=404, detail="User data file not found.")
-        
-        with open(USER_DATA_PATH, "r", encoding="utf-8") as f:
-            user_data = json.load(f)
-
-        # Prepare the prompt for the LLM
-        system_prompt = """
+
+ANALYST_MAX_TOKENS = 1500
+
+ANALYST_SYSTEM_PROMPT = """
 You are a helpful financial analyst NPC. Analyze the provided user financial data.
 Focus on:
 - Identifying non-essential expenses (e.g., entertainment, dining out) and suggest cost-effective alternatives.
@@ -48,48 +35,83 @@ Adapt your response to the user's specific query if provided, but always include
 Respond concisely and clearly, in a friendly tone.
 """
 
-        user_prompt = f"""
-Financial Data (JSON):
-{json.dumps(user_data, indent=2)}
+# Static instructions first, then the user's summary, history, retrieved rows and the query
+layout = PromptLayout("analyst", ANALYST_SYSTEM_PROMPT, max_tokens=ANALYST_MAX_TOKENS)
 
-User Query: {user_query}
-"""
+# Upper bound for one /score-transactions request
+MAX_SCORED_TRANSACTIONS = 5000
 
-        # Prepare headers and payload for the LLM API
-        headers = {
-            "Authorization": f"Bearer {BANK_API_KEY}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": LLM_MODEL,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 1500
-        }
 
-        # Send request to the LLM API
-        llm_response = requests.post(
-            f"{BANK_BASE_URL}/v1/chat/completions",
-            headers=headers,
-            json=payload
-        )
+async def parse_analyst_query(request: Request) -> str:
+    """Extract the user query from the request body."""
+    data = await request.json()
+    user_query = data.get("text", "").strip()
+    if not user_query:
+        raise HTTPException(status_code=400, detail="No query provided in 'text' field.")
+    return user_query
+
+
+async def parse_user_id(request: Request) -> str:
+    """`user_id` from the query string or JSON body (the demo user if absent)."""
+    try:
+        return await user_id_from_request(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        if llm_response.status_code != 200:
-            raise HTTPException(
-                status_code=500,
-                detail=f"LLM API error: {llm_response.status_code} - {llm_response.text}"
-            )
 
-        # Parse LLM response
-        result = llm_response.json()
-        analysis = result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
+async def load_user_profile(user_id: str = DEFAULT_USER_ID) -> ProfileEntry:
+    """Load user financial data from the profile store (the data must not be mutated)."""
+    try:
+        return await profiles.get_entry(user_id)
+    except UnknownUserError:
+        raise HTTPException(status_code=404, detail=f"Unknown user: {user_id}")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="User data file not found.")
+
+
+def build_analysis_messages(
+    user_query: str, financial_summary: str, history: List[Dict[str, str]] = (), relevant: str = ""
+) -> List[Dict[str, str]]:
+    """
+    Build the chat messages for the analyst from the user's financial summary,
+    the transactions retrieved for the query (retrieval.relevant_transactions) and earlier turns.
+    """
+    return layout.build(
+        query=f"User Query: {user_query}",
+        profile=f"Financial Summary:\n{financial_summary}",
+        history=history,
+        context=f"Relevant Transactions:\n{relevant}" if relevant else "",
+    ).messages
+
+
+@router.post("/analyze-finances")
+async def analyze_finances(request: Request) -> Dict[str, Any]:
+    """
+    Endpoint to handle user queries for financial analysis.
+    Analyzes the JSON file for non-essential expenses, suggests alternatives,
+    compares expenses across months, and analyzes subscription usage.
+    """
+    try:
+        # Parse incoming request
+        user_query = await parse_analyst_query(request)
+
+        # Load user financial data and its compact summary (kept once per conversation)
+        profile = await load_user_profile(await parse_user_id(request))
+        session = await session_from_request(request, "analyst", profile.user_id)
+        financial_summary = await conversations.context(session, profile.version, lambda: get_prompt_context(profile))
+        # Only the transactions the question is about, with their totals
+        relevant = await relevant_transactions(profile, user_query)
+
+        # Send request to the LLM API
+        analysis = await llm_client.complete(
+            build_analysis_messages(user_query, financial_summary, session.history(), relevant),
+            max_tokens=ANALYST_MAX_TOKENS,
+            temperature=0.7
+        )
 
         if not analysis:
             raise HTTPException(status_code=500, detail="Empty response from LLM.")
+        await conversations.record(session, user_query, analysis)
 
         # Return the analysis in the expected format
         return {"analysis": analysis, "reply": analysis}  # Provide both for flexibility
@@ -99,6 +121,103 @@ User Query: {user_query}
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.post("/analyze-finances/stream")
+async def analyze_finances_stream(request: Request):
+    """
+    Streaming variant of /analyze-finances: Server-Sent Events with `delta`
+    chunks, then `done` with {"analysis": ..., "reply": ...}.
+    Use `?buffered=1` to get a single JSON response instead.
+    """
+    try:
+        user_query = await parse_analyst_query(request)
+        profile = await load_user_profile(await parse_user_id(request))
+        session = await session_from_request(request, "analyst", profile.user_id)
+        financial_summary = await conversations.context(session, profile.version, lambda: get_prompt_context(profile))
+        relevant = await relevant_transactions(profile, user_query)
+        payload = build_payload(build_analysis_messages(user_query, financial_summary, session.history(), relevant), max_tokens=ANALYST_MAX_TOKENS, temperature=0.7)
+        return await stream_reply(request, payload, reply_keys=("analysis", "reply"),
+                                  on_reply=lambda reply: conversations.record(session, user_query, reply))
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.get("/stats")
+async def analyst_stats(request: Request, month: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Precomputed spending statistics without an LLM call: per-month income,
+    spending and category totals, top merchants, subscription usage and
+    spontaneous-purchase shares. `?month=YYYY-MM` restricts the monthly part.
+    """
+    try:
+        profile = await load_user_profile(await parse_user_id(request))
+        index = await get_index(profile)
+
+        def build() -> Dict[str, Any]:
+            stats = index.to_dict(month=month)
+            if month is not None and not stats["months"]:
+                raise HTTPException(status_code=404, detail=f"No transactions for month '{month}'.")
+            return stats
+
+        # Encoded once per profile version and month
+        return JSONBytesResponse(fragments.get(("analyst_stats", profile.user_id, profile.path, profile.version, month), build))
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.post("/score-transactions")
+async def score_transactions(request: Request) -> Dict[str, Any]:
+    """
+    Score a batch of transactions with the spontaneous-purchase model.
+    Body: {"transactions": [{"date", "amount", "merchant", "category", "mcc", "balance_after", ...}],
+           "monthly_income": optional, defaults to the user's profile}.
+    Returns one {"transaction_id", "is_spontanius_predicted", "probability"} per transaction.
+    """
+    try:
+        data = await request.json()
+        transactions = data.get("transactions")
+        if not isinstance(transactions, list) or not transactions:
+            raise HTTPException(status_code=400, detail="No transactions provided in 'transactions' field.")
+        if len(transactions) > MAX_SCORED_TRANSACTIONS:
+            raise HTTPException(status_code=413, detail=f"At most {MAX_SCORED_TRANSACTIONS} transactions per request.")
+        try:
+            for tx in transactions:
+                validate_transaction(tx)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        monthly_income = data.get("monthly_income")
+        if monthly_income is not None and (isinstance(monthly_income, bool) or not isinstance(monthly_income, (int, float))):
+            raise HTTPException(status_code=400, detail="'monthly_income' must be a number.")
+        if monthly_income is None:
+            monthly_income = (await load_user_profile(await parse_user_id(request))).data.get("monthly_income", 0)
+
+        predicted, probabilities = await scorer.score(transactions, monthly_income)
+        return JSONBytesResponse({
+            "predictions": [
+                {
+                    "transaction_id": tx.get("transaction_id"),
+                    "is_spontanius_predicted": flag,
+                    "probability": probability,
+                }
+                for tx, flag, probability in zip(transactions, predicted, probabilities)
+            ]
+        })
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 # # Run the app (for development, use uvicorn analyst:app --reload)
 # if __name__ == "main":
 #     import uvicorn
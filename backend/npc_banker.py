@@ -1,234 +1,209 @@
-import os
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from fastapi import APIRouter, HTTPException, Request
-import requests
+from analytics import get_index
+from conversation import conversations, session_from_request
+from intent_router import IntentRouter
+from json_codec import JSONBytesResponse, loads
+from llm_client import build_payload, llm_client
+from metrics import span
+from product_catalog import catalog
+from profile_shards import shards
+from profile_store import DEFAULT_USER_ID, ProfileEntry, ProfileStore, UnknownUserError, user_id_from_request
+from prompt_context import get_prompt_context
+from prompt_layout import PromptLayout
+from simulator import simulate, summary_text
+from sse import local_reply, stream_reply
 
 router = APIRouter(prefix="/banker")
 
-# Bank API configuration
-BANK_API_KEY = "API-KEY"
-BANK_BASE_URL = "https://openai-hub.neuraldeep.tech"
-LLM_MODEL = "gpt-4o-mini"
+QUERY_MAX_TOKENS = 500
+SERVICES_MAX_TOKENS = 1000
+SERVICES_SYSTEM_PROMPT = "You are a knowledgeable banker focused on Islamic finance, providing personalized, Sharia-compliant service recommendations in a friendly manner."
 
-# Path to user data JSON file
-USER_DATA_PATH = "as.json"
+# Static instructions, identical for every request, so they lead the prompt (see prompt_layout.py)
+BANKER_SYSTEM_PROMPT = """
+You are a helpful Sharia-compliant banker assistant. Your role is to answer customer questions about banking services, suggest suitable products based on the user's data, and provide accurate information.
+Respond in a friendly, professional manner. If the query is about products, suggest only those that match the user's age, needs, and financial situation from the available products. Explain why the product fits. If the query is general, provide informative answers. Always ensure responses are Sharia-compliant and ethical.
+Response should be in Russian if the query is in Russian, otherwise in English.
+"""
 
-# Predefined bank products database
-BANK_PRODUCTS = [
-    {
-        "name": "BNPL (рассрочка)",
-        "type": "финансирование",
-        "markup_tenge": "от 300",
-        "max_amount_tenge": 300_000,
-        "min_amount_tenge": 10_000,
-        "min_term_months": 1,
-        "max_term_months": 12,
-        "min_age": 18,
-        "max_age": 63,
-        "description": "Sharia-compliant Buy Now, Pay Later for small purchases, ideal for short-term financing needs."
-    },
-    {
-        "name": "Исламское финансирование",
-        "type": "финансирование",
-        "markup_tenge": "от 6,000",
-        "max_amount_tenge": 5_000_000,
-        "min_amount_tenge": 100_000,
-        "min_term_months": 3,
-        "max_term_months": 60,
-        "min_age": 18,
-        "max_age": 60,
-        "description": "Flexible Sharia-compliant financing for medium to large expenses, such as business or personal needs."
-    },
-    {
-        "name": "Исламская ипотека",
-        "type": "финансирование",
-        "markup_tenge": "от 200,000",
-        "max_amount_tenge": 75_000_000,
-        "min_amount_tenge": 3_000_000,
-        "min_term_months": 12,
-        "max_term_months": 240,
-        "min_age": 25,
-        "max_age": 60,
-        "description": "Long-term Sharia-compliant home financing for purchasing property."
-    },
-    {
-        "name": "Копилка",
-        "type": "инвестиционный",
-        "expected_return": "до 18%",
-        "max_amount_tenge": 20_000_000,
-        "min_amount_tenge": 1_000,
-        "min_term_months": 1,
-        "max_term_months": 12,
-        "description": "Short-term Sharia-compliant investment product for small to medium savings with attractive returns."
-    },
-    {
-        "name": "Вакала",
-        "type": "инвестиционный",
-        "expected_return": "до 20%",
-        "max_amount_tenge": "не ограничена",
-        "min_amount_tenge": 50_000,
-        "min_term_months": 3,
-        "max_term_months": 36,
-        "description": "Sharia-compliant investment product for higher returns, suitable for larger investments."
-    }
-]
+SERVICES_GUIDELINES = """
+As a helpful banker specializing in Islamic finance, analyze the user's transactions, financial goal, savings, age and income as of October 19, 2025, 01:24 +05.
+Recommend only products available at the user's age (listed with the user's data) from the catalog below.
+Ensure suggestions align with Islamic principles (no Riba, ethical investments, Zakat encouragement).
+Use the computed affordability and goal figures as they are.
+"""
 
-def load_user_data() -> Dict[str, Any]:
-    """Load user data from JSON file."""
-    if not os.path.exists(USER_DATA_PATH):
-        raise FileNotFoundError(f"User data file not found at {USER_DATA_PATH}")
-    with open(USER_DATA_PATH, 'r', encoding='utf-8') as f:
-        return json.load(f)
+PRODUCTS_SECTION = "Available Products:\n" + catalog.prompt("en")
 
-def generate_llm_prompt(user_query: str, user_data: Dict[str, Any], products: list) -> str:
-    """Generate a prompt for the LLM based on user query, data, and available products."""
-    products_str = json.dumps(products, ensure_ascii=False, indent=2)
-    user_data_str = json.dumps(user_data, ensure_ascii=False, indent=2)
-    
-    prompt = f"""
-    You are a helpful Sharia-compliant banker assistant. Your role is to answer customer questions about banking services, suggest suitable products based on the user's data, and provide accurate information.
+query_layout = PromptLayout("banker", BANKER_SYSTEM_PROMPT, catalog=PRODUCTS_SECTION, max_tokens=QUERY_MAX_TOKENS)
+services_layout = PromptLayout("services", SERVICES_SYSTEM_PROMPT + "\n" + SERVICES_GUIDELINES, catalog=PRODUCTS_SECTION,
+                               max_tokens=SERVICES_MAX_TOKENS)
 
-    User Data:
-    {user_data_str}
+# Path to user data JSON file
+USER_DATA_PATH = "as.json"
 
-    Available Products:
-    {products_str}
+# Product and eligibility questions answered without an LLM call
+intent_router = IntentRouter(catalog)
 
-    User Query: {user_query}
+# Parsed user profiles (per-user shards; the demo user falls back to USER_DATA_PATH), reloaded only when the file changes
+profiles = ProfileStore("banker", shards.resolver(USER_DATA_PATH))
 
-    Respond in a friendly, professional manner. If the query is about products, suggest only those that match the user's age, needs, and financial situation from the available products. Explain why the product fits. If the query is general, provide informative answers. Always ensure responses are Sharia-compliant and ethical.
+async def parse_user_id(request: Request) -> str:
+    """`user_id` from the query string or JSON body (the demo user if absent)."""
+    try:
+        return await user_id_from_request(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    Response should be in Russian if the query is in Russian, otherwise in English.
-    """
-    return prompt
+async def load_user_profile(user_id: str = DEFAULT_USER_ID) -> ProfileEntry:
+    """Load user data from the profile store (the data must not be mutated)."""
+    try:
+        return await profiles.get_entry(user_id)
+    except UnknownUserError:
+        raise HTTPException(status_code=404, detail=f"Unknown user: {user_id}")
+    except FileNotFoundError:
+        raise HTTPException(status_code=500, detail=f"User data file not found for {user_id}")
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=500, detail=f"Invalid JSON in user data file: {str(e)}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading user data file: {str(e)}")
+
+async def run_simulation(profile: ProfileEntry, amount: Optional[float] = None,
+                         term_months: Optional[int] = None, product: Optional[str] = None) -> Dict[str, Any]:
+    """Affordability, goal and financing figures computed locally from the profile."""
+    index = await get_index(profile)
+    with span("simulation"):
+        return simulate(profile.data, index, amount=amount, term_months=term_months, product=product)
 
-def call_llm_api(prompt: str) -> str:
+def build_query_messages(user_query: str, user_summary: str, affordability: str = "",
+                         history: List[Dict[str, str]] = ()) -> List[Dict[str, str]]:
+    """Chat messages for a customer query: instructions and the catalog, the user's figures, earlier turns, the query."""
+    profile = f"User Data (summary):\n{user_summary}"
+    if affordability:
+        profile += f"\n\nAffordability (computed from the user's data, use these figures as they are):\n{affordability}"
+    return query_layout.build(query=f"User Query: {user_query}", profile=profile, history=history).messages
+
+async def call_llm_api(messages: List[Dict[str, str]]) -> str:
     """Call the LLM API to get a response."""
-    headers = {
-        "Authorization": f"Bearer {BANK_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": LLM_MODEL,
-        "messages": [{"role": "user", "content": prompt}],
-        "max_tokens": 500,
-        "temperature": 0.7
-    }
-    response = requests.post(f"{BANK_BASE_URL}/v1/chat/completions", headers=headers, json=payload)
-    
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail="LLM API error")
+    return await llm_client.complete(
+        messages,
+        max_tokens=QUERY_MAX_TOKENS,
+        temperature=0.7
+    )
+
+async def parse_banker_query(request: Request) -> str:
+    """Extract the customer query from the request body."""
+    body = await request.json()
+    user_query = body.get("text")
     
-    data = response.json()
-    return data['choices'][0]['message']['content'].strip()
+    if not user_query:
+        raise HTTPException(status_code=400, detail="Missing 'text' in request body")
+    return user_query
 
 @router.post("/")
 async def handle_query(request: Request) -> Dict[str, str]:
     """Endpoint to handle customer queries and respond using LLM."""
     try:
-        body = await request.json()
-        user_query = body.get("text")
-        
-        if not user_query:
-            raise HTTPException(status_code=400, detail="Missing 'text' in request body")
+        user_query = await parse_banker_query(request)
         
-        user_data = load_user_data()
-        prompt = generate_llm_prompt(user_query, user_data, BANK_PRODUCTS)
-        reply = call_llm_api(prompt)
+        profile = await load_user_profile(await parse_user_id(request))
+        session = await session_from_request(request, "banker", profile.user_id)
+        route = intent_router.route(user_query, age=profile.data.get("age"))
+        if route.answer:
+            await conversations.record(session, user_query, route.answer)
+            return {"reply": route.answer}
+        user_summary = await conversations.context(session, profile.version, lambda: get_prompt_context(profile))
+        affordability = summary_text(await run_simulation(profile))
+        reply = await call_llm_api(build_query_messages(user_query, user_summary, affordability, session.history()))
+        await conversations.record(session, user_query, reply)
         
         return {"reply": reply}
     
+    except HTTPException:
+        raise
     except FileNotFoundError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
 
-# Helper function to load user data from JSON file
-def load_user_data() -> Dict[str, Any]:
+@router.post("/stream")
+async def handle_query_stream(request: Request):
+    """Streaming (SSE) variant of the banker query endpoint; `?buffered=1` returns plain JSON."""
     try:
-        if not os.path.exists(USER_DATA_PATH):
-            raise HTTPException(status_code=500, detail=f"User data file not found at {USER_DATA_PATH}")
-        with open(USER_DATA_PATH, 'r', encoding='utf-8') as file:
-            return json.load(file)
-    except json.JSONDecodeError as e:
-        raise HTTPException(status_code=500, detail=f"Invalid JSON in user data file: {str(e)}")
+        user_query = await parse_banker_query(request)
+        
+        profile = await load_user_profile(await parse_user_id(request))
+        session = await session_from_request(request, "banker", profile.user_id)
+        route = intent_router.route(user_query, age=profile.data.get("age"))
+        if route.answer:
+            await conversations.record(session, user_query, route.answer)
+            return local_reply(request, route.answer)
+        user_summary = await conversations.context(session, profile.version, lambda: get_prompt_context(profile))
+        affordability = summary_text(await run_simulation(profile))
+        messages = build_query_messages(user_query, user_summary, affordability, session.history())
+        payload = build_payload(messages, max_tokens=QUERY_MAX_TOKENS, temperature=0.7)
+        return await stream_reply(request, payload, on_reply=lambda reply: conversations.record(session, user_query, reply))
+    
+    except HTTPException:
+        raise
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading user data file: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
 
-# Helper function to call Bank's LLM API for service suggestions with user data and optional query
-def call_llm_api_for_services(user_data: Dict[str, Any], query: str = "") -> str:
+# Helper function to build the service-suggestion messages from user data and optional query
+def build_services_messages(user_data: Dict[str, Any], user_summary: str, query: str = "", affordability: str = "") -> List[Dict[str, str]]:
     # Extract relevant fields from user_data
     goal = user_data.get("goal", {}).get("target_amount", 1000000)
     current_savings = user_data.get("goal", {}).get("current_amount", 0)
     user_age = user_data.get("age", 30)  # Default to 30 if not provided
     monthly_income = user_data.get("monthly_income", 0)
-    transactions = []
-    for key in ["transactions1", "transactions2", "transactions3Current"]:
-        transactions.extend(user_data.get(key, []))
-    subscriptions = user_data.get("subscriptions", [])
-# Filter products based on user age
-    eligible_products = [
-        product for product in BANK_PRODUCTS
-        if ('min_age' not in product or user_age >= product['min_age']) and
-           ('max_age' not in product or user_age <= product['max_age'])
-    ]
-    
+    # Filter products based on user age (named here, described once in the shared catalog section)
+    eligible_products = ", ".join(product.name for product in catalog.eligible(age=user_age))
+
+    profile = (
+        f"Products available at the user's age: {eligible_products}\n"
+        f"User's financial goal: {goal} tenge. Current savings: {current_savings} tenge. User age: {user_age} years. Monthly income: {monthly_income} tenge.\n"
+        f"Affordability and goal projections (computed):\n{affordability}\n\n"
+        f"Spending summary (transactions and subscriptions):\n{user_summary}"
+    )
     if query:
         # Custom query prompt (suggest one product)
-        prompt = (
-            "As a helpful banker specializing in Islamic finance, analyze the user's financial data as of October 19, 2025, 01:24 +05, focusing on the following query: '{query}'.\n"
-            "Select exactly one Sharia-compliant banking service from the following list that best matches the user's needs based on their spending patterns, financial goal, savings, age, and income:\n"
-            f"{json.dumps(eligible_products, indent=2, ensure_ascii=False)}\n\n"
-            "Consider the following:\n"
-            "- Match the product to the query and user's needs (e.g., financing for large expenses like housing, investments for savings growth).\n"
-            "- Ensure the product aligns with Islamic principles (no Riba, ethical investments, Zakat encouragement).\n"
-            "- For 'what-if' scenarios (e.g., taking a mortgage), evaluate affordability based on monthly income, expenses, and savings.\n"
-            f"User's financial goal: {goal} tenge. Current savings: {current_savings} tenge. User age: {user_age} years. Monthly income: {monthly_income} tenge.\n"
-            f"Transactions: {json.dumps(transactions, indent=2, ensure_ascii=False)}\n"
-            f"Subscriptions: {json.dumps(subscriptions, indent=2)}\n\n"
+        task = (
+            f"Focus on the following query: '{query}'.\n"
+            "Select exactly one Sharia-compliant banking service from the products available at the user's age that best matches the user's needs based on their spending patterns, financial goal, savings, age, and income.\n"
+            "Match the product to the query and user's needs (e.g., financing for large expenses like housing, investments for savings growth).\n"
+            "For 'what-if' scenarios (e.g., taking a mortgage), judge affordability with the computed figures; do not recalculate them.\n"
             "Output in clear, structured text:\n"
             "- Name the recommended product.\n"
             "- Explain why this product is the best fit for the query and user's situation, referencing their data.\n"
-            "- Calculate progress toward the goal (as a percentage) and any relevant affordability metrics.\n"
-            "- End with a brief motivational message encouraging ethical financial behavior and Zakat."
+            "- Quote the goal progress and the installment / affordability figures that apply.\n"
+            "- End with a brief motivational message encouraging ethical financial behavior and Zakat.\n"
             "Отвечай только на русском языке!"
-        ).format(query=query)
+        )
     else:
         # Default prompt (suggest 3-5 products)
-        prompt = (
-            "As a helpful banker specializing in Islamic finance, analyze the user's transactions, financial goal, and savings as of October 19, 2025, 01:24 +05.\n"
-            "Suggest 3-5 Sharia-compliant banking services from the following list, tailoring recommendations to the user's spending patterns, goal, and savings:\n"
-            f"{json.dumps(eligible_products, indent=2, ensure_ascii=False)}\n\n"
-            "Consider the following:\n"
-            "- Match services to the user's needs (e.g., financing for large expenses, investments for savings growth).\n"
-            "- Ensure suggestions align with Islamic principles (no Riba, ethical investments, Zakat encouragement).\n"
-            "- Calculate progress toward the goal and include motivational advice.\n"
-            f"User's financial goal: {goal} tenge. Current savings: {current_savings} tenge. User age: {user_age} years. Monthly income: {monthly_income} tenge.\n"
-            f"Transactions: {json.dumps(transactions, indent=2, ensure_ascii=False)}\n\n"
-            "Output in clear, structured text: list 3-5 specific service suggestions with brief explanations, ending with encouragement."
+        task = (
+            "Suggest 3-5 Sharia-compliant banking services from the products available at the user's age, tailoring recommendations to the user's spending patterns, goal, and savings.\n"
+            "Match services to the user's needs (e.g., financing for large expenses, investments for savings growth).\n"
+            "Quote the computed goal progress and affordability figures and include motivational advice.\n"
+            "Output in clear, structured text: list 3-5 specific service suggestions with brief explanations, ending with encouragement.\n"
             "Отвечай только на русском языке!"
         )
-    
-    headers = {
-        "Authorization": f"Bearer {BANK_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": LLM_MODEL,
-        "messages": [
-            {"role": "system", "content": "You are a knowledgeable banker focused on Islamic finance, providing personalized, Sharia-compliant service recommendations in a friendly manner."},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 1000,
-        "temperature": 0.7
-    }
-    
-    response = requests.post(f"{BANK_BASE_URL}/v1/chat/completions", headers=headers, json=payload)
-    if response.status_code != 200:
-        raise HTTPException(status_code=500, detail=f"Error calling LLM API: {response.text}")
-    
-    return response.json()["choices"][0]["message"]["content"]
+
+    return services_layout.build(query=task, profile=profile).messages
+
+# Helper function to call Bank's LLM API for service suggestions with user data and optional query
+async def call_llm_api_for_services(user_data: Dict[str, Any], user_summary: str, query: str = "", affordability: str = "") -> str:
+    return await llm_client.complete(
+        build_services_messages(user_data, user_summary, query, affordability),
+        max_tokens=SERVICES_MAX_TOKENS,
+        temperature=0.7
+    )
 
 # API Endpoint for Banker suggestions, accepting only query
 @router.post("/suggest-services")
@@ -237,11 +212,17 @@ async def suggest_services(request: Request):
         data = await request.json()
         query = data.get("query", "")  # Optional user text query
         
-        # Load user data from file
-        user_data = load_user_data()
+        # Load user data and its compact summary
+        profile = await load_user_profile(await parse_user_id(request))
+        if query:
+            route = intent_router.route(query, age=profile.data.get("age"))
+            if route.answer:
+                return {"reply": route.answer}
+        user_summary = await get_prompt_context(profile)
+        affordability = summary_text(await run_simulation(profile))
         
         # Get LLM suggestions
-        suggestions_text = call_llm_api_for_services(user_data, query)
+        suggestions_text = await call_llm_api_for_services(profile.data, user_summary, query, affordability)
         
         # Response structure with only text field
         response = {
@@ -249,11 +230,71 @@ async def suggest_services(request: Request):
         }
         
         return response
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+# Streaming (SSE) variant of suggest-services; `?buffered=1` returns plain JSON
+@router.post("/suggest-services/stream")
+async def suggest_services_stream(request: Request):
+    try:
+        data = await request.json()
+        query = data.get("query", "")  # Optional user text query
+        
+        profile = await load_user_profile(await parse_user_id(request))
+        if query:
+            route = intent_router.route(query, age=profile.data.get("age"))
+            if route.answer:
+                return local_reply(request, route.answer)
+        user_summary = await get_prompt_context(profile)
+        affordability = summary_text(await run_simulation(profile))
+        payload = build_payload(build_services_messages(profile.data, user_summary, query, affordability), max_tokens=SERVICES_MAX_TOKENS, temperature=0.7)
+        return await stream_reply(request, payload)
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+def _optional_number(body: Dict[str, Any], key: str, cast):
+    value = body.get(key)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        raise HTTPException(status_code=400, detail=f"'{key}' must be a positive number")
+    return cast(value)
+
+# Local what-if simulation: installment schedules, affordability and goal dates, no LLM involved
+@router.post("/simulate")
+async def simulate_scenarios(request: Request) -> Dict[str, Any]:
+    """
+    Optional body: {"amount": tenge, "term_months": n, "product": name}.
+    Without a body every eligible financing product is priced for the amount still missing for the goal.
+    """
+    try:
+        body = await request.body()
+        data = loads(body) if body else {}
+        if not isinstance(data, dict):
+            raise HTTPException(status_code=400, detail="Request body must be a JSON object")
+        amount = _optional_number(data, "amount", float)
+        term_months = _optional_number(data, "term_months", int)
+        product = data.get("product")
+        if product is not None and catalog.get(product) is None:
+            raise HTTPException(status_code=404, detail=f"Unknown product: {product}")
+
+        profile = await load_user_profile(await parse_user_id(request))
+        return JSONBytesResponse(await run_simulation(profile, amount=amount, term_months=term_months, product=product))
+    except HTTPException:
+        raise
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
 # Run the app (for development, use uvicorn banker:app --reload)
 # if __name__ == "__main__":
 #     import uvicorn
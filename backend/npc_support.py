@@ -1,76 +1,77 @@
-import os
-import json
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from fastapi import APIRouter, HTTPException, Request
-import requests
+from conversation import conversations, session_from_request
+from intent_router import IntentRouter
+from llm_client import build_payload, llm_client
+from product_catalog import catalog
+from profile_shards import shards
+from profile_store import ProfileStore, UnknownUserError, user_id_from_request
+from prompt_layout import PromptLayout
+from retrieval import faq_retriever
+from sse import local_reply, stream_reply
 
 
 router = APIRouter(prefix="/support")
 
-# Bank API configuration
-BANK_API_KEY = "API-KEY"
-BANK_BASE_URL = "https://openai-hub.neuraldeep.tech"
-LLM_MODEL = "gpt-4o-mini"
-
-# Predefined bank products database
-BANK_PRODUCTS = [
-    {
-        "name": "BNPL (рассрочка)",
-        "type": "финансирование",
-        "markup_tenge": "от 300",
-        "max_amount_tenge": 300_000,
-        "min_amount_tenge": 10_000,
-        "min_term_months": 1,
-        "max_term_months": 12,
-        "min_age": 18,
-        "max_age": 63,
-        "description": "Sharia-compliant Buy Now, Pay Later для небольших покупок с коротким сроком финансирования."
-    },
-    {
-        "name": "Исламское финансирование",
-        "type": "финансирование",
-        "markup_tenge": "от 6,000",
-        "max_amount_tenge": 5_000_000,
-        "min_amount_tenge": 100_000,
-        "min_term_months": 3,
-        "max_term_months": 60,
-        "min_age": 18,
-        "max_age": 60,
-        "description": "Гибкое финансирование по принципам шариата для средних и крупных расходов."
-    },
-    {
-        "name": "Исламская ипотека",
-        "type": "финансирование",
-        "markup_tenge": "от 200,000",
-        "max_amount_tenge": 75_000_000,
-        "min_amount_tenge": 3_000_000,
-        "min_term_months": 12,
-        "max_term_months": 240,
-        "min_age": 25,
-        "max_age": 60,
-        "description": "Долгосрочное финансирование жилья по принципам шариата."
-    },
-    {
-        "name": "Копилка",
-        "type": "инвестиционный",
-        "expected_return": "до 18%",
-        "max_amount_tenge": 20_000_000,
-        "min_amount_tenge": 1_000,
-        "min_term_months": 1,
-        "max_term_months": 12,
-        "description": "Краткосрочный инвестиционный продукт по шариату с привлекательной доходностью."
-    },
-    {
-        "name": "Вакала",
-        "type": "инвестиционный",
-        "expected_return": "до 20%",
-        "max_amount_tenge": "не ограничена",
-        "min_amount_tenge": 50_000,
-        "min_term_months": 3,
-        "max_term_months": 36,
-        "description": "Инвестиционный продукт по шариату для высоких доходов, подходит для крупных вложений."
-    }
-]
+SUPPORT_MAX_TOKENS = 1000
+
+# Product questions answered from the catalog without an LLM call
+intent_router = IntentRouter(catalog)
+
+# Only the user's age is read (for eligibility answers); the demo user falls back to this file
+USER_DATA_PATH = "as.json"
+profiles = ProfileStore("support", shards.resolver(USER_DATA_PATH))
+
+SUPPORT_SYSTEM_PROMPT = """
+You are a helpful support agent NPC for an Islamic bank. Answer user questions about Islamic banking principles, terms, products, services, and related topics in a Sharia-compliant, friendly, and informative manner.
+Provide accurate information based on Islamic finance rules (e.g., no riba/interest, focus on profit-sharing, asset-backed transactions).
+If the question relates to bank products, use the following bank products for reference.
+Always respond concisely, clearly, and politely.
+"""
+
+# Rendered once: the product list never changes while the server runs
+layout = PromptLayout("support", SUPPORT_SYSTEM_PROMPT, catalog="Bank Products:\n" + catalog.prompt("ru"),
+                      max_tokens=SUPPORT_MAX_TOKENS)
+
+
+def build_support_messages(user_query: str, history: List[Dict[str, str]] = (), notes: str = "") -> List[Dict[str, str]]:
+    """
+    Build the chat messages for a support question, after the earlier turns of
+    the conversation; `notes` are the FAQ entries retrieved for the question.
+    """
+    return layout.build(
+        query=f"User Question: {user_query}",
+        history=history,
+        context=f"Reference Notes (bank FAQ):\n{notes}" if notes else "",
+    ).messages
+
+
+async def parse_support_query(request: Request) -> str:
+    """Extract the user question from the request body."""
+    data = await request.json()
+    user_query = data.get("text", "").strip()
+    if not user_query:
+        raise HTTPException(status_code=400, detail="No query provided in 'text' field.")
+    return user_query
+
+
+async def parse_user_id(request: Request) -> str:
+    """`user_id` from the query string or JSON body (the demo user if absent)."""
+    try:
+        return await user_id_from_request(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def load_user_age(user_id: str) -> Optional[int]:
+    """Age of the user, None if it is not known."""
+    try:
+        return (await profiles.get_entry(user_id)).data.get("age")
+    except UnknownUserError:
+        raise HTTPException(status_code=404, detail=f"Unknown user: {user_id}")
+    except FileNotFoundError:
+        return None
+
 
 @router.post("/ask-banker")
 async def handle_support_query(request: Request) -> Dict[str, Any]:
@@ -80,59 +81,29 @@ async def handle_support_query(request: Request) -> Dict[str, Any]:
     """
     try:
         # Parse incoming request
-        data = await request.json()
-        user_query = data.get("text", "").strip()
-        if not user_query:
-            raise HTTPException(status_code=400, detail="No query provided in 'text' field.")
+        user_query = await parse_support_query(request)
 
-        # Prepare the prompt for the LLM
-        system_prompt = """
-You are a helpful support agent NPC for an Islamic bank. Answer user questions about Islamic banking principles, terms, products, services, and related topics in a Sharia-compliant, friendly, and informative manner.
-Provide accurate information based on Islamic finance rules (e.g., no riba/interest, focus on profit-sharing, asset-backed transactions).
-If the question relates to bank products, use the following predefined products database for reference.
-Always respond concisely, clearly, and politely.
-
-Bank Products Database (JSON):
-{products_json}
-""".format(products_json=json.dumps(BANK_PRODUCTS, indent=2, ensure_ascii=False))
-
-        user_prompt = f"User Question: {user_query}"
+        user_id = await parse_user_id(request)
+        session = await session_from_request(request, "support", user_id)
 
-        # Prepare headers and payload for the LLM API
-        headers = {
-            "Authorization": f"Bearer {BANK_API_KEY}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": LLM_MODEL,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 1000
-        }
+        # Simple product questions are answered locally
+        route = intent_router.route(user_query, age=await load_user_age(user_id))
+        if route.answer:
+            await conversations.record(session, user_query, route.answer)
+            return {"reply": route.answer}
 
         # Send request to the LLM API
-        llm_response = requests.post(
-            f"{BANK_BASE_URL}/v1/chat/completions",
-            headers=headers,
-            json=payload
+        history = session.history()
+        reply = await llm_client.complete(
+            build_support_messages(user_query, history, faq_retriever.context(user_query)),
+            max_tokens=SUPPORT_MAX_TOKENS,
+            temperature=0.7,
+            cache=not history  # the same few opening questions are asked over and over
         )
 
-        if llm_response.status_code != 200:
-            raise HTTPException(
-                status_code=500,
-                detail=f"LLM API error: {llm_response.status_code} - {llm_response.text}"
-            )
-
-        # Parse LLM response
-        result = llm_response.json()
-        reply = result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
-
         if not reply:
             raise HTTPException(status_code=500, detail="Empty response from LLM.")
+        await conversations.record(session, user_query, reply)
 
         # Return the reply in the expected format
         return {"reply": reply}
@@ -144,3 +115,30 @@ Bank Products Database (JSON):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+
+@router.post("/ask-banker/stream")
+async def handle_support_query_stream(request: Request):
+    """
+    Streaming variant of /ask-banker: sends the reply as Server-Sent Events
+    (`delta` chunks, then `done` with {"reply": ...}).
+    Use `?buffered=1` to get a single JSON response instead.
+    """
+    try:
+        user_query = await parse_support_query(request)
+        user_id = await parse_user_id(request)
+        session = await session_from_request(request, "support", user_id)
+        route = intent_router.route(user_query, age=await load_user_age(user_id))
+        if route.answer:
+            await conversations.record(session, user_query, route.answer)
+            return local_reply(request, route.answer)
+        history = session.history()
+        payload = build_payload(build_support_messages(user_query, history, faq_retriever.context(user_query)), max_tokens=SUPPORT_MAX_TOKENS, temperature=0.7)
+        return await stream_reply(request, payload, cache=not history,
+                                  on_reply=lambda reply: conversations.record(session, user_query, reply))
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -0,0 +1,268 @@
+"""
+Bank product catalog shared by the banker and support NPCs.
+
+Products are parsed once into `Product` objects with numeric bounds
+("от 6,000" -> 6000, "не ограничена" -> inf), indexed by age, amount and term
+for eligibility lookups, and rendered once per language into the compact
+lines used in prompts.
+"""
+import math
+import re
+from bisect import bisect_left
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LANGUAGES = ("ru", "en")
+
+BANK_PRODUCTS = [
+    {
+        "name": "BNPL (рассрочка)",
+        "type": "финансирование",
+        "markup_tenge": "от 300",
+        "max_amount_tenge": 300_000,
+        "min_amount_tenge": 10_000,
+        "min_term_months": 1,
+        "max_term_months": 12,
+        "min_age": 18,
+        "max_age": 63,
+        "description": {
+            "ru": "Sharia-compliant Buy Now, Pay Later для небольших покупок с коротким сроком финансирования.",
+            "en": "Sharia-compliant Buy Now, Pay Later for small purchases, ideal for short-term financing needs.",
+        },
+    },
+    {
+        "name": "Исламское финансирование",
+        "type": "финансирование",
+        "markup_tenge": "от 6,000",
+        "max_amount_tenge": 5_000_000,
+        "min_amount_tenge": 100_000,
+        "min_term_months": 3,
+        "max_term_months": 60,
+        "min_age": 18,
+        "max_age": 60,
+        "description": {
+            "ru": "Гибкое финансирование по принципам шариата для средних и крупных расходов.",
+            "en": "Flexible Sharia-compliant financing for medium to large expenses, such as business or personal needs.",
+        },
+    },
+    {
+        "name": "Исламская ипотека",
+        "type": "финансирование",
+        "markup_tenge": "от 200,000",
+        "max_amount_tenge": 75_000_000,
+        "min_amount_tenge": 3_000_000,
+        "min_term_months": 12,
+        "max_term_months": 240,
+        "min_age": 25,
+        "max_age": 60,
+        "description": {
+            "ru": "Долгосрочное финансирование жилья по принципам шариата.",
+            "en": "Long-term Sharia-compliant home financing for purchasing property.",
+        },
+    },
+    {
+        "name": "Копилка",
+        "type": "инвестиционный",
+        "expected_return": "до 18%",
+        "max_amount_tenge": 20_000_000,
+        "min_amount_tenge": 1_000,
+        "min_term_months": 1,
+        "max_term_months": 12,
+        "description": {
+            "ru": "Краткосрочный инвестиционный продукт по шариату с привлекательной доходностью.",
+            "en": "Short-term Sharia-compliant investment product for small to medium savings with attractive returns.",
+        },
+    },
+    {
+        "name": "Вакала",
+        "type": "инвестиционный",
+        "expected_return": "до 20%",
+        "max_amount_tenge": "не ограничена",
+        "min_amount_tenge": 50_000,
+        "min_term_months": 3,
+        "max_term_months": 36,
+        "description": {
+            "ru": "Инвестиционный продукт по шариату для высоких доходов, подходит для крупных вложений.",
+            "en": "Sharia-compliant investment product for higher returns, suitable for larger investments.",
+        },
+    },
+]
+
+_TYPE_NAMES = {"финансирование": "financing", "инвестиционный": "investment"}
+_NUMBER_RE = re.compile(r"\d[\d\s,]*(?:\.\d+)?")
+
+
+def parse_bound(value: Any, default: float) -> float:
+    """300_000 -> 300000.0, "от 6,000" -> 6000.0, "до 18%" -> 18.0, "не ограничена" / None -> default."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER_RE.search(value or "")
+    if match is None:
+        return default
+    return float(re.sub(r"[\s,]", "", match.group()))
+
+
+def format_money(value: float, lang: str) -> str:
+    text = f"{value:,.0f}"
+    return text.replace(",", " ") if lang == "ru" else text
+
+
+class Product:
+    """One catalog entry with numeric bounds; missing age limits mean no restriction."""
+
+    __slots__ = (
+        "name", "type", "min_amount", "max_amount", "min_term", "max_term", "min_age", "max_age",
+        "markup", "expected_return", "descriptions", "fragments",
+    )
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.name: str = raw["name"]
+        self.type: str = raw.get("type", "")
+        self.min_amount = parse_bound(raw.get("min_amount_tenge"), 0.0)
+        self.max_amount = parse_bound(raw.get("max_amount_tenge"), math.inf)
+        self.min_term = int(raw.get("min_term_months", 0))
+        self.max_term = int(raw.get("max_term_months", 0))
+        self.min_age: Optional[int] = raw.get("min_age")
+        self.max_age: Optional[int] = raw.get("max_age")
+        # Minimum markup in tenge for financing, maximum expected return in % for investments
+        self.markup: Optional[float] = parse_bound(raw["markup_tenge"], 0.0) if "markup_tenge" in raw else None
+        self.expected_return: Optional[float] = (
+            parse_bound(raw["expected_return"], 0.0) if "expected_return" in raw else None
+        )
+        description = raw.get("description", "")
+        self.descriptions: Dict[str, str] = (
+            description if isinstance(description, dict) else {lang: description for lang in LANGUAGES}
+        )
+        self.fragments: Dict[str, str] = {lang: self._render(lang) for lang in LANGUAGES}
+
+    @property
+    def age_range(self) -> Tuple[float, float]:
+        return (
+            self.min_age if self.min_age is not None else -math.inf,
+            self.max_age if self.max_age is not None else math.inf,
+        )
+
+    def fits_age(self, age: int) -> bool:
+        low, high = self.age_range
+        return low <= age <= high
+
+    def description(self, lang: str) -> str:
+        return self.descriptions.get(lang) or next(iter(self.descriptions.values()), "")
+
+    def type_name(self, lang: str) -> str:
+        return self.type if lang == "ru" else _TYPE_NAMES.get(self.type, self.type)
+
+    def amount_text(self, lang: str) -> str:
+        low = format_money(self.min_amount, lang)
+        if math.isinf(self.max_amount):
+            return f"сумма от {low} тенге без верхнего предела" if lang == "ru" else f"amount from {low} tenge, no upper limit"
+        high = format_money(self.max_amount, lang)
+        return f"сумма от {low} до {high} тенге" if lang == "ru" else f"amount from {low} to {high} tenge"
+
+    def term_text(self, lang: str) -> str:
+        if lang == "ru":
+            return f"срок от {self.min_term} до {self.max_term} мес."
+        return f"term {self.min_term} to {self.max_term} months"
+
+    def price_text(self, lang: str) -> str:
+        if self.markup is not None:
+            markup = format_money(self.markup, lang)
+            return f"наценка от {markup} тенге" if lang == "ru" else f"markup from {markup} tenge"
+        if self.expected_return is not None:
+            rate = f"{self.expected_return:g}%"
+            return f"ожидаемая доходность до {rate}" if lang == "ru" else f"expected return up to {rate}"
+        return ""
+
+    def age_text(self, lang: str) -> str:
+        if self.min_age is None and self.max_age is None:
+            return "без возрастных ограничений" if lang == "ru" else "no age restrictions"
+        low = self.min_age if self.min_age is not None else 18
+        high = self.max_age if self.max_age is not None else "—"
+        return f"возраст от {low} до {high} лет" if lang == "ru" else f"age {low} to {high}"
+
+    def _render(self, lang: str) -> str:
+        details = "; ".join(t for t in (self.amount_text(lang), self.term_text(lang), self.price_text(lang), self.age_text(lang)) if t)
+        return f"- {self.name} [{self.type_name(lang)}]: {self.description(lang)} {details}"
+
+    def __repr__(self) -> str:
+        return f"Product({self.name!r})"
+
+
+class IntervalIndex:
+    """
+    Closed intervals over the elementary segments between their end points:
+    which intervals contain x is one binary search plus a precomputed bitmask.
+    """
+
+    __slots__ = ("points", "at_point", "between")
+
+    def __init__(self, intervals: Sequence[Tuple[float, float]]):
+        self.points = sorted({bound for interval in intervals for bound in interval if not math.isinf(bound)})
+
+        def mask(contains) -> int:
+            return sum(1 << i for i, interval in enumerate(intervals) if contains(interval))
+
+        self.at_point = [mask(lambda iv, x=x: iv[0] <= x <= iv[1]) for x in self.points]
+        # between[i]: open segment just below points[i]; the last one is above every point
+        probes = [self.points[0] - 1 if self.points else 0.0]
+        probes += [(a + b) / 2 for a, b in zip(self.points, self.points[1:])]
+        probes += [self.points[-1] + 1] if self.points else []
+        self.between = [mask(lambda iv, x=x: iv[0] <= x <= iv[1]) for x in probes]
+
+    def query(self, x: float) -> int:
+        """Bitmask of the intervals containing x."""
+        i = bisect_left(self.points, x)
+        if i < len(self.points) and self.points[i] == x:
+            return self.at_point[i]
+        return self.between[i]
+
+
+class ProductCatalog:
+    """Products loaded once, with eligibility indexes and pre-rendered prompt text."""
+
+    __slots__ = ("products", "by_name", "_all", "_age", "_amount", "_term", "_prompts")
+
+    def __init__(self, raw_products: Sequence[Dict[str, Any]]):
+        self.products: List[Product] = [Product(raw) for raw in raw_products]
+        self.by_name: Dict[str, Product] = {p.name: p for p in self.products}
+        self._all = (1 << len(self.products)) - 1
+        self._age = IntervalIndex([p.age_range for p in self.products])
+        self._amount = IntervalIndex([(p.min_amount, p.max_amount) for p in self.products])
+        self._term = IntervalIndex([(p.min_term, p.max_term) for p in self.products])
+        self._prompts = {lang: self.render(self.products, lang) for lang in LANGUAGES}
+
+    def __iter__(self) -> Iterator[Product]:
+        return iter(self.products)
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def get(self, name: str) -> Optional[Product]:
+        return self.by_name.get(name)
+
+    def eligible(
+        self,
+        age: Optional[float] = None,
+        amount: Optional[float] = None,
+        term_months: Optional[float] = None,
+    ) -> List[Product]:
+        """Products whose age, amount and term ranges contain the given values (None = any)."""
+        mask = self._all
+        if age is not None:
+            mask &= self._age.query(age)
+        if amount is not None:
+            mask &= self._amount.query(amount)
+        if term_months is not None:
+            mask &= self._term.query(term_months)
+        return [p for i, p in enumerate(self.products) if mask >> i & 1]
+
+    def prompt(self, lang: str = "en") -> str:
+        """All products as compact prompt lines (rendered once)."""
+        return self._prompts[lang]
+
+    @staticmethod
+    def render(products: Sequence[Product], lang: str = "en") -> str:
+        return "\n".join(p.fragments[lang] for p in products)
+
+
+# Shared instance, built at import
+catalog = ProductCatalog(BANK_PRODUCTS)
@@ -0,0 +1,241 @@
+"""
+Per-user profile storage: one JSON file per user spread over hashed shard
+directories, plus an index of the stored user ids.
+
+    profiles/
+        index.json          {"users": {"user_00042": "3f/user_00042.json", ...}}
+        3f/user_00042.json
+        a1/user_00077.cols/ columnar profile (see columnar.py), if imported with --columnar
+
+Lookups are a dict access in the in-memory index, so they cost the same for
+10 or 10 million users and never touch the disk on the request path; a
+background thread reloads index.json when it changes on disk (checked every
+PROFILE_INDEX_POLL_SECONDS). ProfileStore then parses and caches the user's
+own small file. Files are written atomically (temp file + os.replace), and
+index updates hold an exclusive lock on index.json.lock, so concurrent
+importers or worker processes do not lose each other's entries.
+
+Import profiles from .json / .jsonl files (e.g. the enrichment output):
+
+    cd backend && python profile_shards.py users.jsonl --dir profiles [--columnar]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from columnar import COLUMNAR_SUFFIX, write_columnar
+from profile_store import DEFAULT_USER_ID, UnknownUserError, validate_user_id
+from shared_cache import fcntl
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+INDEX_NAME = "index.json"
+# Hex characters of the user id hash used as the shard directory (2 -> 256 shards)
+SHARD_WIDTH = 2
+# How often the serving processes look for index.json changes made by other processes
+INDEX_POLL_SECONDS = float(os.getenv("PROFILE_INDEX_POLL_SECONDS", "1"))
+
+
+def _write_atomic(path: str, text: str) -> None:
+    _write_chunks_atomic(path, [text.encode("utf-8")])
+
+
+def _write_chunks_temp(path: str, chunks: Iterable[bytes]) -> str:
+    """Write the concatenated chunks to a temp file next to `path` (no joined copy in memory); returns its path."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.writelines(chunks)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return tmp_path
+
+
+def _write_chunks_atomic(path: str, chunks: Iterable[bytes]) -> None:
+    """Write the concatenated chunks to `path` via a temp file + os.replace."""
+    tmp_path = _write_chunks_temp(path, chunks)
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class ProfileShards:
+    """Directory of per-user JSON profiles with an index of user ids."""
+
+    def __init__(self, root: str = PROFILE_DIR, poll_seconds: float = INDEX_POLL_SECONDS):
+        self.root = root
+        self.index_path = os.path.join(root, INDEX_NAME)
+        self.poll_seconds = poll_seconds
+        self._users: Dict[str, str] = {}
+        self._index_version: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+        self._poller_lock = threading.Lock()
+        # Threads do not survive fork: each worker process starts its own poller
+        self._poller_pid: Optional[int] = None
+
+    @staticmethod
+    def shard_of(user_id: str) -> str:
+        return hashlib.blake2b(user_id.encode("utf-8"), digest_size=8).hexdigest()[:SHARD_WIDTH]
+
+    def _refresh(self) -> None:
+        """Reload index.json when another process has rewritten it."""
+        try:
+            st = os.stat(self.index_path)
+        except FileNotFoundError:
+            with self._lock:
+                self._users, self._index_version = {}, None
+            return
+        version = (st.st_mtime_ns, st.st_size)
+        if version == self._index_version:
+            return
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            users = json.load(f).get("users", {})
+        with self._lock:
+            self._users, self._index_version = users, version
+
+    def _ensure_poller(self) -> None:
+        """Load the index once per process and keep it fresh from a background thread."""
+        if self._poller_pid == os.getpid():
+            return
+        with self._poller_lock:
+            if self._poller_pid == os.getpid():
+                return
+            self._refresh()
+            threading.Thread(target=self._poll, name="profile-index", daemon=True).start()
+            self._poller_pid = os.getpid()
+
+    def _poll(self) -> None:
+        while True:
+            time.sleep(self.poll_seconds)
+            try:
+                self._refresh()
+            except (OSError, ValueError):
+                pass  # keep serving the previous index; the next poll retries
+
+    def path_for(self, user_id: str) -> Optional[str]:
+        """Path of the user's profile file, or None if the user is not stored (no disk access)."""
+        self._ensure_poller()
+        relative = self._users.get(user_id)
+        return os.path.join(self.root, relative) if relative is not None else None
+
+    def __contains__(self, user_id: str) -> bool:
+        return self.path_for(user_id) is not None
+
+    def __len__(self) -> int:
+        self._refresh()
+        return len(self._users)
+
+    def user_ids(self) -> List[str]:
+        self._refresh()
+        return list(self._users)
+
+    def resolver(self, default_path: Optional[str] = None) -> Callable[[str], str]:
+        """
+        ProfileStore path resolver: stored users map to their shard file; the
+        demo user falls back to `default_path` (the single-user JSON files).
+        """
+        def resolve(user_id: str) -> str:
+            validate_user_id(user_id)
+            path = self.path_for(user_id)
+            if path is not None:
+                return path
+            if default_path is not None and user_id == DEFAULT_USER_ID:
+                return default_path
+            raise UnknownUserError(user_id)
+        return resolve
+
+    # === Writing ===
+
+    @contextmanager
+    def _index_lock(self) -> Iterator[None]:
+        """Exclusive lock for the read-merge-write of index.json, across processes (fcntl) and threads."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.root, exist_ok=True)
+            fd = os.open(self.index_path + ".lock", os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)  # releases the lock
+
+    def _read_index(self) -> Dict[str, str]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("users", {})
+        except FileNotFoundError:
+            return {}
+
+    def _write_index(self, users: Dict[str, str]) -> None:
+        _write_atomic(self.index_path, json.dumps({"users": users}, ensure_ascii=False, separators=(",", ":")))
+        st = os.stat(self.index_path)
+        self._users, self._index_version = users, (st.st_mtime_ns, st.st_size)
+
+    def _write_profile(self, user_id: str, data: Dict[str, Any], columnar: bool) -> str:
+        if columnar:
+            relative = f"{self.shard_of(user_id)}/{user_id}{COLUMNAR_SUFFIX}"
+            write_columnar(data, os.path.join(self.root, relative))
+        else:
+            relative = f"{self.shard_of(user_id)}/{user_id}.json"
+            _write_atomic(os.path.join(self.root, relative), json.dumps(data, ensure_ascii=False))
+        return relative
+
+    def put(self, data: Dict[str, Any], columnar: bool = False) -> str:
+        """Store one profile (keyed by its "user_id") and return its path."""
+        return self.put_many([data], columnar)[0]
+
+    def put_many(self, profiles: Iterable[Dict[str, Any]], columnar: bool = False) -> List[str]:
+        """Store many profiles as JSON files or columnar directories, rewriting the index once at the end."""
+        written = []
+        for data in profiles:
+            user_id = validate_user_id(str(data.get("user_id") or ""))
+            written.append((user_id, self._write_profile(user_id, data, columnar)))
+        # Merge into the index as it is on disk now, not as this process last saw it
+        with self._index_lock():
+            self._write_index({**self._read_index(), **dict(written)})
+        return [os.path.join(self.root, relative) for _, relative in written]
+
+
+# Shared instance used by the NPC routers
+shards = ProfileShards()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from enrichment import iter_user_texts
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help=".json or .jsonl files with user profiles")
+    parser.add_argument("--dir", default=PROFILE_DIR, help="profile directory")
+    parser.add_argument("--batch", type=int, default=1000, help="profiles written per index update")
+    parser.add_argument("--columnar", action="store_true", help="store transactions as memory-mapped .npy columns")
+    args = parser.parse_args(argv)
+
+    store = ProfileShards(args.dir)
+    batch: List[Dict[str, Any]] = []
+    users = 0
+    for text in iter_user_texts(args.inputs):
+        data = json.loads(text)
+        batch.extend(data if isinstance(data, list) else [data])
+        if len(batch) >= args.batch:
+            users += len(store.put_many(batch, args.columnar))
+            batch = []
+    if batch:
+        users += len(store.put_many(batch, args.columnar))
+    print(f"✅ {users} profiles -> {args.dir} ({len(store)} users in the index)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
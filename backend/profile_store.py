@@ -0,0 +1,169 @@
+import asyncio
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from columnar import META_NAME, is_columnar, load_profile
+from json_codec import loads
+from llm_scheduler import request_user
+from metrics import span
+
+# Requests without a user_id are served for the demo user
+DEFAULT_USER_ID = "user_00001"
+
+# User ids become file names, so only a safe subset is accepted
+USER_ID_RE = re.compile(r"[A-Za-z0-9_.\-]{1,64}")
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "256"))
+
+
+class UnknownUserError(KeyError):
+    """No profile is stored for this user id."""
+
+
+def validate_user_id(user_id: str) -> str:
+    if not isinstance(user_id, str) or not USER_ID_RE.fullmatch(user_id) or user_id.strip(".") == "":
+        raise ValueError(f"Invalid user_id: {user_id!r}")
+    return user_id
+
+
+async def user_id_from_request(request) -> str:
+    """
+    `user_id` from the query string or the JSON body, else the demo user; raises ValueError if malformed.
+    Also marks the request's upstream LLM calls as this user's (fair scheduling).
+    """
+    user_id = request.query_params.get("user_id")
+    if user_id is None and request.method != "GET":
+        try:
+            body = await request.json()
+        except ValueError:
+            body = None
+        if isinstance(body, dict):
+            user_id = body.get("user_id")
+    user_id = validate_user_id(user_id) if user_id is not None else DEFAULT_USER_ID
+    request_user.set(user_id)
+    return user_id
+
+
+class ProfileEntry(NamedTuple):
+    """A parsed profile together with the file version it was parsed from."""
+    user_id: str
+    path: str
+    version: Tuple[int, int]  # (mtime_ns, size)
+    data: Dict[str, Any]  # without the transaction lists for columnar (.cols) profiles
+
+
+class ProfileStore:
+    """
+    Profile repository keyed by user_id.
+
+    Each file is parsed once and kept in a bounded LRU; a cached profile is
+    reused until the file's mtime or size changes. Parsing runs in a worker
+    thread so the event loop is never blocked by the JSON parser.
+
+    Cached dicts are shared between requests and must not be mutated.
+    """
+
+    def __init__(self, name: str, resolve_path: Callable[[str], str], max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.name = name
+        self.resolve_path = resolve_path
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, ProfileEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+        stores[name] = self
+
+    @staticmethod
+    def _file_version(path: str) -> Tuple[int, int]:
+        # A columnar profile (directory) is versioned by its meta.json, written last
+        st = os.stat(os.path.join(path, META_NAME) if is_columnar(path) else path)
+        return st.st_mtime_ns, st.st_size
+
+    def _cached(self, user_id: str, version: Tuple[int, int]) -> Optional[ProfileEntry]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry
+            return None
+
+    def _parse(self, user_id: str, path: str, version: Tuple[int, int]) -> ProfileEntry:
+        with span("profile_load"):
+            if is_columnar(path):
+                # Transactions stay on disk; analytics memory-maps the columns it needs
+                data = load_profile(path)
+            else:
+                with open(path, "rb") as f:
+                    data = loads(f.read())
+        entry = ProfileEntry(user_id, path, version, data)
+        with self._lock:
+            self.misses += 1
+            if user_id in self._entries:
+                self.reloads += 1
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def load_entry(self, user_id: str) -> ProfileEntry:
+        """Synchronous lookup; raises FileNotFoundError / json.JSONDecodeError."""
+        path = self.resolve_path(user_id)
+        version = self._file_version(path)
+        return self._cached(user_id, version) or self._parse(user_id, path, version)
+
+    async def get_entry(self, user_id: str) -> ProfileEntry:
+        """Cache hits are answered on the loop (one stat call); misses parse in a thread."""
+        path = self.resolve_path(user_id)
+        version = self._file_version(path)
+        entry = self._cached(user_id, version)
+        if entry is not None:
+            return entry
+        return await asyncio.to_thread(self._parse, user_id, path, version)
+
+    async def get(self, user_id: str) -> Dict[str, Any]:
+        return (await self.get_entry(user_id)).data
+
+    def put(self, entry: ProfileEntry) -> None:
+        """Cache a profile this process has just written, so the next lookup skips parsing it."""
+        with self._lock:
+            self._entries[entry.user_id] = entry
+            self._entries.move_to_end(entry.user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# All stores by name, for the /stats endpoint
+stores: Dict[str, ProfileStore] = {}
+
+
+def all_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: store.stats() for name, store in stores.items()}
@@ -0,0 +1,179 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from analytics import UNDERUSED_USAGE_COUNT, AnalyticsIndex, index_for
+from metrics import span
+from profile_store import ProfileEntry
+from shared_cache import SHARED_STATE_DIR, SharedTextCache, shared_path
+
+TOP_CATEGORIES = 6
+TOP_MERCHANTS = 8
+
+MAX_CACHED_CONTEXTS = 512
+
+
+def _top(values: np.ndarray, names: List[str], limit: int) -> Dict[str, int]:
+    """Largest positive entries of `values` as {name: rounded value}."""
+    order = np.argsort(-values, kind="stable")[:limit]
+    return {names[i]: int(round(values[i])) for i in order if values[i] > 0}
+
+
+def build_context(user_data: Dict[str, Any], index: Optional[AnalyticsIndex] = None) -> Dict[str, Any]:
+    """
+    Compact financial summary of a profile: per-month totals, top categories
+    and merchants, subscriptions, spontaneous-purchase share and goal progress.
+    Transaction aggregates are read from the profile's analytics index.
+    """
+    index = index if index is not None else AnalyticsIndex(user_data)
+    months = [m for m in index.month_order() if index.months.names[m]]
+    period_spend = index.period_spend()
+    periods = [p for p in range(len(index.periods)) if period_spend[p] > 0]
+
+    category_summary = user_data.get("category_summary")
+    if category_summary:
+        names = list(category_summary)
+        categories = -np.array([float(category_summary[name]) for name in names])
+    else:
+        names = index.categories.names
+        categories = index.period_category_spend.sum(axis=0)
+
+    subscriptions = user_data.get("subscriptions", [])
+    subs = [
+        {
+            "name": s.get("name"),
+            "cost": s.get("cost"),
+            "uses": s.get("usage_count", len(s.get("usage_timestamps", []))),
+            "last_used": s.get("last_used"),
+            "underused": bool(
+                s.get("not_used_in_last_90_days")
+                or s.get("usage_count", len(s.get("usage_timestamps", []))) < UNDERUSED_USAGE_COUNT
+            ),
+        }
+        for s in subscriptions
+    ]
+
+    goal = user_data.get("goal", {})
+    accounts = user_data.get("accounts", {})
+
+    return {
+        "profile": {
+            "age": user_data.get("age"),
+            "employment_status": user_data.get("employment_status"),
+            "monthly_income": user_data.get("monthly_income"),
+            "balances": {name: acc.get("balance") for name, acc in accounts.items()},
+        },
+        "months": {
+            index.months.names[m]: {
+                "income": int(round(index.month_income[m])),
+                "spending": int(round(index.month_spend[m])),
+                "count": int(index.month_count[m]),
+                "net": int(round(index.month_income[m] - index.month_spend[m])),
+            }
+            for m in months
+        },
+        "period_totals": {index.periods.names[p]: int(round(period_spend[p])) for p in periods},
+        "top_categories_by_period": {
+            index.periods.names[p]: _top(index.period_category_spend[p], index.categories.names, 3)
+            for p in periods
+        },
+        "top_categories": _top(categories, names, TOP_CATEGORIES),
+        "top_merchants": {
+            name: {"spent": int(round(spent)), "count": count}
+            for name, spent, count in index.top_merchants(TOP_MERCHANTS)
+        },
+        "subscriptions": subs,
+        "subscriptions_monthly_cost": int(np.sum([s.get("cost", 0) for s in subscriptions])),
+        "spontaneous": index.spontaneous_shares(),
+        "goal": {
+            "target": goal.get("target_amount"),
+            "current": goal.get("current_amount"),
+            "progress_percent": goal.get("progress_percent"),
+            "monthly_update": [
+                {"month": m.get("month"), "saved": int(round(m.get("saved", 0)))}
+                for m in user_data.get("goal_progress", {}).get("monthly_update", [])
+            ],
+        },
+    }
+
+
+def _line(label: str, items: Dict[str, Any]) -> str:
+    return f"{label}: " + "; ".join(f"{k} {v}" for k, v in items.items())
+
+
+def render_context(ctx: Dict[str, Any]) -> str:
+    """Render the summary as short plain-text lines for the prompt."""
+    p = ctx["profile"]
+    lines: List[str] = [
+        f"Profile: age {p['age']}, {p['employment_status']}, monthly income {p['monthly_income']}, "
+        + ", ".join(f"{name} {balance}" for name, balance in p["balances"].items()),
+        "Months (income/spending/net/tx): " + "; ".join(
+            f"{m} {v['income']}/{v['spending']}/{v['net']}/{v['count']}" for m, v in ctx["months"].items()
+        ),
+        _line("Spending by period", ctx["period_totals"]),
+    ]
+    for period, cats in ctx["top_categories_by_period"].items():
+        lines.append(_line(f"Top categories {period}", cats))
+    lines.append(_line("Top categories overall", ctx["top_categories"]))
+    lines.append("Top merchants (spent/count): " + "; ".join(
+        f"{name} {v['spent']}/{v['count']}" for name, v in ctx["top_merchants"].items()
+    ))
+    lines.append(f"Subscriptions (total {ctx['subscriptions_monthly_cost']}/month): " + "; ".join(
+        f"{s['name']} {s['cost']}, {s['uses']} uses, last {s['last_used']}" + (", UNDERUSED" if s["underused"] else "")
+        for s in ctx["subscriptions"]
+    ))
+    spont = ctx["spontaneous"]
+    if spont:
+        lines.append(
+            f"Spontaneous purchases: {spont['count_share']:.0%} of expenses, {spont['amount_share']:.0%} of spending; by period "
+            + ", ".join(f"{k} {v:.0%}" for k, v in spont["amount_share_by_period"].items())
+        )
+    g = ctx["goal"]
+    lines.append(
+        f"Goal: {g['current']} of {g['target']} ({g['progress_percent']}%); saved per month "
+        + ", ".join(f"{m['month']} {m['saved']}" for m in g["monthly_update"])
+    )
+    return "\n".join(lines)
+
+
+_cache: "OrderedDict[Tuple[str, str, Tuple[int, int]], str]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+# Second tier shared by the workers of server.py (SHARED_STATE_DIR)
+shared_contexts = SharedTextCache(shared_path("contexts.sqlite")) if SHARED_STATE_DIR else None
+
+
+def context_for(entry: ProfileEntry) -> str:
+    """Rendered summary for a profile version, built once per (user, file version)."""
+    key = (entry.user_id, entry.path, entry.version)
+    with _cache_lock:
+        text = _cache.get(key)
+        if text is not None:
+            _cache.move_to_end(key)
+            return text
+    shared_key = f"{entry.user_id}|{entry.path}|{entry.version[0]}|{entry.version[1]}"
+    text = shared_contexts.get(shared_key) if shared_contexts is not None else None
+    if text is None:
+        index = index_for(entry)
+        with span("prompt_context"):
+            text = render_context(build_context(entry.data, index))
+        if shared_contexts is not None:
+            shared_contexts.set(shared_key, text)
+    with _cache_lock:
+        _cache[key] = text
+        while len(_cache) > MAX_CACHED_CONTEXTS:
+            _cache.popitem(last=False)
+    return text
+
+
+async def get_prompt_context(entry: ProfileEntry) -> str:
+    """Async wrapper: cache misses are built in a worker thread."""
+    key = (entry.user_id, entry.path, entry.version)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    return await asyncio.to_thread(context_for, entry)
@@ -0,0 +1,171 @@
+"""
+Prompt assembly for the NPC chats.
+
+Sections are laid out from the most to the least stable, so consecutive
+requests share the longest possible prefix and the provider's prompt cache
+(OpenAI caches prefixes of 1024+ tokens) can apply:
+
+    system    NPC instructions             } first system message: identical
+    catalog   product list (reference)     } for every request of the NPC
+    profile   per-user summary and figures   system message, same per profile version
+    history   conversation summary + turns   grows within a session
+    context   retrieved rows / FAQ notes   } final user message, per question
+    query     the player's message         }
+
+Each NPC has a hard prompt budget: the model's context window minus the
+reply's max_tokens and a safety margin (token counts here are estimates).
+PROMPT_TOKEN_BUDGET (PROMPT_TOKEN_BUDGET_<NPC> per NPC) sets a smaller budget
+explicitly. Over budget, sections are cut in CUT_ORDER: history loses its oldest
+messages first, text sections are shortened from the end, the query goes last.
+
+Token counts per section (after the cut) are observed into the
+npc_prompt_section_tokens histogram and averaged per NPC in /stats.
+"""
+import os
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from llm_client import LLM_MODEL
+from metrics import PROMPT_SECTION_TOKENS
+from tokens import count_tokens, truncate_to_tokens
+
+SECTIONS = ("system", "catalog", "profile", "history", "context", "query")
+# Lowest priority first
+CUT_ORDER = ("history", "context", "profile", "catalog", "system", "query")
+
+# Context windows by model name (dated variants such as gpt-4o-mini-2024-07-18 match by prefix);
+# LLM_CONTEXT_WINDOWS adds or overrides entries: "model=tokens,model=tokens"
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o-mini": 128000,
+    "gpt-4o": 128000,
+    "gpt-4.1": 1047576,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+}
+for _item in filter(None, os.getenv("LLM_CONTEXT_WINDOWS", "").split(",")):
+    _model, _tokens = _item.rsplit("=", 1)
+    MODEL_CONTEXT_WINDOWS[_model.strip()] = int(_tokens)
+# Window of models missing from the table
+DEFAULT_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", "128000"))
+# Tokens kept free besides the reply: counts are estimates when tiktoken is missing
+SAFETY_MARGIN_TOKENS = int(os.getenv("PROMPT_SAFETY_MARGIN_TOKENS", "1024"))
+# Explicit budget for every NPC (unset: derived from the context window)
+PROMPT_TOKEN_BUDGET = os.getenv("PROMPT_TOKEN_BUDGET")
+# Chat-format tokens around each message (role, separators)
+MESSAGE_TOKENS = 4
+
+
+class Prompt(NamedTuple):
+    messages: List[Dict[str, str]]
+    tokens: Dict[str, int]  # per section, after budgeting
+    cut: Dict[str, int]  # tokens removed per section
+    budget: int
+
+    @property
+    def total(self) -> int:
+        return sum(self.tokens.values()) + MESSAGE_TOKENS * len(self.messages)
+
+
+def _join(*parts: str) -> str:
+    return "\n\n".join(part.strip() for part in parts if part and part.strip())
+
+
+def context_window(model: str) -> int:
+    """Context window of `model`: exact name, else the longest known prefix, else DEFAULT_CONTEXT_TOKENS."""
+    if model in MODEL_CONTEXT_WINDOWS:
+        return MODEL_CONTEXT_WINDOWS[model]
+    prefixes = [name for name in MODEL_CONTEXT_WINDOWS if model.startswith(name)]
+    return MODEL_CONTEXT_WINDOWS[max(prefixes, key=len)] if prefixes else DEFAULT_CONTEXT_TOKENS
+
+
+class PromptLayout:
+    """Messages of one NPC: static system + catalog text, then per-request sections within a token budget."""
+
+    def __init__(self, npc: str, system: str, catalog: str = "", max_tokens: int = 1000,
+                 cut_order: Sequence[str] = CUT_ORDER, model: str = LLM_MODEL, budget: Optional[int] = None):
+        self.npc = npc
+        self.system = system.strip()
+        self.catalog = catalog.strip()
+        self.max_tokens = max_tokens
+        self.cut_order = tuple(cut_order)
+        self.model = model
+        self.context_window = context_window(model)
+        # What fits next to the reply; an explicit budget can only lower it
+        fits = max(0, self.context_window - max_tokens - SAFETY_MARGIN_TOKENS)
+        if budget is None:
+            budget = os.getenv(f"PROMPT_TOKEN_BUDGET_{npc.upper()}", PROMPT_TOKEN_BUDGET)
+        self.budget = fits if budget is None else max(0, min(int(budget), fits))
+        # Counted once: the static prefix never changes
+        self._static_tokens = {"system": count_tokens(self.system), "catalog": count_tokens(self.catalog)}
+        self.requests = 0
+        self.over_budget = 0
+        self.section_totals = dict.fromkeys(SECTIONS, 0)
+        self.cut_totals = dict.fromkeys(SECTIONS, 0)
+        layouts[npc] = self
+
+    def build(self, query: str, profile: str = "", history: Sequence[Dict[str, str]] = (), context: str = "") -> Prompt:
+        """Messages for one request, cut to the budget; records the per-section token counts."""
+        texts = {"system": self.system, "catalog": self.catalog, "profile": profile.strip(),
+                 "context": context.strip(), "query": query.strip()}
+        tokens = {**self._static_tokens, **{name: count_tokens(texts[name]) for name in ("profile", "context", "query")}}
+        history = list(history)
+        history_tokens = [count_tokens(m.get("content") or "") + MESSAGE_TOKENS for m in history]
+        tokens["history"] = sum(history_tokens)
+        cut = dict.fromkeys(SECTIONS, 0)
+
+        # system + catalog, profile and the final user message are one message each
+        excess = sum(tokens.values()) + MESSAGE_TOKENS * (2 + bool(texts["profile"])) - self.budget
+        if excess > 0:
+            self.over_budget += 1
+        for name in self.cut_order:
+            if excess <= 0:
+                break
+            if name == "history":
+                while history and excess > 0:
+                    history.pop(0)
+                    dropped = history_tokens.pop(0)
+                    cut["history"] += dropped
+                    excess -= dropped
+                tokens["history"] = sum(history_tokens)
+                continue
+            if not tokens[name]:
+                continue
+            shortened = truncate_to_tokens(texts[name], max(0, tokens[name] - excess))
+            kept = count_tokens(shortened)
+            cut[name] = tokens[name] - kept
+            excess -= cut[name]
+            texts[name], tokens[name] = shortened, kept
+
+        messages = [{"role": "system", "content": _join(texts["system"], texts["catalog"])}]
+        if texts["profile"]:
+            messages.append({"role": "system", "content": texts["profile"]})
+        messages.extend(history)
+        messages.append({"role": "user", "content": _join(texts["context"], texts["query"])})
+
+        self.requests += 1
+        for name in SECTIONS:
+            PROMPT_SECTION_TOKENS.observe(tokens[name], self.npc, name)
+            self.section_totals[name] += tokens[name]
+            self.cut_totals[name] += cut[name]
+        return Prompt(messages, tokens, cut, self.budget)
+
+    def stats(self) -> Dict[str, object]:
+        requests = self.requests or 1
+        return {
+            "model": self.model,
+            "context_window": self.context_window,
+            "budget": self.budget,
+            "static_prefix_tokens": sum(self._static_tokens.values()),
+            "requests": self.requests,
+            "over_budget": self.over_budget,
+            "avg_tokens": {name: round(total / requests, 1) for name, total in self.section_totals.items()},
+            "cut_tokens": {name: total for name, total in self.cut_totals.items() if total},
+        }
+
+
+# All layouts by NPC, for the /stats endpoint
+layouts: Dict[str, PromptLayout] = {}
+
+
+def all_stats() -> Dict[str, Dict[str, object]]:
+    return {npc: layout.stats() for npc, layout in layouts.items()}
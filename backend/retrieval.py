@@ -0,0 +1,361 @@
+"""
+Local retrieval for the NPC prompts: the transactions (and their totals) a
+question is about, and the FAQ entries relevant to a support question.
+Everything runs in-process with NumPy; nothing is downloaded or sent out.
+
+Documents are indexed twice:
+- an inverted index of whole words (word -> document ids) for exact hits
+  such as merchant names;
+- hashed TF-IDF vectors of words and character 3-grams (robust to typos and
+  Russian endings) stored as CSR arrays, so a query costs O(non-zeros).
+
+Transactions are indexed by merchant, category, subcategory, description and
+city; rows with the same text share one document, and dates are matched
+separately (month names in Russian or English, YYYY-MM). Russian words for the
+English vocabulary of the data are added to the query (QUERY_TERMS). The index
+of a profile is built once per file version, like analytics.index_for.
+"""
+import asyncio
+import os
+import re
+import threading
+import zlib
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from analytics import TRANSACTION_KEYS
+from columnar import ColumnarTransactions, is_columnar
+from faq import FAQ
+from intent_router import _features, detect_language, normalize
+from metrics import span
+from profile_store import ProfileEntry
+
+TEXT_FIELDS = ("merchant", "category", "category_name", "subcategory", "description", "city")
+
+# Hash buckets of the n-gram vectors (only buckets that occur are stored)
+HASH_DIM = int(os.getenv("RETRIEVAL_HASH_DIM", str(2 ** 18)))
+# Transactions listed in the analyst prompt; totals cover every match
+TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "12"))
+FAQ_TOP_K = int(os.getenv("RETRIEVAL_FAQ_TOP_K", "2"))
+MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.3"))
+FAQ_MIN_SCORE = float(os.getenv("RETRIEVAL_FAQ_MIN_SCORE", "0.25"))
+# Added to the similarity for each query word found verbatim in a document,
+# unless the word is in more than WORD_MAX_SHARE of the documents
+WORD_MATCH_BONUS = 0.25
+WORD_MAX_SHARE = 0.5
+
+# Most recent months listed in the per-month totals of a match
+MAX_MONTHS = 12
+
+MAX_CACHED_INDEXES = 512
+
+# Russian word stems -> English terms used in the transaction data
+QUERY_TERMS = {
+    "кофе": "coffee", "кофейн": "coffee", "кафе": "cafes", "ресторан": "restaurants", "фастфуд": "food",
+    "еда": "food", "еду": "food", "питани": "food", "продукт": "groceries supermarket", "супермаркет": "supermarket",
+    "перекус": "snacks", "снек": "snacks", "доставк": "food",
+    "такси": "taxi", "метро": "metro", "автобус": "bus", "транспорт": "transport", "бензин": "fuel", "топлив": "fuel",
+    "аптек": "pharmacy", "лекарств": "pharmacy", "врач": "doctor", "доктор": "doctor", "здоров": "health healthcare",
+    "медицин": "health healthcare", "спортзал": "gym", "фитнес": "gym", "зал": "gym",
+    "кино": "cinema movies", "фильм": "movies", "игр": "games", "развлечен": "entertainment", "музык": "music",
+    "стриминг": "streaming", "подписк": "subscriptions streaming",
+    "книг": "books", "курс": "courses", "обучени": "education courses", "образовани": "education", "учеб": "education",
+    "одежд": "clothes clothing", "электроник": "electronics", "покупк": "shopping", "шопинг": "shopping",
+    "маркетплейс": "online stores", "интернет": "internet", "связ": "mobile phone", "телефон": "phone mobile",
+    "мобильн": "mobile", "коммунал": "utilities bills", "счет": "bills", "вод": "water", "электричеств": "electricity",
+    "свет": "electricity", "зарплат": "salary payroll", "доход": "income salary", "перевод": "transfer",
+    "москв": "moscow", "петербург": "saint petersburg", "питер": "saint petersburg", "казан": "kazan",
+    "новосибирск": "novosibirsk", "екатеринбург": "yekaterinburg", "алмат": "almaty", "астан": "astana",
+}
+
+MONTH_PATTERNS = [
+    (1, r"январ\w*|jan|january"), (2, r"феврал\w*|feb|february"), (3, r"март\w*|mar|march"),
+    (4, r"апрел\w*|apr|april"), (5, r"ма[йяе]|in may|may 20\d\d"), (6, r"июн\w*|jun|june"),
+    (7, r"июл\w*|jul|july"), (8, r"август\w*|aug|august"), (9, r"сентябр\w*|sep|sept|september"),
+    (10, r"октябр\w*|oct|october"), (11, r"ноябр\w*|nov|november"), (12, r"декабр\w*|dec|december"),
+]
+_MONTH_RES = [(number, re.compile(rf"\b(?:{pattern})\b")) for number, pattern in MONTH_PATTERNS]
+_YEAR_MONTH_RE = re.compile(r"\b(20\d\d)[-./](0?[1-9]|1[0-2])\b|\b(0?[1-9]|1[0-2])[./](20\d\d)\b")
+_YEAR_RE = re.compile(r"\b(20\d\d)\b")
+
+
+def parse_period(query: str) -> Tuple[Set[int], Optional[int]]:
+    """Months of the year (1-12) named in the query, and the year if one is given."""
+    text = query.casefold()
+    months: Set[int] = set()
+    year = None
+    for match in _YEAR_MONTH_RE.finditer(text):
+        y, m = (match.group(1), match.group(2)) if match.group(1) else (match.group(4), match.group(3))
+        months.add(int(m))
+        year = int(y)
+    months.update(number for number, pattern in _MONTH_RES if pattern.search(text))
+    if year is None:
+        match = _YEAR_RE.search(text)
+        year = int(match.group(1)) if match else None
+    return months, year
+
+
+def expand_query(query: str) -> str:
+    """Normalized query plus the English data terms of its Russian words."""
+    text = normalize(query)
+    extra = [terms for word in text.split() for stem, terms in QUERY_TERMS.items() if word.startswith(stem)]
+    return " ".join([text, *extra])
+
+
+def _bucket(feature: str, dim: int) -> int:
+    # crc32 rather than hash(): stable across processes and runs
+    return zlib.crc32(feature.encode("utf-8")) % dim
+
+
+def _buckets(text: str, dim: int) -> Counter:
+    buckets = Counter()
+    for feature, count in _features(text).items():
+        buckets[_bucket(feature, dim)] += count
+    return buckets
+
+
+class TextIndex:
+    """Inverted word index plus hashed word / character 3-gram TF-IDF vectors over short documents."""
+
+    def __init__(self, texts: Sequence[str], dim: int = HASH_DIM):
+        self.dim = dim
+        self.size = len(texts)
+        words: Dict[str, List[int]] = {}
+        buckets, counts, sizes = [], [], []
+        for doc, text in enumerate(texts):
+            text = normalize(text)
+            for word in set(text.split()):
+                words.setdefault(word, []).append(doc)
+            doc_buckets = _buckets(text, dim)
+            buckets.extend(doc_buckets)
+            counts.extend(doc_buckets.values())
+            sizes.append(len(doc_buckets))
+        self.words = {word: np.array(docs, dtype="int32") for word, docs in words.items()}
+
+        # CSR rows: doc_of[i] / column[i] / weight[i] per non-zero; columns index the occurring buckets
+        buckets = np.array(buckets, dtype="int64")
+        self.vocabulary, column = np.unique(buckets, return_inverse=True)
+        self.column = column.astype("int32")
+        self.doc_of = np.repeat(np.arange(self.size, dtype="int32"), sizes)
+        document_frequency = np.bincount(self.column, minlength=len(self.vocabulary))
+        self.idf = np.log((1 + self.size) / (1 + document_frequency)) + 1
+        weight = (1 + np.log(np.array(counts, dtype="float64"))) * self.idf[self.column]
+        norm = np.sqrt(np.bincount(self.doc_of, weight ** 2, self.size))
+        self.weight = (weight / np.where(norm == 0, 1.0, norm)[self.doc_of]).astype("float32")
+
+    def query_vector(self, text: str) -> np.ndarray:
+        """Normalized TF-IDF weights of `text` over the index's buckets (unknown buckets dropped)."""
+        vector = np.zeros(len(self.vocabulary))
+        buckets = _buckets(text, self.dim)
+        if not buckets or not len(self.vocabulary):
+            return vector
+        keys = np.fromiter(buckets, dtype="int64", count=len(buckets))
+        counts = np.fromiter(buckets.values(), dtype="float64", count=len(buckets))
+        position = np.minimum(np.searchsorted(self.vocabulary, keys), len(self.vocabulary) - 1)
+        known = self.vocabulary[position] == keys
+        vector[position[known]] = (1 + np.log(counts[known])) * self.idf[position[known]]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def scores(self, query: str) -> np.ndarray:
+        """Cosine similarity of every document to `query`, plus a bonus per exact word hit."""
+        text = normalize(query)
+        vector = self.query_vector(text)
+        scores = np.bincount(self.doc_of, self.weight * vector[self.column], self.size)
+        for word in set(text.split()):
+            docs = self.words.get(word)
+            if docs is not None and len(docs) <= WORD_MAX_SHARE * self.size:
+                scores[docs] += WORD_MATCH_BONUS
+        return scores
+
+
+class TransactionIndex:
+    """Transactions of one profile: a TextIndex over their distinct texts plus date and amount columns."""
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        """`columns`: date (datetime64[D]), amount and the TEXT_FIELDS object arrays, one entry per row."""
+        self.amount = np.asarray(columns["amount"], dtype="float64")
+        self.day = np.asarray(columns["date"], dtype="datetime64[D]")
+        self.month = self.day.astype("datetime64[M]")
+        months = self.month.astype("int64")
+        known = ~np.isnat(self.day)
+        self.year = np.where(known, months // 12 + 1970, 0)
+        self.month_of_year = np.where(known, months % 12 + 1, 0)
+        self.merchant = np.asarray(columns["merchant"], dtype=object)
+        self.merchant_names, merchant_code = np.unique([str(m or "?") for m in self.merchant], return_inverse=True)
+        self.merchant_code = merchant_code.astype("int32")
+        category = np.asarray(columns["category_name"], dtype=object)
+        self.category = np.where(category == None, columns["category"], category)  # noqa: E711
+        self.subcategory = np.asarray(columns["subcategory"], dtype=object)
+
+        # Rows with the same text share a document
+        documents: Dict[str, int] = {}
+        texts = (" ".join(str(v) for v in values if v) for values in zip(*(columns[f] for f in TEXT_FIELDS)))
+        self.document = np.array([documents.setdefault(text, len(documents)) for text in texts], dtype="int32")
+        self.text = TextIndex(list(documents))
+
+    @classmethod
+    def from_transactions(cls, transactions: Sequence[Dict[str, Any]]) -> "TransactionIndex":
+        columns = {field: np.array([tx.get(field) for tx in transactions], dtype=object) for field in TEXT_FIELDS}
+        columns["date"] = np.array([tx.get("date") for tx in transactions], dtype="datetime64[D]")
+        columns["amount"] = np.array([float(tx.get("amount") or 0) for tx in transactions], dtype="float64")
+        return cls(columns)
+
+    def __len__(self) -> int:
+        return len(self.amount)
+
+    def search(self, query: str, k: int = TOP_K, min_score: float = MIN_SCORE) -> Optional[Dict[str, Any]]:
+        """
+        Rows the query is about (best first, at most k) and totals over all of
+        them; None when it names neither anything in the texts nor a month.
+        Without a text match the period's largest expenses are listed.
+        """
+        months, year = parse_period(query)
+        in_period = np.ones(len(self), dtype=bool)
+        if months:
+            in_period &= np.isin(self.month_of_year, sorted(months))
+        if year is not None:
+            in_period &= self.year == year
+        document_scores = self.text.scores(expand_query(query))
+        relevant = document_scores >= min_score
+        if relevant.any():
+            score = document_scores[self.document]
+            matched = relevant[self.document] & in_period
+        elif months or year is not None:
+            score = np.clip(-self.amount, 0.0, None)
+            matched = in_period
+        else:
+            return None
+
+        rows = np.flatnonzero(matched)
+        order = np.lexsort((-self.day[rows].astype("int64"), -score[rows]))
+        amount = self.amount[rows]
+        spend = np.clip(-amount, 0.0, None)
+        # Totals per month (latest MAX_MONTHS) and per merchant, over the expenses only
+        expenses = rows[spend > 0]
+        labels, month_of = np.unique(self.month[expenses], return_inverse=True)
+        month_spend = np.bincount(month_of, spend[spend > 0], len(labels))
+        merchant_spend = np.bincount(self.merchant_code[expenses], spend[spend > 0], len(self.merchant_names))
+        top = np.argsort(-merchant_spend, kind="stable")[:3]
+        return {
+            "matched": len(rows),
+            "total": len(self),
+            "period": sorted(months),
+            "year": year,
+            "text_match": bool(relevant.any()),
+            "spent": round(float(spend.sum()), 2),
+            "income": round(float(np.clip(amount, 0.0, None).sum()), 2),
+            "expenses": int((spend > 0).sum()),
+            "by_month": {
+                "?" if np.isnat(m) else str(m): round(float(v), 2)
+                for m, v in zip(labels[-MAX_MONTHS:], month_spend[-MAX_MONTHS:])
+            },
+            "top_merchants": {
+                str(self.merchant_names[i]): round(float(merchant_spend[i]), 2) for i in top if merchant_spend[i] > 0
+            },
+            "rows": [self.row(i) for i in rows[order[:k]].tolist()],
+        }
+
+    def row(self, i: int) -> Dict[str, Any]:
+        return {
+            "date": None if np.isnat(self.day[i]) else str(self.day[i]),
+            "merchant": self.merchant[i],
+            "amount": float(self.amount[i]),
+            "category": self.category[i],
+            "subcategory": self.subcategory[i],
+        }
+
+
+def render_matches(found: Optional[Dict[str, Any]]) -> str:
+    """Short plain-text block for the prompt ('' when nothing was retrieved)."""
+    if not found:
+        return ""
+    year = found["year"]
+    period = ", ".join(f"{year}-{m:02d}" if year else f"month {m:02d}" for m in found["period"]) or (str(year) if year else "")
+    what = "matching the question" if found["text_match"] else "largest in the period"
+    lines = [
+        f"Transactions {what}" + (f" ({period})" if period else "")
+        + f": {found['matched']} of {found['total']}; spent {found['spent']:g} in {found['expenses']} expenses"
+        + (f", income {found['income']:g}" if found["income"] else ""),
+    ]
+    if found["by_month"]:
+        lines.append("By month: " + "; ".join(f"{m} {v:g}" for m, v in found["by_month"].items()))
+    if found["top_merchants"]:
+        lines.append("Top merchants: " + "; ".join(f"{m} {v:g}" for m, v in found["top_merchants"].items()))
+    for row in found["rows"]:
+        kind = " / ".join(str(v) for v in (row["category"], row["subcategory"]) if v)
+        lines.append(f"- {row['date']} {row['merchant'] or '?'} {row['amount']:g}" + (f" ({kind})" if kind else ""))
+    return "\n".join(lines)
+
+
+# === Per-profile cache ===
+
+_cache: "OrderedDict[Tuple[str, str, Tuple[int, int]], TransactionIndex]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def index_for(entry: ProfileEntry) -> TransactionIndex:
+    """Retrieval index for a profile version, built once per (user, file version)."""
+    key = (entry.user_id, entry.path, entry.version)
+    with _cache_lock:
+        index = _cache.get(key)
+        if index is not None:
+            _cache.move_to_end(key)
+            return index
+    with span("retrieval_index"):
+        if is_columnar(entry.path):
+            index = TransactionIndex(ColumnarTransactions(entry.path).retrieval_columns(TEXT_FIELDS))
+        else:
+            index = TransactionIndex.from_transactions(
+                [tx for period in TRANSACTION_KEYS for tx in entry.data.get(period) or []]
+            )
+    with _cache_lock:
+        index = _cache.setdefault(key, index)
+        while len(_cache) > MAX_CACHED_INDEXES:
+            _cache.popitem(last=False)
+    return index
+
+
+async def relevant_transactions(entry: ProfileEntry, query: str) -> str:
+    """Prompt block with the profile's transactions relevant to `query` ('' if none); builds the index in a thread."""
+    key = (entry.user_id, entry.path, entry.version)
+    with _cache_lock:
+        index = _cache.get(key)
+    if index is None:
+        index = await asyncio.to_thread(index_for, entry)
+    with span("retrieval_search"):
+        return render_matches(index.search(query))
+
+
+# === FAQ ===
+
+class FaqRetriever:
+    """TextIndex over the bilingual FAQ; returns the entries closest to a question."""
+
+    def __init__(self, entries: Sequence[Dict[str, Dict[str, str]]] = FAQ):
+        self.entries = list(entries)
+        # Questions are repeated so that they weigh more than the longer answers
+        self.text = TextIndex([
+            " ".join([*entry["question"].values(), *entry["question"].values(), *entry["answer"].values()])
+            for entry in self.entries
+        ])
+
+    def search(self, query: str, k: int = FAQ_TOP_K, min_score: float = FAQ_MIN_SCORE) -> List[int]:
+        scores = self.text.scores(query)
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [int(i) for i in order if scores[i] >= min_score]
+
+    def context(self, query: str) -> str:
+        """The relevant entries as 'Q: / A:' lines in the question's language ('' if none)."""
+        language = detect_language(query)
+        with span("retrieval_search"):
+            found = self.search(query)
+        return "\n".join(
+            f"Q: {self.entries[i]['question'][language]}\nA: {self.entries[i]['answer'][language]}" for i in found
+        )
+
+
+# Built once at import: the FAQ does not change while the server runs
+faq_retriever = FaqRetriever()
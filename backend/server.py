@@ -0,0 +1,183 @@
+"""
+Production launcher: N uvicorn workers forked from one preloaded process.
+
+The parent imports the app and loads everything read-only before forking:
+the spontaneous-purchase model, the product catalog and FAQ indexes, and up
+to --preload-profiles parsed profiles per NPC with their analytics, prompt
+context and retrieval indexes. `gc.freeze()` then moves these objects out of
+the garbage collector's reach, so the workers share their memory pages
+copy-on-write instead of each holding a copy. The workers accept connections
+on one listening socket; the parent restarts any worker that dies and stops
+them all on SIGINT / SIGTERM.
+
+State that changes at runtime goes through SHARED_STATE_DIR (default
+`shared_state`, see shared_cache.py): completions, prompt contexts and
+conversation turns in SQLite WAL files, per-file locks for /transactions and
+per-worker metrics files that /metrics sums. The LLM_* concurrency, queue and
+rate limits apply to the whole server: each worker enforces 1/N of them.
+
+    cd backend && python server.py --workers 4 --port 8000
+
+Without os.fork (Windows) or with --workers 1 it runs a single process like
+`uvicorn bank_config:app`.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from typing import Dict
+
+# Derived state worth building before the fork, per NPC profile store
+PRELOADED_STATE = {
+    "analyst": ("analytics", "prompt_context", "retrieval"),
+    "banker": ("analytics",),
+}
+
+
+def preload(max_profiles: int) -> Dict[str, int]:
+    """Load the model and parse up to `max_profiles` users per store (with their derived state) in this process."""
+    import analytics
+    import prompt_context
+    import retrieval
+    from profile_shards import shards
+    from profile_store import DEFAULT_USER_ID, UnknownUserError, stores
+    from spontaneous_scorer import scorer
+    from tree_model import load_predictor
+
+    builders = {
+        "analytics": analytics.index_for,
+        "prompt_context": prompt_context.context_for,
+        "retrieval": retrieval.index_for,
+    }
+    if scorer.predictor is None:
+        scorer.predictor = load_predictor(scorer.model_path, scorer.npz_path)
+
+    user_ids = list(dict.fromkeys([DEFAULT_USER_ID, *shards.user_ids()]))
+    loaded = {}
+    for name, store in stores.items():
+        count = 0
+        for user_id in user_ids[:min(max_profiles, store.max_entries)]:
+            try:
+                entry = store.load_entry(user_id)
+            except (UnknownUserError, FileNotFoundError, ValueError):
+                continue
+            for state in PRELOADED_STATE.get(name, ()):
+                builders[state](entry)
+            count += 1
+        loaded[name] = count
+    return loaded
+
+
+def listen(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def spawn(app, sock: socket.socket, args) -> int:
+    """Fork one worker serving `app` on `sock`; returns its pid in the parent."""
+    pid = os.fork()
+    if pid:
+        return pid
+    import uvicorn
+
+    # uvicorn installs its own handlers for a graceful shutdown
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    code = 0
+    try:
+        config = uvicorn.Config(app, host=args.host, port=args.port, log_level=args.log_level)
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def supervise(app, sock: socket.socket, args) -> None:
+    """Keep `args.workers` workers running until SIGINT / SIGTERM."""
+    workers = {spawn(app, sock, args): time.monotonic() for _ in range(args.workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    print(f"[server] {args.workers} workers on {args.host}:{args.port}: {', '.join(map(str, workers))}", flush=True)
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        print(f"[server] worker {pid} exited with status {status}, restarting", flush=True)
+        # Don't spin when a worker keeps dying at startup
+        if time.monotonic() - started < 1.0:
+            time.sleep(1.0)
+        workers[spawn(app, sock, args)] = time.monotonic()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--preload-profiles", type=int, default=int(os.getenv("PRELOAD_PROFILES", "256")),
+                        help="users parsed and indexed before forking, per NPC (0 = none)")
+    parser.add_argument("--shared-dir", default=os.getenv("SHARED_STATE_DIR", "shared_state"),
+                        help="directory of the caches shared by the workers")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    forking = args.workers > 1 and hasattr(os, "fork")
+    if forking:
+        # Read at import, so they must be set before the app is imported
+        os.environ["SHARED_STATE_DIR"] = args.shared_dir
+        os.environ["LLM_WORKER_PROCESSES"] = str(args.workers)
+
+    from bank_config import app
+
+    from metrics import worker_metrics
+
+    started = time.perf_counter()
+    loaded = preload(args.preload_profiles)
+    print(f"[server] preloaded {loaded} in {time.perf_counter() - started:.1f}s", flush=True)
+    if worker_metrics is not None:
+        # Preload timings are published once here, not inherited (and counted again) by every worker
+        worker_metrics.clear()
+        worker_metrics.hand_over()
+
+    if not forking:
+        import uvicorn
+        uvicorn.run(app, host=args.host, port=args.port, log_level=args.log_level)
+        return
+
+    sock = listen(args.host, args.port, args.backlog)
+    # Preloaded objects are never collected: the GC would otherwise write to (and so copy) their pages in every worker
+    gc.collect()
+    gc.freeze()
+    supervise(app, sock, args)
+    sock.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
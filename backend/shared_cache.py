@@ -0,0 +1,137 @@
+"""
+State shared by the worker processes of server.py (pre-fork mode).
+
+SHARED_STATE_DIR names a directory every worker can reach. When it is set:
+- completions are cached in <dir>/completions.sqlite (completion_cache.py,
+  unless LLM_CACHE_SQLITE_PATH points elsewhere);
+- rendered prompt contexts are cached in <dir>/contexts.sqlite keyed by the
+  profile file version, so a profile summarized by one worker is not
+  summarized again by the others (prompt_context.py);
+- writers of a profile file (ingestion.py) hold a per-file lock in <dir>/locks.
+
+The SQLite files run in WAL mode, so readers never wait for the writer.
+Connections are opened lazily in each process: objects created before the
+fork stay usable in every worker. Without SHARED_STATE_DIR (one process)
+nothing is written and the in-memory caches work as before.
+"""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Sequence
+
+# File locks need fcntl (POSIX); without it there is no fork either, so a single process needs none
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SHARED_STATE_DIR = os.getenv("SHARED_STATE_DIR", "")
+SHARED_CACHE_MAX_ENTRIES = int(os.getenv("SHARED_CACHE_MAX_ENTRIES", "100000"))
+# Trim the table to max_entries once per this many writes
+TRIM_EVERY = 256
+
+
+def shared_path(name: str) -> str:
+    """Path of `name` in SHARED_STATE_DIR ('' when the directory is not configured)."""
+    if not SHARED_STATE_DIR:
+        return ""
+    os.makedirs(SHARED_STATE_DIR, exist_ok=True)
+    return os.path.join(SHARED_STATE_DIR, name)
+
+
+class SQLiteConnection:
+    """
+    sqlite3 connection in WAL mode, opened on first use in each process (a
+    connection must not cross a fork); `schema` statements run on every open.
+    """
+
+    def __init__(self, path: str, schema: Sequence[str] = ()):
+        self.path = path
+        self.schema = list(schema)
+        self.lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def get(self) -> sqlite3.Connection:
+        """The connection of the calling process; call with `lock` held."""
+        if self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.schema:
+                conn.execute(statement)
+            conn.commit()
+            # The parent's connection (if any) is abandoned, not closed: closing it here could disturb the parent
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+
+class SharedTextCache:
+    """
+    Text values by key in a SQLite file shared by the workers. Keys must
+    change with their source (e.g. include the file version), so entries are
+    never invalidated, only trimmed oldest-written first.
+    """
+
+    def __init__(self, path: str, max_entries: int = SHARED_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.db = SQLiteConnection(path, [
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS entries_created ON entries(created)",
+        ])
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self.db.lock:
+            row = self.db.get().execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        with self.db.lock:
+            conn = self.db.get()
+            conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, julianday('now'))", (key, value))
+            self.writes += 1
+            if self.writes % TRIM_EVERY == 0:
+                conn.execute(
+                    "DELETE FROM entries WHERE key IN ("
+                    " SELECT key FROM entries ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+            conn.commit()
+
+    def __len__(self) -> int:
+        with self.db.lock:
+            return self.db.get().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.db.path, "entries": len(self), "hits": self.hits, "misses": self.misses, "writes": self.writes}
+
+
+@asynccontextmanager
+async def file_lock(path: str) -> AsyncIterator[None]:
+    """
+    Exclusive lock on `path` across the worker processes, waited for in a
+    thread; a no-op without SHARED_STATE_DIR or fcntl. The lock lives in a
+    separate file because writers replace `path` itself.
+    """
+    if not SHARED_STATE_DIR or fcntl is None:
+        yield
+        return
+    name = hashlib.blake2b(os.path.abspath(path).encode("utf-8"), digest_size=8).hexdigest()
+    lock_path = os.path.join(SHARED_STATE_DIR, "locks", f"{name}.lock")
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)  # releases the lock
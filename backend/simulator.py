@@ -0,0 +1,261 @@
+"""
+Affordability and what-if simulator for the banker NPC.
+
+Works on the user's monthly income, the spending of the three transaction
+periods (transactions1 / transactions2 / transactions3Current, one month each)
+and `goal`. For every eligible financing product it prices equal-installment
+(murabaha-style) schedules over the whole amount x term grid at once with
+NumPy, marks which combinations fit the user's cash flow, and projects when
+the savings goal is reached with and without the installment.
+"""
+import math
+import os
+from datetime import date
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from analytics import AnalyticsIndex
+from product_catalog import Product, ProductCatalog, catalog as default_catalog
+
+# Annual markup used to price financing (fixed at signing, never compounded);
+# the product's minimum markup in tenge still applies
+MARKUP_RATE = float(os.getenv("SIMULATION_MARKUP_RATE", "0.15"))
+# Installments above this share of monthly income are not affordable
+MAX_DEBT_TO_INCOME = float(os.getenv("SIMULATION_MAX_DTI", "0.5"))
+
+FINANCING_TYPE = "финансирование"
+INVESTMENT_TYPE = "инвестиционный"
+
+# Log-spaced amounts per product between its minimum and maximum
+AMOUNT_STEPS = 25
+# Unlimited maximum amounts are searched up to this multiple of the minimum
+UNLIMITED_AMOUNT_FACTOR = 1000
+# Goal projections stop after this many months
+HORIZON_MONTHS = 360
+# Months of cash flow returned in the projection
+PROJECTION_MONTHS = 12
+
+
+class CashFlow(NamedTuple):
+    income: float
+    expenses: float            # average monthly spending
+    expense_history: List[float]
+    free: float                # income - expenses
+    max_installment: float     # what a new installment may take each month
+    savings: float             # current goal amount
+    target: float
+    as_of: date
+
+
+def _as_of(user_data: Dict[str, Any]) -> date:
+    try:
+        return date.fromisoformat(str(user_data.get("last_update"))[:10])
+    except ValueError:
+        return date.today()
+
+
+def add_months(start: date, months: int) -> str:
+    """"YYYY-MM" of the month `months` after `start`."""
+    total = start.year * 12 + start.month - 1 + int(months)
+    return f"{total // 12:04d}-{total % 12 + 1:02d}"
+
+
+def cash_flow(user_data: Dict[str, Any], index: AnalyticsIndex) -> CashFlow:
+    """Monthly income, average spending over the transaction periods and the goal."""
+    period_spend = index.period_spend()
+    history = [float(s) for s in period_spend if s > 0]
+    expenses = float(np.mean(history)) if history else 0.0
+
+    income = float(user_data.get("monthly_income") or 0)
+    if not income:
+        received = index.month_income[index.month_income > 0]
+        income = float(received.mean()) if received.size else 0.0
+
+    free = income - expenses
+    goal = user_data.get("goal") or {}
+    return CashFlow(
+        income=income,
+        expenses=expenses,
+        expense_history=history,
+        free=free,
+        max_installment=max(0.0, min(free, MAX_DEBT_TO_INCOME * income)),
+        savings=float(goal.get("current_amount") or 0),
+        target=float(goal.get("target_amount") or 0),
+        as_of=_as_of(user_data),
+    )
+
+
+def installment_grid(product: Product, amounts: np.ndarray, terms: np.ndarray, rate: float = MARKUP_RATE):
+    """(markup, installment, total) for every amount (rows) x term (columns)."""
+    markup = np.maximum(product.markup or 0.0, amounts[:, None] * rate * terms[None, :] / 12)
+    total = amounts[:, None] + markup
+    return markup, total / terms[None, :], total
+
+
+def amount_grid(product: Product, extra: Optional[float] = None) -> np.ndarray:
+    high = product.max_amount if math.isfinite(product.max_amount) else product.min_amount * UNLIMITED_AMOUNT_FACTOR
+    amounts = np.geomspace(max(product.min_amount, 1.0), high, AMOUNT_STEPS).round(-3)
+    amounts[0], amounts[-1] = product.min_amount, high
+    if extra is not None:
+        amounts = np.append(amounts, extra)
+    return np.unique(amounts)
+
+
+def months_to_goal(savings: float, target: float, monthly: float, annual_return: float = 0.0) -> Optional[int]:
+    """First month in which the balance reaches `target` (None if not within HORIZON_MONTHS)."""
+    if savings >= target:
+        return 0
+    n = np.arange(1, HORIZON_MONTHS + 1)
+    r = annual_return / 12
+    growth = (1 + r) ** n
+    contributions = monthly * (growth - 1) / r if r else monthly * n
+    reached = np.flatnonzero(savings * growth + contributions >= target)
+    return int(n[reached[0]]) if reached.size else None
+
+
+def _goal(flow: CashFlow, monthly: float, annual_return: float = 0.0) -> Dict[str, Any]:
+    months = months_to_goal(flow.savings, flow.target, monthly, annual_return)
+    return {
+        "monthly_saving": round(monthly, 2),
+        "months": months,
+        "completion": add_months(flow.as_of, months) if months is not None else None,
+    }
+
+
+def _schedule(flow: CashFlow, total: float, term: int) -> List[Dict[str, Any]]:
+    """Remaining balance at the end of each year of an equal-installment schedule (and the last month)."""
+    months = np.unique(np.append(np.arange(12, term, 12), term))
+    remaining = total - total / term * months
+    return [
+        {"month": int(m), "date": add_months(flow.as_of, int(m)), "remaining": round(max(float(r), 0.0), 2)}
+        for m, r in zip(months, remaining)
+    ]
+
+
+def simulate_product(
+    product: Product,
+    flow: CashFlow,
+    amount: Optional[float] = None,
+    term_months: Optional[int] = None,
+    rate: float = MARKUP_RATE,
+) -> Dict[str, Any]:
+    """Price one financing product over its amount x term grid and pick a scenario."""
+    if amount is None:
+        # Default scenario: finance what is still missing for the goal
+        amount = flow.target - flow.savings if flow.target > flow.savings else product.min_amount
+    amount = float(min(max(amount, product.min_amount), product.max_amount))
+    amounts = amount_grid(product, amount)
+    terms = np.arange(product.min_term, product.max_term + 1)
+    markup, installment, total = installment_grid(product, amounts, terms, rate)
+    affordable = installment <= flow.max_installment
+
+    # Largest affordable amount for each term, and the term range where the scenario amount fits
+    best = np.where(affordable, amounts[:, None], -np.inf).max(axis=0)
+    row = int(np.searchsorted(amounts, amount))
+    fits = np.flatnonzero(affordable[row])
+    if term_months is None:
+        term_months = int(terms[fits[0]]) if fits.size else product.max_term
+    term_months = int(min(max(term_months, product.min_term), product.max_term))
+    col = term_months - product.min_term
+
+    payment = float(installment[row, col])
+    scenario = {
+        "amount": round(amount, 2),
+        "term_months": term_months,
+        "installment": round(payment, 2),
+        "markup": round(float(markup[row, col]), 2),
+        "total": round(float(total[row, col]), 2),
+        "debt_to_income": round(payment / flow.income, 3) if flow.income else None,
+        "affordable": bool(affordable[row, col]),
+        "free_cash_flow_after": round(flow.free - payment, 2),
+        "last_payment": add_months(flow.as_of, term_months),
+        "schedule": _schedule(flow, float(total[row, col]), term_months),
+        "goal": _goal(flow, flow.free - payment),
+    }
+    return {
+        "product": product.name,
+        "amount_range": [product.min_amount, product.max_amount if math.isfinite(product.max_amount) else None],
+        "term_range": [product.min_term, product.max_term],
+        "min_affordable_term": int(terms[fits[0]]) if fits.size else None,
+        "max_affordable_amount": float(best.max()) if np.isfinite(best).any() else None,
+        "max_affordable_amount_by_term": {
+            int(t): float(a) for t, a in zip(terms, best) if np.isfinite(a) and (t % 12 == 0 or t == terms[-1])
+        },
+        "scenario": scenario,
+    }
+
+
+def simulate(
+    user_data: Dict[str, Any],
+    index: AnalyticsIndex,
+    amount: Optional[float] = None,
+    term_months: Optional[int] = None,
+    product: Optional[str] = None,
+    catalog: ProductCatalog = default_catalog,
+) -> Dict[str, Any]:
+    """Cash flow, goal projections and financing scenarios for every eligible product."""
+    flow = cash_flow(user_data, index)
+    eligible = catalog.eligible(age=user_data.get("age"))
+    financing = [p for p in eligible if p.type == FINANCING_TYPE and (product is None or p.name == product)]
+    investments = [p for p in eligible if p.type == INVESTMENT_TYPE and p.expected_return is not None]
+
+    projection = flow.savings + flow.free * np.arange(1, PROJECTION_MONTHS + 1)
+    return {
+        "as_of": flow.as_of.isoformat(),
+        "assumptions": {"annual_markup_rate": MARKUP_RATE, "max_debt_to_income": MAX_DEBT_TO_INCOME},
+        "cash_flow": {
+            "monthly_income": round(flow.income, 2),
+            "average_expenses": round(flow.expenses, 2),
+            "expense_history": [round(s, 2) for s in flow.expense_history],
+            "free_cash_flow": round(flow.free, 2),
+            "max_installment": round(flow.max_installment, 2),
+            "projected_savings": [
+                {"month": add_months(flow.as_of, m + 1), "balance": round(float(b), 2)} for m, b in enumerate(projection)
+            ],
+        },
+        "goal": {
+            "target": flow.target,
+            "current": flow.savings,
+            "progress_percent": round(flow.savings / flow.target * 100, 2) if flow.target else None,
+            "remaining": round(max(flow.target - flow.savings, 0.0), 2),
+            "at_current_cash_flow": _goal(flow, flow.free),
+            "with_investment": {
+                p.name: _goal(flow, flow.free, p.expected_return / 100) for p in investments
+            },
+        },
+        "financing": [simulate_product(p, flow, amount, term_months) for p in financing],
+    }
+
+
+def _money(value: Optional[float]) -> str:
+    return f"{value:,.0f}" if value is not None else "n/a"
+
+
+def summary_text(result: Dict[str, Any]) -> str:
+    """Compact lines with the simulated figures for the banker prompt."""
+    flow, goal = result["cash_flow"], result["goal"]
+    current = goal["at_current_cash_flow"]
+    lines = [
+        f"Monthly income {_money(flow['monthly_income'])} tenge; average expenses {_money(flow['average_expenses'])} "
+        f"over {len(flow['expense_history'])} months; free cash flow {_money(flow['free_cash_flow'])}/month; "
+        f"a new installment can take at most {_money(flow['max_installment'])}/month "
+        f"({result['assumptions']['max_debt_to_income']:.0%} debt-to-income cap).",
+        f"Goal: {_money(goal['current'])} of {_money(goal['target'])} tenge ({goal['progress_percent']}%); "
+        + (f"reached in {current['months']} months ({current['completion']}) at the current cash flow."
+           if current["months"] is not None else "not reached at the current cash flow."),
+    ]
+    for name, projection in goal["with_investment"].items():
+        if projection["months"] is not None:
+            lines.append(f"With {name} at its best expected return the goal is reached by {projection['completion']}.")
+    for p in result["financing"]:
+        s = p["scenario"]
+        lines.append(
+            f"{p['product']}: {_money(s['amount'])} over {s['term_months']} months -> {_money(s['installment'])}/month "
+            f"(markup {_money(s['markup'])}, total {_money(s['total'])}"
+            + (f", debt-to-income {s['debt_to_income']:.0%}" if s["debt_to_income"] is not None else "")
+            + "), " + ("affordable" if s["affordable"] else "not affordable")
+            + f"; largest affordable amount {_money(p['max_affordable_amount'])}"
+            + (f", shortest affordable term {p['min_affordable_term']} months." if p["min_affordable_term"] else ".")
+        )
+    return "\n".join(lines)
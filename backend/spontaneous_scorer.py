@@ -0,0 +1,188 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from features import build_feature_matrix, extract_columns
+from metrics import MODEL_BATCH_ROWS, span
+from tree_model import MODEL_NPZ_PATH, MODEL_PATH, load_predictor
+
+# Micro-batching: requests arriving within MAX_WAIT seconds share one predict call
+MAX_BATCH_ROWS = int(os.getenv("SCORER_MAX_BATCH_ROWS", "4096"))
+MAX_WAIT = float(os.getenv("SCORER_MAX_WAIT_MS", "2")) / 1000
+INFERENCE_THREADS = int(os.getenv("SCORER_THREADS", "2"))
+
+ScoreResult = Tuple[List[bool], List[float]]
+
+
+class SpontaneousScorer:
+    """
+    Online spontaneous-purchase scoring with the model loaded once: the exported
+    NumPy forest when `npz_path` exists, otherwise the pickled bundle.
+
+    Concurrent requests are queued and merged into a single feature build and
+    predict_proba call per batch; inference runs in a thread pool so the event
+    loop stays free.
+    """
+
+    def __init__(
+        self,
+        model_path: str = MODEL_PATH,
+        npz_path: str = MODEL_NPZ_PATH,
+        max_batch_rows: int = MAX_BATCH_ROWS,
+        max_wait: float = MAX_WAIT,
+        threads: int = INFERENCE_THREADS,
+    ):
+        self.model_path = model_path
+        self.npz_path = npz_path
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait
+        self.threads = threads
+        self.predictor = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = set()
+        self.requests = 0
+        self.batches = 0
+        self.rows = 0
+
+    async def start(self) -> None:
+        """Load the model and start the batching loop (idempotent)."""
+        if self._task is not None:
+            return
+        if self.predictor is None:
+            self.predictor = await asyncio.to_thread(load_predictor, self.model_path, self.npz_path)
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="scorer")
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.threads)
+        self._task = asyncio.create_task(self._batch_loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._task = None
+        self._executor = None
+
+    async def score(self, transactions: List[Dict[str, Any]], monthly_income: float) -> ScoreResult:
+        """Predicted flags and probabilities of being spontaneous, in input order."""
+        if not transactions:
+            return [], []
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        self.requests += 1
+        await self._queue.put((transactions, monthly_income, future))
+        return await future
+
+    async def score_features(self, X: np.ndarray) -> ScoreResult:
+        """
+        Flags and probabilities for an already built feature matrix (columns in
+        `predictor.features` order), e.g. from features.FeatureState; skips the batching queue.
+        """
+        if not len(X):
+            return [], []
+        await self.start()
+        self.requests += 1
+        predicted, proba = await asyncio.get_running_loop().run_in_executor(self._executor, self._classify, X)
+        return predicted.tolist(), proba.round(4).tolist()
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            rows = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while rows < self.max_batch_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                rows += len(item[0])
+            await self._slots.acquire()
+            task = asyncio.create_task(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, batch) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            requests = [(transactions, income) for transactions, income, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self._predict, requests)
+            except Exception:
+                if len(batch) == 1:
+                    raise
+                # One bad request must not fail the others: score them one at a time
+                for request, (_, _, future) in zip(requests, batch):
+                    try:
+                        result = (await loop.run_in_executor(self._executor, self._predict, [request]))[0]
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                    else:
+                        if not future.done():
+                            future.set_result(result)
+                return
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
+
+    def _classify(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(spontaneous flags, probability of the positive class) per row."""
+        predictor = self.predictor
+        with span("model_predict"):
+            proba = predictor.predict_proba(X)
+        MODEL_BATCH_ROWS.observe(len(X))
+        positive = int(np.flatnonzero(predictor.classes_ == 1)[0])
+        # Same decision rule as model.predict: class with the highest probability
+        predicted = predictor.classes_[np.argmax(proba, axis=1)] == 1
+        self.batches += 1
+        self.rows += len(X)
+        return predicted, proba[:, positive]
+
+    def _predict(self, requests: List[Tuple[List[Dict[str, Any]], float]]) -> List[ScoreResult]:
+        with span("model_features"):
+            X = build_feature_matrix(extract_columns(requests), self.predictor.features)
+        predicted, proba = self._classify(X)
+
+        results = []
+        start = 0
+        for transactions, _ in requests:
+            end = start + len(transactions)
+            results.append((predicted[start:end].tolist(), proba[start:end].round(4).tolist()))
+            start = end
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.predictor is not None,
+            "backend": type(self.predictor).__name__ if self.predictor is not None else None,
+            "requests": self.requests,
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch_rows": round(self.rows / self.batches, 1) if self.batches else 0.0,
+        }
+
+
+# Shared instance, started by bank_config.app
+scorer = SpontaneousScorer()
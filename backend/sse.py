@@ -0,0 +1,126 @@
+import time
+import traceback
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Sequence, Union
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from completion_cache import completion_cache
+from json_codec import dumps_text
+from llm_client import extract_reply, llm_client
+from llm_scheduler import priority_for
+
+# Disable proxy buffering (ngrok / nginx) so chunks reach the game immediately
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_event(event: str, data: Dict[str, Any]) -> str:
+    """Serialize one Server-Sent Event."""
+    return f"event: {event}\ndata: {dumps_text(data)}\n\n"
+
+
+def wants_event_stream(request: Request) -> bool:
+    """
+    Streaming is the default for /stream endpoints. Clients that cannot read
+    an event stream ask for the buffered fallback with `?buffered=1` or by
+    accepting only application/json.
+    """
+    if request.query_params.get("buffered", "").lower() in ("1", "true", "yes"):
+        return False
+    accept = request.headers.get("accept", "")
+    return "text/event-stream" in accept or "application/json" not in accept
+
+
+async def _event_stream(
+    payload: Dict[str, Any],
+    reply_keys: Sequence[str],
+    cache: bool,
+    on_reply: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> AsyncIterator[str]:
+    if cache:
+        cached = await completion_cache.lookup(payload)
+        reply = extract_reply(cached) if cached else ""
+        if reply:
+            yield format_event("delta", {"text": reply})
+            yield format_event("done", {key: reply for key in reply_keys})
+            if on_reply:
+                await on_reply(reply)
+            return
+
+    parts = []
+    started = time.perf_counter()
+    try:
+        async for delta in llm_client.stream_completion(payload):
+            parts.append(delta)
+            yield format_event("delta", {"text": delta})
+    except HTTPException as he:
+        yield format_event("error", {"detail": he.detail})
+        return
+    except Exception as e:
+        traceback.print_exc()
+        yield format_event("error", {"detail": f"Internal server error: {str(e)}"})
+        return
+
+    reply = "".join(parts).strip()
+    if not reply:
+        yield format_event("error", {"detail": "Empty response from LLM."})
+        return
+    yield format_event("done", {key: reply for key in reply_keys})
+    if on_reply:
+        await on_reply(reply)
+    if cache:
+        response = {"choices": [{"message": {"role": "assistant", "content": reply}}]}
+        await completion_cache.store(payload, response, time.perf_counter() - started)
+
+
+async def stream_reply(
+    request: Request,
+    payload: Dict[str, Any],
+    reply_keys: Sequence[str] = ("reply",),
+    cache: bool = False,
+    on_reply: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> Union[StreamingResponse, Dict[str, str]]:
+    """
+    Answer an NPC request as an SSE stream of `delta` events followed by a
+    `done` event carrying the same JSON body as the non-streaming endpoint.
+    Falls back to a single buffered JSON response when the client cannot stream.
+    With cache=True answers go through the completion cache. `on_reply` gets
+    the full reply once it is complete and is awaited (e.g. to record the conversation turn).
+    """
+    if not wants_event_stream(request):
+        reply = extract_reply(await llm_client.chat_completion(payload, cache=cache))
+        if not reply:
+            raise HTTPException(status_code=500, detail="Empty response from LLM.")
+        if on_reply:
+            await on_reply(reply)
+        return {key: reply for key in reply_keys}
+
+    # Shed before the 200 and the event stream start, so the client gets a real 429
+    llm_client.scheduler.check_admission(priority_for(payload.get("max_tokens")))
+    return StreamingResponse(
+        _event_stream(payload, reply_keys, cache, on_reply),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+async def _local_event_stream(reply: str, reply_keys: Sequence[str]) -> AsyncIterator[str]:
+    yield format_event("delta", {"text": reply})
+    yield format_event("done", {key: reply for key in reply_keys})
+
+
+def local_reply(
+    request: Request,
+    reply: str,
+    reply_keys: Sequence[str] = ("reply",),
+) -> Union[StreamingResponse, Dict[str, str]]:
+    """Same response shapes as stream_reply for an answer produced without the LLM."""
+    if not wants_event_stream(request):
+        return {key: reply for key in reply_keys}
+    return StreamingResponse(
+        _local_event_stream(reply, reply_keys),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
@@ -0,0 +1,32 @@
+"""
+Shared fixtures. Tests import the backend modules directly and run from the
+backend directory, where the model and sample data live:
+
+    cd backend && python -m pytest -q
+"""
+import copy
+import json
+import os
+import sys
+import warnings
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+warnings.filterwarnings("ignore")
+
+import pytest  # noqa: E402
+
+SAMPLE_PATH = "user_full_banking_data.json"
+
+
+@pytest.fixture(scope="session")
+def _sample_user():
+    with open(SAMPLE_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def user(_sample_user):
+    """A private copy of the sample user (enrichment writes into it)."""
+    return copy.deepcopy(_sample_user)
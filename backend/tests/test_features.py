@@ -0,0 +1,101 @@
+"""Training (batch enrichment) and serving (per request, incremental) feature parity."""
+import numpy as np
+
+from enrichment import enrich_users, load_bundle, user_lists
+from features import (
+    FEATURES,
+    INPUT_FEATURES,
+    FeatureState,
+    build_feature_matrix,
+    compute_features,
+    extract_columns,
+    feature_columns,
+)
+from tree_model import MODEL_PATH
+
+# Depend on the whole list so far, not only on the row itself
+RUNNING_FEATURES = {"merchant_frequency", "category_frequency"}
+
+
+def _split(transactions, at=60):
+    """Stored history and newer appended rows of one list, as /transactions sees them."""
+    ordered = sorted(transactions, key=lambda tx: tx["date"])
+    return ordered[:at], ordered[at:]
+
+
+def _assert_columns_equal(actual, expected, names):
+    for name in names:
+        np.testing.assert_array_equal(actual[name], expected[name], err_msg=name)
+
+
+def test_features_are_deterministic(user):
+    lists = user_lists([user])
+    first = build_feature_matrix(extract_columns(lists))
+    second = build_feature_matrix(extract_columns(lists))
+    assert first.dtype == np.float32
+    assert first.shape == (sum(len(txs) for txs, _ in lists), len(FEATURES))
+    np.testing.assert_array_equal(first, second)
+
+
+def test_missing_hour_is_left_to_the_imputer(user):
+    transactions = [dict(tx, transaction_hour=None) for tx in user["transactions1"]]
+    computed = compute_features(extract_columns([(transactions, user["monthly_income"])]))
+    assert np.isnan(computed["transaction_hour"]).all()
+
+
+def test_features_do_not_depend_on_batching(user):
+    lists = user_lists([user])
+    together = compute_features(extract_columns(lists))
+    offset = 0
+    for transactions, income in lists:
+        alone = compute_features(extract_columns([(transactions, income)]))
+        rows = slice(offset, offset + len(transactions))
+        _assert_columns_equal({name: together[name][rows] for name in FEATURES}, alone, FEATURES)
+        offset += len(transactions)
+
+
+def test_incremental_rows_match_one_batch(user):
+    history, new = _split(user["transactions3Current"])
+    income = user["monthly_income"]
+
+    batch = FeatureState.from_transactions(history).append(new, income)
+    state = FeatureState.from_transactions(history)
+    single = [state.append([tx], income) for tx in new]
+    _assert_columns_equal(
+        {name: np.concatenate([columns[name] for columns in single]) for name in FEATURES}, batch, FEATURES,
+    )
+
+
+def test_incremental_rows_match_the_full_list(user):
+    history, new = _split(user["transactions3Current"])
+    income = user["monthly_income"]
+
+    incremental = FeatureState.from_transactions(history).append(new, income)
+    full = compute_features(extract_columns([(history + new, income)]))
+    tail = {name: full[name][len(history):] for name in FEATURES}
+    _assert_columns_equal(incremental, tail, [name for name in FEATURES if name not in RUNNING_FEATURES])
+
+    # Running counts reach the full-list totals on the last occurrence of each value
+    for name, key in (("merchant_frequency", "merchant"), ("category_frequency", "category")):
+        last = {tx[key]: i for i, tx in enumerate(new) if tx.get(key) is not None}
+        rows = sorted(last.values())
+        np.testing.assert_array_equal(incremental[name][rows], tail[name][rows], err_msg=name)
+
+
+def test_enrichment_stores_serving_features(user):
+    bundle = load_bundle(MODEL_PATH)
+    lists = user_lists([user])
+    amounts = [tx["amount"] for txs, _ in lists for tx in txs]
+    computed = compute_features(extract_columns(lists), bundle["features"])
+
+    enrich_users([user], bundle)
+
+    stored = [tx for txs, _ in user_lists([user]) for tx in txs]
+    # Input fields keep their original values and types
+    assert [tx["amount"] for tx in stored] == amounts
+    for name, values in feature_columns(computed, bundle["features"]).items():
+        assert [tx[name] for tx in stored] == values, name
+    # Persisted from the float64 columns, not from the float32 model input
+    assert not INPUT_FEATURES & set(feature_columns(computed, bundle["features"]))
+    normalized = [tx["amount_normalized"] for tx in stored]
+    assert normalized == computed["amount_normalized"].tolist()
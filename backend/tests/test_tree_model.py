@@ -0,0 +1,73 @@
+"""The exported NumPy forest against the pickled scikit-learn bundle."""
+import shutil
+
+import numpy as np
+import pytest
+
+from enrichment import enrich_users, load_bundle, user_lists
+from features import build_feature_matrix, extract_columns
+from tree_model import (
+    MODEL_NPZ_PATH,
+    MODEL_PATH,
+    PREDICT_CHUNK_ROWS,
+    BundlePredictor,
+    TreePredictor,
+    export,
+    load_predictor,
+)
+
+
+@pytest.fixture(scope="module")
+def bundle():
+    return load_bundle(MODEL_PATH)
+
+
+@pytest.fixture
+def X(user, bundle):
+    """Sample rows plus copies with every feature missing in turn (imputed values)."""
+    X = build_feature_matrix(extract_columns(user_lists([user])), bundle["features"])
+    holes = X[:len(bundle["features"])].copy()
+    holes[np.diag_indices(len(holes))] = np.nan
+    return np.vstack([X, holes])
+
+
+def test_probabilities_match_the_pickle(X, bundle):
+    numpy_proba = TreePredictor.load(MODEL_NPZ_PATH).predict_proba(X)
+    np.testing.assert_array_equal(numpy_proba, BundlePredictor(bundle).predict_proba(X))
+
+
+def test_chunking_does_not_change_probabilities(X):
+    predictor = TreePredictor.load(MODEL_NPZ_PATH)
+    assert len(X) > PREDICT_CHUNK_ROWS
+    rows = [predictor.predict_proba(X[i:i + 1]) for i in range(len(X))]
+    np.testing.assert_array_equal(np.vstack(rows), predictor.predict_proba(X))
+
+
+def test_labels_match_enrichment(user, bundle):
+    X = build_feature_matrix(extract_columns(user_lists([user])), bundle["features"])
+    predicted = TreePredictor.load(MODEL_NPZ_PATH).predict(X).astype(bool).tolist()
+    enrich_users([user], bundle, with_features=False)
+    assert predicted == [tx["is_spontanius_predicted"] for txs, _ in user_lists([user]) for tx in txs]
+
+
+def test_fresh_export_matches_the_shipped_one(tmp_path, bundle):
+    path = str(tmp_path / "model.npz")
+    export(bundle, path, source_path=MODEL_PATH)
+    shipped = np.load(MODEL_NPZ_PATH, allow_pickle=False)
+    fresh = np.load(path, allow_pickle=False)
+    assert sorted(fresh.files) == sorted(shipped.files)
+    for name in fresh.files:
+        np.testing.assert_array_equal(fresh[name], shipped[name], err_msg=name)
+
+
+def test_load_predictor_uses_the_export_of_the_same_pickle(tmp_path, bundle):
+    model_path, npz_path = str(tmp_path / "model.pkl"), str(tmp_path / "model.npz")
+    shutil.copyfile(MODEL_PATH, model_path)
+    export(bundle, npz_path, source_path=model_path)
+    assert isinstance(load_predictor(model_path, npz_path), TreePredictor)
+
+    # A retrained pickle must not be scored with the stale export
+    with open(model_path, "ab") as f:
+        f.write(b"\n")
+    assert isinstance(load_predictor(model_path, npz_path), BundlePredictor)
+    assert isinstance(load_predictor(model_path, str(tmp_path / "missing.npz")), BundlePredictor)
@@ -0,0 +1,95 @@
+"""Malformed transactions are rejected up front (400), before scoring or enrichment."""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from features import validate_transaction
+from ingestion import IngestionError, normalize_transactions
+
+VALID = {"date": "2025-12-05", "amount": -1200.0, "merchant": "Steam", "category": "Games", "mcc": 5816}
+
+INVALID = [
+    ("not a row", "must be an object"),
+    ({**VALID, "date": None}, "Invalid date"),
+    ({**VALID, "date": "05.12.2025"}, "Invalid date"),
+    ({**VALID, "date": "2025-02-30"}, "Invalid date"),
+    ({**VALID, "amount": "1200"}, "Invalid amount"),
+    ({**VALID, "amount": True}, "Invalid amount"),
+    ({**VALID, "amount": float("nan")}, "Invalid amount"),
+    ({**VALID, "mcc": "5816"}, "Invalid mcc"),
+    ({**VALID, "transaction_hour": [12]}, "Invalid transaction_hour"),
+    ({**VALID, "merchant": ["Steam"]}, "Invalid merchant"),
+    ({**VALID, "category": {"name": "Games"}}, "Invalid category"),
+]
+
+
+@pytest.mark.parametrize("tx", [
+    VALID,
+    {**VALID, "date": "2025-12-05T18:30:00"},
+    {**VALID, "merchant": None, "category": None, "mcc": None},
+    {"date": "2025-12-05", "amount": 0},
+])
+def test_valid_transaction(tx):
+    validate_transaction(tx)
+
+
+@pytest.mark.parametrize("tx, message", INVALID)
+def test_invalid_transaction(tx, message):
+    with pytest.raises(ValueError, match=message):
+        validate_transaction(tx)
+
+
+@pytest.mark.parametrize("tx, message", INVALID[2:] + [
+    ({**VALID, "category_name": 7}, "Invalid category_name"),
+    ({**VALID, "subcategory": ["Steam"]}, "Invalid subcategory"),
+])
+def test_ingestion_rejects_the_whole_batch(tx, message):
+    current = [{"date": "2025-12-04", "amount": -10.0, "balance_after": 1000.0}]
+    with pytest.raises(IngestionError, match=message) as error:
+        normalize_transactions([VALID, tx], current, {})
+    assert error.value.status_code == 400
+
+
+def test_ingestion_fills_defaults():
+    current = [{"date": "2025-12-04", "amount": -10.0, "balance_after": 1000.0}]
+    rows = normalize_transactions([{**VALID, "category": None, "category_name": "Games"}], current, {})
+    assert rows[0]["type"] == "expense"
+    assert rows[0]["category"] == "Games"
+    assert rows[0]["balance_after"] == -200.0
+
+
+def _post(path, body):
+    """Status and JSON body of one request to the app, lifespan included."""
+    from bank_config import app
+
+    async def post():
+        async with app.router.lifespan_context(app), httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test",
+        ) as client:
+            # json.dumps writes NaN, which httpx's encoder refuses but clients can send
+            response = await client.post(path, content=json.dumps(body), headers={"Content-Type": "application/json"})
+            return response.status_code, response.json()
+
+    return asyncio.run(post())
+
+
+@pytest.mark.parametrize("tx, message", INVALID)
+def test_score_transactions_rejects_bad_rows(tx, message):
+    status, body = _post("/analyst/score-transactions", {"transactions": [VALID, tx]})
+    assert status == 400
+    assert message in body["detail"]
+
+
+@pytest.mark.parametrize("tx, message", INVALID[2:])
+def test_ingest_rejects_bad_rows_without_writing(tx, message):
+    from npc_analyst import USER_DATA_PATH
+
+    with open(USER_DATA_PATH, "rb") as f:
+        before = f.read()
+    status, body = _post("/transactions", {"transactions": [VALID, tx]})
+    assert status == 400
+    assert message in body["detail"]
+    with open(USER_DATA_PATH, "rb") as f:
+        assert f.read() == before
@@ -0,0 +1,45 @@
+import re
+
+# tiktoken is optional; without it token counts are estimated
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _ENCODING = None
+
+TOKENIZER = "tiktoken o200k_base" if _ENCODING is not None else "estimate"
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]+")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Number of prompt tokens in `text` for the gpt-4o family.
+    Without tiktoken: one token per ~4 latin / ~3 cyrillic characters of a word,
+    one per punctuation run (close to o200k_base on our prompts).
+    """
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    total = 0
+    for piece in _PIECE_RE.findall(text):
+        if piece.isascii():
+            total += (len(piece) + 3) // 4
+        else:
+            total += (len(piece) + 2) // 3
+    return total
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = "…") -> str:
+    """Longest prefix of `text` within `max_tokens` (by count_tokens), with `marker` appended if cut."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid] + marker) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low].rstrip() + marker if low else ""
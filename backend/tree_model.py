@@ -0,0 +1,189 @@
+"""
+NumPy-only inference for the spontaneous-purchase random forest.
+
+`export` flattens the pickled bundle (imputer + RandomForestClassifier) into
+a compact .npz; `TreePredictor` loads it without importing scikit-learn or
+pandas and reproduces `model.predict_proba` / `model.predict` bit for bit.
+The .npz records the SHA-256 of the pickle it was exported from and is only
+used while that pickle is unchanged.
+
+The NumPy traversal wins on cold start, memory and small online batches; at
+thousands of rows scikit-learn's compiled trees are faster per row, so the
+batch enrichment (enrichment.py) keeps predicting with the pickled bundle.
+
+    python tree_model.py export spontaneous_model.pkl spontaneous_model.npz
+"""
+import argparse
+import hashlib
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from features import impute
+
+MODEL_PATH = "spontaneous_model.pkl"
+MODEL_NPZ_PATH = "spontaneous_model.npz"
+
+# Rows traversed at once; small chunks keep the (rows, trees) node table in cache
+PREDICT_CHUNK_ROWS = 64
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def export(bundle: Dict[str, Any], path: str = MODEL_NPZ_PATH, source_path: Optional[str] = None) -> Dict[str, int]:
+    """
+    Write all trees of the bundle's forest into one node table:
+    child indices are global, leaves point to themselves and carry their
+    class probabilities already divided by the leaf total, as sklearn does.
+    `source_path` is the pickle the bundle was loaded from; its hash is stored.
+    """
+    model = bundle["model"]
+    left, right, feature, threshold, value, roots = [], [], [], [], [], []
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        nodes = np.arange(tree.node_count)
+        is_leaf = tree.children_left < 0
+        roots.append(offset)
+        left.append(np.where(is_leaf, nodes, tree.children_left) + offset)
+        right.append(np.where(is_leaf, nodes, tree.children_right) + offset)
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+        leaf_value = tree.value[:, 0, :]
+        normalizer = leaf_value.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+        value.append(leaf_value / normalizer)
+        offset += tree.node_count
+
+    depth = max(estimator.tree_.max_depth for estimator in model.estimators_)
+    np.savez_compressed(
+        path,
+        left=np.concatenate(left).astype("int32"),
+        right=np.concatenate(right).astype("int32"),
+        feature=np.concatenate(feature).astype("int32"),
+        threshold=np.concatenate(threshold).astype("float64"),
+        value=np.concatenate(value).astype("float64"),
+        roots=np.array(roots, dtype="int32"),
+        depth=np.array(depth, dtype="int32"),
+        classes=np.asarray(model.classes_),
+        statistics=np.asarray(bundle["imputer"].statistics_, dtype="float64"),
+        features=np.array(bundle["features"]),
+        source_sha256=np.array(file_sha256(source_path) if source_path else ""),
+    )
+    return {"trees": len(roots), "nodes": offset, "depth": depth}
+
+
+class TreePredictor:
+    """Imputer + random forest evaluated with NumPy on a raw feature matrix (NaN allowed)."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        # children[2 * node + goes_right]; native index dtype avoids a cast per lookup
+        self.children = np.stack([arrays["left"], arrays["right"]], axis=1).astype(np.intp).ravel()
+        self.feature = arrays["feature"].astype(np.intp)
+        self.threshold = arrays["threshold"]
+        # float32 inputs compared with float32 thresholds: x > t exactly when x > t rounded
+        # down to float32 (no float32 lies in between), so sklearn's float64 compare is kept
+        # while the per-level gathers and comparisons move half the bytes
+        threshold32 = self.threshold.astype("float32")
+        rounded_up = threshold32.astype("float64") > self.threshold
+        threshold32[rounded_up] = np.nextafter(threshold32[rounded_up], np.float32(-np.inf))
+        self.threshold32 = threshold32
+        self.value = arrays["value"]
+        self.roots = arrays["roots"].astype(np.intp)
+        self.depth = int(arrays["depth"])
+        self.classes_ = arrays["classes"]
+        self.statistics = arrays["statistics"]
+        self.features: List[str] = arrays["features"].tolist()
+        # Exports made before the hash was recorded match no pickle
+        self.source_sha256 = str(arrays["source_sha256"]) if "source_sha256" in arrays else ""
+
+    @classmethod
+    def load(cls, path: str = MODEL_NPZ_PATH) -> "TreePredictor":
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        proba = np.empty((len(X), len(self.classes_)))
+        for start in range(0, len(X), PREDICT_CHUNK_ROWS):
+            chunk = slice(start, start + PREDICT_CHUNK_ROWS)
+            proba[chunk] = self._predict_chunk(X[chunk])
+        return proba
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def _predict_chunk(self, X: np.ndarray) -> np.ndarray:
+        # Same input dtype as sklearn trees
+        X = impute(np.asarray(X, dtype="float32"), self.statistics.astype("float32"))
+        flat = X.ravel()
+        row_start = (np.arange(len(X)) * X.shape[1])[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            # sklearn goes left on `x <= threshold`; leaves loop back to themselves
+            goes_right = flat[row_start + self.feature[node]] > self.threshold32[node]
+            node = self.children[2 * node + goes_right]
+        # Sequential sum over trees in estimator order, then the mean, as in
+        # RandomForestClassifier.predict_proba (cumsum does not reorder additions)
+        total = np.cumsum(self.value[node], axis=1)[:, -1]
+        return total / len(self.roots)
+
+
+class BundlePredictor:
+    """The same interface over the pickled bundle (imports scikit-learn and pandas)."""
+
+    def __init__(self, bundle: Dict[str, Any]):
+        self.bundle = bundle
+        self.classes_ = bundle["model"].classes_
+        self.features: List[str] = list(bundle["features"])
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        from enrichment import predict_proba
+        return predict_proba(self.bundle, X)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def load_predictor(model_path: str, npz_path: Optional[str] = MODEL_NPZ_PATH):
+    """
+    TreePredictor when an exported .npz exists and was made from the current
+    pickle (same SHA-256; mtimes are meaningless after a checkout or copy),
+    otherwise the pickled bundle.
+    """
+    if npz_path and os.path.exists(npz_path):
+        predictor = TreePredictor.load(npz_path)
+        if not os.path.exists(model_path) or predictor.source_sha256 == file_sha256(model_path):
+            return predictor
+        print(f"[tree_model] {npz_path} was not exported from {model_path}; using the pickle "
+              f"(re-export with `python tree_model.py export`)", flush=True)
+    from enrichment import load_bundle
+    bundle = load_bundle(model_path)
+    # Inference threads are managed by the caller; joblib fan-out only adds overhead
+    if hasattr(bundle["model"], "n_jobs"):
+        bundle["model"].n_jobs = 1
+    return BundlePredictor(bundle)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_cmd = sub.add_parser("export", help="convert the pickled bundle to .npz")
+    export_cmd.add_argument("model", nargs="?", default=MODEL_PATH)
+    export_cmd.add_argument("out", nargs="?", default=MODEL_NPZ_PATH)
+    args = parser.parse_args(argv)
+
+    from enrichment import load_bundle
+    info = export(load_bundle(args.model), args.out, source_path=args.model)
+    print(f"✅ {info['trees']} trees / {info['nodes']} nodes (depth {info['depth']}) -> {args.out} "
+          f"({os.path.getsize(args.out) / 1024:.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()